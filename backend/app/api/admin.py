@@ -0,0 +1,77 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.responses import JSONResponse
+from pydantic import BaseModel
+
+from app.config import settings
+from app.ingestion.backfill import BackfillOptions, backfill_runner
+from app.ingestion.ocr_cache import ocr_cache
+from app.llm_fallback import provider_pool_stats
+from app.rag.answer_cache import answer_cache
+from app.rag.embedding_cache import embedding_cache
+from app.rag.embedding_client import embedding_executor
+from app.rag.hybrid_retriever import retrieval_stats
+from app.rag.lexical_index import lexical_cache
+from app.rag.shared_index import get_shared_index
+from app.rag.single_flight import chat_flights
+from app.rag.store_cache import store_cache
+from app.rag.vector_store import use_shared_index
+
+router = APIRouter()
+
+
+# =========================
+# Schemas
+# =========================
+class BackfillRequest(BaseModel):
+    include_reviewed: bool = False
+    rechunk: bool = False
+    reindex: bool = False
+    restart: bool = False
+    batch_size: int = settings.BACKFILL_BATCH_SIZE
+
+
+# =========================
+# Cache Statistics
+# =========================
+@router.get("/stats")
+def cache_stats():
+    return {
+        "ocr_cache": ocr_cache.stats(),
+        "vector_store_cache": store_cache.stats(),
+        "embedding_cache": embedding_cache.stats(),
+        "embedding_requests": embedding_executor.stats(),
+        "lexical_index_cache": lexical_cache.stats(),
+        "retrieval": retrieval_stats.stats(),
+        "answer_cache": answer_cache.stats(),
+        "llm_providers": provider_pool_stats(),
+        "chat_coalescing": chat_flights.stats(),
+        "shared_index": (
+            get_shared_index().stats() if use_shared_index() else None
+        )
+    }
+
+
+# =========================
+# Re-extraction Backfill
+# =========================
+@router.post("/backfill")
+def start_backfill(payload: BackfillRequest):
+    started = backfill_runner.start(
+        BackfillOptions(
+            batch_size=payload.batch_size,
+            include_reviewed=payload.include_reviewed,
+            rechunk=payload.rechunk,
+            reindex=payload.reindex,
+            restart=payload.restart
+        )
+    )
+
+    if not started:
+        raise HTTPException(status_code=409, detail="Backfill already running")
+
+    return JSONResponse(status_code=202, content=backfill_runner.status())
+
+
+@router.get("/backfill")
+def backfill_status():
+    return backfill_runner.status()
@@ -1,22 +1,43 @@
-from fastapi import APIRouter, Depends
+import asyncio
+import json
+import time
+from typing import AsyncIterator, Dict, List, NamedTuple, Optional
+
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
+from langchain_core.documents import Document
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 
+from app.config import settings
 from app.database import (
+    get_async_db,
     get_db,
+    AsyncSessionLocal,
     Invoice,
     InvoiceField,
+    InvoiceIndex,
     QueryLog
 )
-from app.rag.vector_store import load_vector_store
-from app.rag.qa_chain import answer_question
+from app.ingestion.backfill import rechunk_invoice
+from app.rag.hybrid_retriever import Retrieval, aretrieve, full_context
+from app.rag.retriever import fits_full_context
+from app.llm_fallback import LLMDeadlineExceeded
+from app.rag.answer_cache import normalize_question
+from app.rag.qa_chain import cached_aanswer_question, cached_astream_answer_question
 from app.rag.router import (
     match_structured_field,
-    answer_from_structured_db
+    aanswer_from_structured_db
 )
+from app.rag.single_flight import chat_flights
 
 router = APIRouter()
 
+# Invoices being indexed at chat time: [lock, requests using it], so
+# concurrent questions wait for one rechunk instead of each running it
+rechunk_locks: Dict[str, list] = {}
+
 
 # =========================
 # Request Schemas
@@ -26,83 +47,257 @@ class ChatRequest(BaseModel):
     question: str
 
 
-# =========================
-# Chat Endpoint
-# =========================
-@router.post("/")
-def chat_with_invoice(
-    payload: ChatRequest,
-    db: Session = Depends(get_db)
-):
+class ChatPlan(NamedTuple):
+    # The answer, when it doesn't need the LLM
+    answer: Optional[str]
+    source: str
+    # Written to QueryLog once answered
+    log: bool
+    documents: List[Document]
+
+
+async def plan_answer(db: AsyncSession, payload: ChatRequest) -> ChatPlan:
     """
-    Intelligent chat endpoint:
+    Everything before the LLM call:
     - HITL aware
-    - Structured DB → RAG fallback
-    - Logs every query
+    - Structured DB → RAG fallback (retrieval)
     """
 
     # 🔹 HITL check
-    invoice = (
-        db.query(Invoice)
-        .filter(Invoice.id == payload.invoice_id)
-        .first()
-    )
+    invoice = await db.get(Invoice, payload.invoice_id)
 
     if not invoice:
-        return {
-            "answer": "Invoice not found",
-            "source": "error"
-        }
+        return ChatPlan("Invoice not found", "error", False, [])
 
     if invoice.status == "NEEDS_REVIEW":
-        return {
-            "answer": (
+        return ChatPlan(
+            (
                 "⚠️ This invoice is flagged for human review. "
                 "Answers may be unreliable until approved."
             ),
-            "source": "human_review"
-        }
-
-    answer = None
-    source = "rag"
+            "human_review",
+            False,
+            []
+        )
 
     # 1️⃣ Structured DB first
     matched_field = match_structured_field(payload.question)
 
     if matched_field:
-        structured_answer = answer_from_structured_db(
+        structured_answer = await aanswer_from_structured_db(
             db=db,
             invoice_id=payload.invoice_id,
             field=matched_field
         )
         if structured_answer:
-            answer = structured_answer
-            source = "structured_db"
+            return ChatPlan(structured_answer, "structured_db", True, [])
 
     # 2️⃣ RAG fallback
-    if not answer:
-        vector_store = load_vector_store(payload.invoice_id)
-        documents = vector_store.similarity_search(
-            payload.question,
-            k=4
-        )
-        answer = answer_question(documents, payload.question)
+    retrieval = await retrieve_context(db, invoice, payload.question)
+    return ChatPlan(None, "rag", True, retrieval.documents)
 
-    # 3️⃣ Log query
+
+async def log_query(db: AsyncSession, payload: ChatRequest, answer: str) -> None:
     log = QueryLog(
         invoice_id=payload.invoice_id,
         question=payload.question,
         answer=answer
     )
     db.add(log)
-    db.commit()
+    await db.commit()
+
+
+async def answer_plan(payload: ChatRequest, deadline: float) -> ChatPlan:
+    """
+    plan_answer, then the LLM's answer if the plan needs one.
+    Runs in its own session: with coalescing it outlives the
+    request that started it.
+    """
+
+    # Before retrieval: an invalidation during it must keep the
+    # answer out of the cache
+    started_at = time.time()
+
+    async with AsyncSessionLocal() as db:
+        plan = await plan_answer(db, payload)
+
+    if plan.answer is not None:
+        return plan
+
+    answer = await cached_aanswer_question(
+        payload.invoice_id,
+        plan.documents,
+        payload.question,
+        deadline=deadline,
+        started_at=started_at
+    )
+    return plan._replace(answer=answer)
+
+
+# =========================
+# Chat Endpoint
+# =========================
+@router.post("/")
+async def chat_with_invoice(
+    payload: ChatRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    Intelligent chat endpoint:
+    - HITL aware
+    - Structured DB → RAG fallback
+    - Logs every query
+    - Bounded by LLM_DEADLINE_SECONDS (HTTP 504 past it)
+    - Async end to end: provider calls are awaited, store loading
+      and vector search run on worker threads
+    - Identical questions in flight at once are answered once
+      (CHAT_COALESCE_ENABLED), each request still logged
+    """
+
+    deadline = time.monotonic() + settings.LLM_DEADLINE_SECONDS
+
+    try:
+        if settings.CHAT_COALESCE_ENABLED:
+            plan = await chat_flights.run(
+                (payload.invoice_id, normalize_question(payload.question)),
+                lambda: answer_plan(payload, deadline),
+                deadline
+            )
+        else:
+            plan = await answer_plan(payload, deadline)
+    except LLMDeadlineExceeded as e:
+        raise HTTPException(status_code=504, detail=str(e))
+
+    # 3️⃣ Log query
+    if plan.log:
+        await log_query(db, payload, plan.answer)
 
     return {
-        "answer": answer,
-        "source": source
+        "answer": plan.answer,
+        "source": plan.source
     }
 
 
+# =========================
+# Streaming Chat Endpoint
+# =========================
+@router.post("/stream")
+async def stream_chat_with_invoice(
+    payload: ChatRequest,
+    db: AsyncSession = Depends(get_async_db)
+):
+    """
+    chat_with_invoice as server-sent events:
+    - `token` events ({"text"}) as the LLM produces the answer
+    - then `done` ({"answer", "source"}) or `error` ({"detail"})
+    Provider fallback still applies until the first token.
+    The query is logged once the stream completes.
+    """
+
+    deadline = time.monotonic() + settings.LLM_DEADLINE_SECONDS
+    started_at = time.time()
+
+    plan = await plan_answer(db, payload)
+    await db.close()
+
+    if plan.answer is not None:
+        tokens = single_token(plan.answer)
+    else:
+        tokens = cached_astream_answer_question(
+            payload.invoice_id,
+            plan.documents,
+            payload.question,
+            deadline=deadline,
+            started_at=started_at
+        )
+
+    return StreamingResponse(
+        answer_events(payload, plan, tokens),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+async def single_token(text: str) -> AsyncIterator[str]:
+    yield text
+
+
+def sse_event(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+
+async def answer_events(
+    payload: ChatRequest,
+    plan: ChatPlan,
+    tokens: AsyncIterator[str]
+) -> AsyncIterator[str]:
+    parts: List[str] = []
+
+    try:
+        async for token in tokens:
+            parts.append(token)
+            yield sse_event("token", {"text": token})
+    except Exception as e:
+        yield sse_event("error", {"detail": str(e)})
+        return
+
+    answer = "".join(parts)
+
+    if plan.log:
+        # The request's session is closed once streaming starts
+        async with AsyncSessionLocal() as db:
+            await log_query(db, payload, answer)
+
+    yield sse_event("done", {"answer": answer, "source": plan.source})
+
+
+async def retrieve_context(
+    db: AsyncSession,
+    invoice: Invoice,
+    question: str
+) -> Retrieval:
+    """
+    Small invoices go to the LLM whole; larger ones through
+    retrieval, indexing them first if ingestion skipped it.
+    """
+
+    index = await db.get(InvoiceIndex, invoice.id)
+    total_chars = index.total_chars if index else len(invoice.raw_text or "")
+
+    if fits_full_context(total_chars):
+        return full_context(invoice.id, invoice.raw_text or "")
+
+    try:
+        return await aretrieve(invoice.id, question, k=4)
+    except FileNotFoundError:
+        # Fit the budget at ingestion (since lowered): index now
+        if not invoice.raw_text:
+            raise
+
+    entry = rechunk_locks.setdefault(invoice.id, [asyncio.Lock(), 0])
+    entry[1] += 1
+
+    try:
+        async with entry[0]:
+            # Indexed by the request we waited on
+            try:
+                return await aretrieve(invoice.id, question, k=4)
+            except FileNotFoundError:
+                pass
+
+            record = await asyncio.to_thread(
+                rechunk_invoice, invoice.id, invoice.raw_text, skip_small=False
+            )
+            await db.merge(record)
+            await db.commit()
+    finally:
+        entry[1] -= 1
+        if not entry[1]:
+            del rechunk_locks[invoice.id]
+
+    return await aretrieve(invoice.id, question, k=4)
+
+
 # =========================
 # Fetch Structured Fields
 # =========================
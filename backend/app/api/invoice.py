@@ -1,6 +1,6 @@
 from fastapi import APIRouter, Depends
 from sqlalchemy.orm import Session
-from app.database import get_db, Invoice
+from app.database import get_db, Invoice, InvoicePage
 
 router = APIRouter()
 
@@ -8,3 +8,17 @@ router = APIRouter()
 def list_invoices(db: Session = Depends(get_db)):
     invoices = db.query(Invoice).order_by(Invoice.created_at.desc()).all()
     return [{"id": i.id, "filename": i.filename} for i in invoices]
+
+
+@router.get("/{invoice_id}/pages")
+def list_invoice_pages(invoice_id: str, db: Session = Depends(get_db)):
+    pages = (
+        db.query(InvoicePage)
+        .filter(InvoicePage.invoice_id == invoice_id)
+        .order_by(InvoicePage.page_number)
+        .all()
+    )
+    return [
+        {"page": p.page_number, "ocr_used": p.ocr_used, "text": p.text}
+        for p in pages
+    ]
@@ -3,6 +3,7 @@ from sqlalchemy.orm import Session
 from pydantic import BaseModel
 
 from app.database import get_db, Invoice, InvoiceField
+from app.rag.answer_cache import invalidate_answers
 
 router = APIRouter()
 
@@ -36,6 +37,7 @@ def flag_invoice(
     invoice.status = "NEEDS_REVIEW"
     invoice.review_notes = payload.note
     db.commit()
+    invalidate_answers(invoice_id)
 
     return {"message": "Invoice flagged for review"}
 
@@ -55,6 +57,7 @@ def approve_invoice(
 
     invoice.status = "APPROVED"
     db.commit()
+    invalidate_answers(invoice_id)
 
     return {"message": "Invoice approved"}
 
@@ -89,4 +92,6 @@ def edit_invoice_field(
         )
 
     db.commit()
+    invalidate_answers(invoice_id)
+
     return {"message": "Field updated"}
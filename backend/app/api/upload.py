@@ -1,13 +1,19 @@
 import uuid
-from fastapi import APIRouter, UploadFile, File, Depends
+from typing import List
+
+from fastapi import APIRouter, UploadFile, File, Depends, HTTPException
+from fastapi.responses import JSONResponse
 from sqlalchemy.orm import Session
 
-from app.ingestion.loader import save_upload, load_document
-from app.ingestion.parser import normalize_text
-from app.rag.retriever import chunk_and_store
-from app.database import Invoice, get_db
-from app.ingestion.structured_extractor import extract_structured_fields
-from app.database import InvoiceField
+from app.ingestion.batch import ingest_batch
+from app.ingestion.jobs import QueueFull, describe_job, enqueue_ingestion
+from app.ingestion.loader import save_upload, UploadTooLarge
+from app.ingestion.pipeline import (
+    describe_invoice,
+    find_duplicate,
+    ingest_document
+)
+from app.database import IngestionJob, get_db
 
 
 router = APIRouter()
@@ -16,50 +22,127 @@ router = APIRouter()
 @router.post("/")
 def upload_invoice(
     file: UploadFile = File(...),
+    force: bool = False,
+    background: bool = False,
     db: Session = Depends(get_db)
 ):
     """
     Upload invoice, extract text, persist data, create vector store.
-    """
 
-    invoice_id = str(uuid.uuid4())
+    Re-uploads of identical content return the existing invoice
+    unless `force=true` is passed.
 
-    # 1. Save file
-    file_path = save_upload(file)
+    With `background=true` the file is queued for ingestion and a
+    job ID is returned immediately (poll GET /upload/jobs/{job_id}).
+    """
 
-    # 2. Extract text
-    text, used_ocr = load_document(file_path)
-    text = normalize_text(text)
+    # 1. Save file (streamed, hashed, size-capped)
+    try:
+        saved = save_upload(file)
+    except UploadTooLarge as e:
+        raise HTTPException(status_code=413, detail=str(e))
 
-    # 3. Persist invoice in DB
-    invoice = Invoice(
-        id=invoice_id,
-        filename=file.filename,
-        ocr_used=used_ocr,
-        raw_text=text
-    )
-    db.add(invoice)
-    db.commit()
+    # 2. Content-hash dedup
+    if not force:
+        existing = find_duplicate(db, saved.sha256)
+        if existing:
+            return {
+                **describe_invoice(db, existing),
+                "duplicate": True,
+                "message": "Identical invoice already processed"
+            }
 
-        # 4. Extract structured fields
-    structured_fields = extract_structured_fields(text)
+    invoice_id = str(uuid.uuid4())
 
-    for field, value in structured_fields.items():
-        db.add(
-            InvoiceField(
+    if background:
+        try:
+            job = enqueue_ingestion(
+                db=db,
                 invoice_id=invoice_id,
-                field=field,
-                value=value
+                filename=file.filename,
+                upload=saved
             )
-        )
+        except QueueFull as e:
+            raise HTTPException(status_code=429, detail=str(e))
 
-    db.commit()
+        return JSONResponse(
+            status_code=202,
+            content={
+                "job_id": job.id,
+                "invoice_id": invoice_id,
+                "status": job.status,
+                "message": "Invoice queued for processing"
+            }
+        )
 
-    # 5. Create vector store
-    chunk_and_store(text, invoice_id)
+    # 3. Stream pages through extraction, persistence and embedding
+    result = ingest_document(
+        db=db,
+        invoice_id=invoice_id,
+        filename=file.filename,
+        upload=saved
+    )
 
     return {
         "invoice_id": invoice_id,
-        "ocr_used": used_ocr,
+        "ocr_used": result["ocr_used"],
+        "ocr_pages": result["ocr_pages"],
+        "fields": result["fields"],
+        "embeddings": result["embeddings"],
+        "duplicate": False,
         "message": "Invoice processed and stored successfully"
     }
+
+
+@router.post("/batch")
+def upload_invoice_batch(
+    files: List[UploadFile] = File(...),
+    force: bool = False,
+    db: Session = Depends(get_db)
+):
+    """
+    Upload many invoices at once.
+
+    OCR/extraction of one file overlaps with embedding of others,
+    and DB rows are committed in bulk. Returns one result per file.
+    """
+
+    uploads = []
+    rejected = {}
+
+    for i, file in enumerate(files):
+        try:
+            uploads.append((file.filename, save_upload(file)))
+        except UploadTooLarge as e:
+            rejected[i] = {
+                "filename": file.filename,
+                "status": "failed",
+                "error": str(e)
+            }
+
+    processed = iter(ingest_batch(db, uploads, force=force))
+
+    results = [
+        rejected[i] if i in rejected else next(processed)
+        for i in range(len(files))
+    ]
+
+    return {
+        "processed": sum(r["status"] == "processed" for r in results),
+        "duplicates": sum(r["status"] == "duplicate" for r in results),
+        "failed": sum(r["status"] == "failed" for r in results),
+        "results": results
+    }
+
+
+@router.get("/jobs/{job_id}")
+def get_ingestion_job(
+    job_id: str,
+    db: Session = Depends(get_db)
+):
+    job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return describe_job(job)
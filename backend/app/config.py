@@ -18,15 +18,209 @@ class Settings:
         os.path.join(BASE_DIR, "../data/vector_db")
     )
 
+    # "native": per-invoice memory-mapped vectors + SQLite chunk sidecar
+    #           under VECTOR_DB_PATH (legacy FAISS dirs converted on load)
+    # "faiss": one FAISS save_local directory per invoice (pickled docstore)
+    # "shared": one index for all invoices under SHARED_INDEX_PATH
+    VECTOR_STORE_BACKEND = os.getenv("VECTOR_STORE_BACKEND", "native").lower()
+    # Native store vectors: none (float32) or int8 (per-row scalar
+    # quantization, 4x smaller to scan). With NATIVE_STORE_RERANK the
+    # float32 rows are kept on disk and the best k x RERANK_FACTOR
+    # int8 candidates are re-scored exactly; without it only codes are
+    # stored and scores are approximate.
+    NATIVE_STORE_QUANTIZATION = os.getenv("NATIVE_STORE_QUANTIZATION", "none").lower()
+    NATIVE_STORE_RERANK = os.getenv("NATIVE_STORE_RERANK", "true").lower() == "true"
+    NATIVE_STORE_RERANK_FACTOR = int(os.getenv("NATIVE_STORE_RERANK_FACTOR", "4"))
+    SHARED_INDEX_PATH = os.getenv(
+        "SHARED_INDEX_PATH",
+        os.path.join(BASE_DIR, "../data/shared_index")
+    )
+    SHARED_INDEX_HNSW_M = int(os.getenv("SHARED_INDEX_HNSW_M", "32"))
+    SHARED_INDEX_EF_SEARCH = int(os.getenv("SHARED_INDEX_EF_SEARCH", "64"))
+    # Chunks added between on-disk checkpoints of the ANN index
+    SHARED_INDEX_FLUSH_EVERY = int(
+        os.getenv("SHARED_INDEX_FLUSH_EVERY", "10000")
+    )
+
+    # Invoices up to this many characters are answered from their full
+    # text (no retrieval, no question embedding) and, with
+    # SKIP_SMALL_DOCUMENT_INDEX, aren't chunked/embedded at ingestion.
+    # Default: the 4 x 800-char chunks retrieval would send anyway.
+    FULL_CONTEXT_MAX_CHARS = int(os.getenv("FULL_CONTEXT_MAX_CHARS", "3200"))
+    SKIP_SMALL_DOCUMENT_INDEX = (
+        os.getenv("SKIP_SMALL_DOCUMENT_INDEX", "true").lower() == "true"
+    )
+
+    # Chat retrieval: hybrid (BM25 + vectors, reciprocal-rank fusion),
+    # vector or lexical (BM25 only, no embedding call)
+    RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid").lower()
+    LEXICAL_INDEX_PATH = os.getenv(
+        "LEXICAL_INDEX_PATH",
+        os.path.join(BASE_DIR, "../data/lexical_index")
+    )
+    # Candidates taken from each retriever before fusion
+    HYBRID_CANDIDATES = int(os.getenv("HYBRID_CANDIDATES", "10"))
+    RRF_K = int(os.getenv("RRF_K", "60"))
+    # Hybrid mode answers from BM25 alone (skipping the embedding call)
+    # when the top chunk has this share of the query terms and beats
+    # the runner-up's score by this factor
+    LEXICAL_SHORTCUT = os.getenv("LEXICAL_SHORTCUT", "true").lower() == "true"
+    LEXICAL_MIN_COVERAGE = float(os.getenv("LEXICAL_MIN_COVERAGE", "1.0"))
+    LEXICAL_MIN_MARGIN = float(os.getenv("LEXICAL_MIN_MARGIN", "1.5"))
+
+    # Loaded vector stores kept in memory for follow-up questions
+    # (0 entries disables the cache)
+    VECTOR_STORE_CACHE_MAX_ENTRIES = int(
+        os.getenv("VECTOR_STORE_CACHE_MAX_ENTRIES", "256")
+    )
+    VECTOR_STORE_CACHE_MAX_BYTES = int(
+        os.getenv("VECTOR_STORE_CACHE_MAX_BYTES", 512 * 1024 * 1024)
+    )
+    VECTOR_STORE_CACHE_TTL_SECONDS = float(
+        os.getenv("VECTOR_STORE_CACHE_TTL_SECONDS", "900")
+    )
+
+    # Uploads are streamed to disk in chunks and capped in size
+    MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", 200 * 1024 * 1024))
+    UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", 1024 * 1024))
+
     OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
     COHERE_API_KEY = os.getenv("COHERE_API_KEY")
 
+    # LLM provider pool: clients are reused across requests. A provider
+    # failing LLM_CIRCUIT_FAILURES times in a row is skipped for
+    # LLM_CIRCUIT_RESET_SECONDS. With LLM_HEDGE_AFTER_SECONDS > 0, the
+    # next provider is also started when one is slower than that.
+    # LLM_DEADLINE_SECONDS bounds each chat request end to end.
+    LLM_TIMEOUT_SECONDS = float(os.getenv("LLM_TIMEOUT_SECONDS", "30"))
+    LLM_PROVIDER_MAX_RETRIES = int(os.getenv("LLM_PROVIDER_MAX_RETRIES", "1"))
+    LLM_DEADLINE_SECONDS = float(os.getenv("LLM_DEADLINE_SECONDS", "45"))
+    LLM_HEDGE_AFTER_SECONDS = float(os.getenv("LLM_HEDGE_AFTER_SECONDS", "0"))
+    LLM_CIRCUIT_FAILURES = int(os.getenv("LLM_CIRCUIT_FAILURES", "3"))
+    LLM_CIRCUIT_RESET_SECONDS = float(
+        os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30")
+    )
+    LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "32"))
+
     BEDROCK_AWS_ACCESS_KEY = os.getenv("BEDROCK_AWS_ACCESS_KEY")
     BEDROCK_AWS_SECRET_KEY = os.getenv("BEDROCK_AWS_SECRET_KEY")
     BEDROCK_REGION = os.getenv("BEDROCK_REGION")
 
     OLLAMA_BASE_URL = os.getenv("OLLAMA_BASE_URL")
 
+    # OCR
+    # Blank values in .env fall back to the defaults
+    OCR_WORKERS = int(os.getenv("OCR_WORKERS") or os.cpu_count() or 1)
+    OCR_MAX_PAGES_PER_DOCUMENT = int(
+        os.getenv("OCR_MAX_PAGES_PER_DOCUMENT") or max(1, OCR_WORKERS // 2)
+    )
+    # Pages with fewer text-layer characters than this are OCR'd
+    OCR_PAGE_MIN_CHARS = int(os.getenv("OCR_PAGE_MIN_CHARS", "25"))
+    OCR_LANG = os.getenv("OCR_LANG", "eng")
+    OCR_CONFIG = os.getenv("OCR_CONFIG", "")
+
+    # Image pre-processing ahead of tesseract
+    OCR_PREPROCESS = os.getenv("OCR_PREPROCESS", "true").lower() == "true"
+    OCR_TARGET_DPI = int(os.getenv("OCR_TARGET_DPI", "300"))
+    OCR_CROP_TO_CONTENT = (
+        os.getenv("OCR_CROP_TO_CONTENT", "false").lower() == "true"
+    )
+
+    # OCR result cache (keyed by page image hash)
+    OCR_CACHE_ENABLED = os.getenv("OCR_CACHE_ENABLED", "true").lower() == "true"
+    OCR_CACHE_PATH = os.getenv(
+        "OCR_CACHE_PATH",
+        os.path.join(BASE_DIR, "../data/cache/ocr_cache.db")
+    )
+    OCR_CACHE_MAX_BYTES = int(
+        os.getenv("OCR_CACHE_MAX_BYTES", 256 * 1024 * 1024)
+    )
+
+    # Chat answer cache: exact (invoice, question, context, model) and,
+    # optionally, paraphrases scoring >= the threshold (cosine) against
+    # an earlier question about the same invoice
+    ANSWER_CACHE_ENABLED = (
+        os.getenv("ANSWER_CACHE_ENABLED", "true").lower() == "true"
+    )
+    ANSWER_CACHE_PATH = os.getenv(
+        "ANSWER_CACHE_PATH",
+        os.path.join(BASE_DIR, "../data/cache/answer_cache.db")
+    )
+    ANSWER_CACHE_MAX_BYTES = int(
+        os.getenv("ANSWER_CACHE_MAX_BYTES", 64 * 1024 * 1024)
+    )
+    ANSWER_CACHE_TTL_SECONDS = float(
+        os.getenv("ANSWER_CACHE_TTL_SECONDS", 7 * 24 * 3600)
+    )
+    ANSWER_CACHE_SEMANTIC = (
+        os.getenv("ANSWER_CACHE_SEMANTIC", "false").lower() == "true"
+    )
+    ANSWER_CACHE_SEMANTIC_THRESHOLD = float(
+        os.getenv("ANSWER_CACHE_SEMANTIC_THRESHOLD", "0.95")
+    )
+
+    # Identical chat questions (same invoice, normalized question) in
+    # flight at once share one retrieval + LLM call
+    CHAT_COALESCE_ENABLED = (
+        os.getenv("CHAT_COALESCE_ENABLED", "true").lower() == "true"
+    )
+
+    # auto (first provider with an API key, else local), cohere, openai,
+    # gemini or local (hashed n-grams, offline). Vectors from different
+    # providers don't mix: re-index invoices after switching.
+    EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "auto").lower()
+    EMBED_LOCAL_DIM = int(os.getenv("EMBED_LOCAL_DIM", "512"))
+
+    # Chunks sent to the embedding provider per request
+    EMBED_BATCH_SIZE = int(os.getenv("EMBED_BATCH_SIZE", "64"))
+
+    # Persistent chunk-embedding cache (only misses go to the provider)
+    EMBED_CACHE_ENABLED = os.getenv("EMBED_CACHE_ENABLED", "true").lower() == "true"
+    EMBED_CACHE_PATH = os.getenv(
+        "EMBED_CACHE_PATH",
+        os.path.join(BASE_DIR, "../data/cache/embeddings")
+    )
+    EMBED_CACHE_MAX_ENTRIES = int(os.getenv("EMBED_CACHE_MAX_ENTRIES", "500000"))
+
+    # Embedding requests: shared across all uploads in this process
+    EMBED_MAX_IN_FLIGHT = int(os.getenv("EMBED_MAX_IN_FLIGHT", "4"))
+    EMBED_REQUEST_MAX_TEXTS = int(os.getenv("EMBED_REQUEST_MAX_TEXTS", "96"))
+    EMBED_REQUEST_MAX_CHARS = int(os.getenv("EMBED_REQUEST_MAX_CHARS", "100000"))
+    # Requests per second (0 = unlimited) and how many may burst at once
+    EMBED_RATE_LIMIT_RPS = float(os.getenv("EMBED_RATE_LIMIT_RPS", "0"))
+    EMBED_RATE_LIMIT_BURST = float(os.getenv("EMBED_RATE_LIMIT_BURST", "4"))
+    EMBED_MAX_RETRIES = int(os.getenv("EMBED_MAX_RETRIES", "5"))
+    EMBED_RETRY_BASE_SECONDS = float(os.getenv("EMBED_RETRY_BASE_SECONDS", "0.5"))
+    EMBED_RETRY_MAX_SECONDS = float(os.getenv("EMBED_RETRY_MAX_SECONDS", "30"))
+
+
+    # Background ingestion queue (SQLite-backed, no broker)
+    INGEST_WORKERS = int(os.getenv("INGEST_WORKERS", "2"))
+    INGEST_QUEUE_MAX = int(os.getenv("INGEST_QUEUE_MAX", "100"))
+    INGEST_POLL_SECONDS = float(os.getenv("INGEST_POLL_SECONDS", "1.0"))
+    # RUNNING jobs not heard from for this long (worker crashed or was
+    # restarted) are claimed again
+    INGEST_JOB_LEASE_SECONDS = float(os.getenv("INGEST_JOB_LEASE_SECONDS", "300"))
+
+
+    # Batch uploads: extraction and embedding stages run side by side
+    INGEST_BATCH_EXTRACT_WORKERS = int(
+        os.getenv("INGEST_BATCH_EXTRACT_WORKERS", "4")
+    )
+    INGEST_BATCH_INDEX_WORKERS = int(
+        os.getenv("INGEST_BATCH_INDEX_WORKERS", "4")
+    )
+    INGEST_BATCH_COMMIT_SIZE = int(os.getenv("INGEST_BATCH_COMMIT_SIZE", "50"))
+
+
+    # Re-extraction backfill over stored raw_text
+    BACKFILL_BATCH_SIZE = int(os.getenv("BACKFILL_BATCH_SIZE", "500"))
+    BACKFILL_WORKERS = int(os.getenv("BACKFILL_WORKERS") or os.cpu_count() or 1)
+    BACKFILL_CHECKPOINT_PATH = os.getenv(
+        "BACKFILL_CHECKPOINT_PATH",
+        os.path.join(BASE_DIR, "../data/cache/backfill_checkpoint.json")
+    )
+
 
 settings = Settings()
@@ -1,10 +1,13 @@
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
 from sqlalchemy import Column, String, Boolean, DateTime, Text, Integer, ForeignKey
 from datetime import datetime
 from sqlalchemy.orm import Session
 
 DATABASE_URL = "sqlite:///./invoice_auditor.db"
+# Same database, for the async chat path
+ASYNC_DATABASE_URL = "sqlite+aiosqlite:///./invoice_auditor.db"
 
 engine = create_engine(
     DATABASE_URL,
@@ -17,6 +20,15 @@ SessionLocal = sessionmaker(
     bind=engine
 )
 
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+AsyncSessionLocal = async_sessionmaker(
+    async_engine,
+    class_=AsyncSession,
+    autoflush=False,
+    expire_on_commit=False
+)
+
 Base = declarative_base()
 
 
@@ -44,6 +56,67 @@ class InvoiceField(Base):
     value = Column(String)
 
 
+class InvoicePage(Base):
+    __tablename__ = "invoice_pages"
+
+    id = Column(Integer, primary_key=True, index=True)
+    invoice_id = Column(String, ForeignKey("invoices.id"), index=True)
+    page_number = Column(Integer)
+    text = Column(Text)
+    ocr_used = Column(Boolean, default=False)
+
+
+class InvoiceDocument(Base):
+    __tablename__ = "invoice_documents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    invoice_id = Column(String, ForeignKey("invoices.id"), index=True)
+    sha256 = Column(String, index=True)
+    size_bytes = Column(Integer)
+    file_path = Column(String)
+    created_at = Column(DateTime, default=datetime.utcnow)
+
+
+class InvoiceIndex(Base):
+    __tablename__ = "invoice_indexes"
+
+    invoice_id = Column(String, ForeignKey("invoices.id"), primary_key=True)
+
+    # Chunking settings the vector store was built with
+    chunk_config = Column(String, index=True)
+    chunk_count = Column(Integer, default=0)
+    total_chars = Column(Integer, default=0)
+
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
+class IngestionJob(Base):
+    __tablename__ = "ingestion_jobs"
+
+    id = Column(String, primary_key=True, index=True)
+    invoice_id = Column(String, ForeignKey("invoices.id"))
+    filename = Column(String, nullable=False)
+
+    # Saved upload to ingest
+    file_path = Column(String, nullable=False)
+    sha256 = Column(String)
+    size_bytes = Column(Integer)
+
+    # QUEUED → RUNNING → DONE / FAILED
+    status = Column(String, default="QUEUED", index=True)
+    stage = Column(String, nullable=True)
+    claimed_by = Column(String, nullable=True)
+
+    # Per-stage progress
+    pages_loaded = Column(Integer, default=0)
+    fields_extracted = Column(Integer, default=0)
+    chunks_embedded = Column(Integer, default=0)
+
+    error = Column(Text, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    updated_at = Column(DateTime, default=datetime.utcnow)
+
+
 class QueryLog(Base):
     __tablename__ = "query_logs"
 
@@ -58,4 +131,9 @@ def get_db():
     try:
         yield db
     finally:
-        db.close()
\ No newline at end of file
+        db.close()
+
+
+async def get_async_db():
+    async with AsyncSessionLocal() as db:
+        yield db
@@ -0,0 +1,416 @@
+import argparse
+import json
+import os
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Callable, Deque, Dict, Iterator, List, NamedTuple, Optional, Tuple
+
+from sqlalchemy import or_
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Invoice, InvoiceField, InvoiceIndex, InvoicePage, SessionLocal
+from app.ingestion.pipeline import index_record
+from app.ingestion.structured_extractor import extract_structured_fields
+from app.rag.answer_cache import invalidate_answers
+from app.rag.retriever import chunk_and_store_stream, chunk_config_signature
+
+
+class BackfillOptions(NamedTuple):
+    batch_size: int = settings.BACKFILL_BATCH_SIZE
+    workers: int = settings.BACKFILL_WORKERS
+
+    # Reviewed invoices may carry hand-edited fields; skipped by default
+    include_reviewed: bool = False
+
+    # Also re-chunk/re-embed invoices indexed under another chunk config
+    rechunk: bool = False
+
+    # Re-chunk/re-embed every invoice (e.g. after switching
+    # EMBEDDING_PROVIDER, which the chunk config doesn't record)
+    reindex: bool = False
+
+    # Ignore any checkpoint and start from the first invoice
+    restart: bool = False
+
+
+# =========================
+# Checkpoint
+# =========================
+def load_checkpoint(path: str = None) -> Optional[Dict]:
+    path = path or settings.BACKFILL_CHECKPOINT_PATH
+
+    if not os.path.exists(path):
+        return None
+
+    with open(path) as f:
+        return json.load(f)
+
+
+def save_checkpoint(state: Dict, path: str = None) -> None:
+    """
+    Write the checkpoint atomically, so a crash mid-write can't
+    leave a truncated file behind.
+    """
+
+    path = path or settings.BACKFILL_CHECKPOINT_PATH
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(state, f, indent=2)
+    os.replace(tmp_path, path)
+
+
+def new_state(options: BackfillOptions) -> Dict:
+    return {
+        "options": options._asdict(),
+        "last_invoice_id": "",
+        "invoices": 0,
+        "fields_inserted": 0,
+        "fields_updated": 0,
+        "rechunked": 0,
+        "started_at": datetime.utcnow().isoformat(),
+        "updated_at": None,
+        "finished_at": None
+    }
+
+
+# =========================
+# Stages
+# =========================
+def iter_invoice_batches(
+    db: Session,
+    after_id: str,
+    batch_size: int,
+    include_reviewed: bool
+) -> Iterator[List[Tuple[str, str]]]:
+    """
+    Yield (invoice_id, raw_text) batches in id order.
+
+    Keyset pagination (id > last seen) keeps each query cheap however
+    far into the table we are, and makes the last id a resume point.
+    Invoices still being ingested (empty raw_text) are skipped.
+    """
+
+    while True:
+        query = (
+            db.query(Invoice.id, Invoice.raw_text)
+            .filter(Invoice.id > after_id, Invoice.raw_text != "")
+        )
+
+        if not include_reviewed:
+            query = query.filter(
+                or_(Invoice.status == "PROCESSED", Invoice.status.is_(None))
+            )
+
+        rows = query.order_by(Invoice.id).limit(batch_size).all()
+
+        if not rows:
+            return
+
+        yield [(row.id, row.raw_text) for row in rows]
+
+        after_id = rows[-1].id
+
+
+def extract_batch(
+    rows: List[Tuple[str, str]]
+) -> List[Tuple[str, Dict[str, str]]]:
+    """
+    Run the current extraction rules over a batch (pool worker).
+    """
+    return [
+        (invoice_id, extract_structured_fields(text))
+        for invoice_id, text in rows
+    ]
+
+
+def upsert_fields(
+    db: Session,
+    results: List[Tuple[str, Dict[str, str]]]
+) -> Tuple[int, int]:
+    """
+    Insert new fields and update changed ones for a batch of invoices.
+    Fields the rules no longer produce are left as they are, and
+    cached chat answers of changed invoices are dropped.
+    Returns (inserted, updated). The caller commits.
+    """
+
+    invoice_ids = [invoice_id for invoice_id, _ in results]
+
+    existing = {
+        (row.invoice_id, row.field): row
+        for row in (
+            db.query(
+                InvoiceField.id,
+                InvoiceField.invoice_id,
+                InvoiceField.field,
+                InvoiceField.value
+            )
+            .filter(InvoiceField.invoice_id.in_(invoice_ids))
+        )
+    }
+
+    inserts: List[Dict] = []
+    updates: List[Dict] = []
+    changed = set()
+
+    for invoice_id, fields in results:
+        for field, value in fields.items():
+            row = existing.get((invoice_id, field))
+
+            if row is None:
+                inserts.append(
+                    {"invoice_id": invoice_id, "field": field, "value": value}
+                )
+                changed.add(invoice_id)
+            elif row.value != value:
+                updates.append({"id": row.id, "value": value})
+                changed.add(invoice_id)
+
+    if inserts:
+        db.bulk_insert_mappings(InvoiceField, inserts)
+    if updates:
+        db.bulk_update_mappings(InvoiceField, updates)
+
+    for invoice_id in changed:
+        invalidate_answers(invoice_id)
+
+    return len(inserts), len(updates)
+
+
+def stale_invoice_ids(db: Session, invoice_ids: List[str]) -> List[str]:
+    """
+    Invoices whose vector store wasn't built with the current
+    chunk config (or predates index tracking).
+    """
+
+    current = {
+        invoice_id
+        for (invoice_id,) in (
+            db.query(InvoiceIndex.invoice_id)
+            .filter(
+                InvoiceIndex.invoice_id.in_(invoice_ids),
+                InvoiceIndex.chunk_config == chunk_config_signature()
+            )
+        )
+    }
+
+    return [invoice_id for invoice_id in invoice_ids if invoice_id not in current]
+
+
+def rechunk_invoice(
+    invoice_id: str,
+    raw_text: str,
+    skip_small: bool = True
+) -> InvoiceIndex:
+    """
+    Re-chunk and re-embed one invoice from its stored page texts
+    (raw_text for invoices ingested before pages were kept).
+    `skip_small=False` indexes it even if it fits full-context chat.
+    """
+
+    db = SessionLocal()
+    try:
+        pages = [
+            text
+            for (text,) in (
+                db.query(InvoicePage.text)
+                .filter(InvoicePage.invoice_id == invoice_id)
+                .order_by(InvoicePage.page_number)
+            )
+        ]
+    finally:
+        db.close()
+
+    pages = pages or [raw_text]
+    chunk_count = chunk_and_store_stream(pages, invoice_id, skip_small=skip_small)
+
+    return index_record(
+        invoice_id,
+        chunk_count,
+        sum(len(text or "") for text in pages)
+    )
+
+
+# =========================
+# Runner
+# =========================
+def run_backfill(
+    options: BackfillOptions = BackfillOptions(),
+    on_batch: Optional[Callable[[Dict], None]] = None
+) -> Dict:
+    """
+    Re-run structured extraction over every stored invoice.
+
+    Batches are read with keyset pagination, extracted across a
+    process pool (a bounded window of batches in flight) and
+    bulk-upserted in id order. The checkpoint is written after each
+    commit, so an interrupted run resumes after the last committed
+    batch. A finished checkpoint starts a fresh run.
+    """
+
+    state = None if options.restart else load_checkpoint()
+    if not state or state.get("finished_at"):
+        state = new_state(options)
+        save_checkpoint(state)
+
+    db = SessionLocal()
+    extract_pool = (
+        ProcessPoolExecutor(options.workers) if options.workers > 1 else None
+    )
+    index_pool = (
+        ThreadPoolExecutor(settings.INGEST_BATCH_INDEX_WORKERS)
+        if options.rechunk or options.reindex else None
+    )
+
+    window: Deque[Tuple[List[Tuple[str, str]], Future]] = deque()
+    max_in_flight = max(1, options.workers) * 2
+
+    def apply(rows: List[Tuple[str, str]], results) -> None:
+        inserted, updated = upsert_fields(db, results)
+
+        if index_pool:
+            raw_text = dict(rows)
+            records = index_pool.map(
+                lambda invoice_id: rechunk_invoice(invoice_id, raw_text[invoice_id]),
+                list(raw_text) if options.reindex
+                else stale_invoice_ids(db, list(raw_text))
+            )
+            for record in records:
+                db.merge(record)
+                state["rechunked"] += 1
+
+        db.commit()
+
+        state["last_invoice_id"] = rows[-1][0]
+        state["invoices"] += len(rows)
+        state["fields_inserted"] += inserted
+        state["fields_updated"] += updated
+        state["updated_at"] = datetime.utcnow().isoformat()
+        save_checkpoint(state)
+
+        if on_batch:
+            on_batch(state)
+
+    try:
+        batches = iter_invoice_batches(
+            db,
+            state["last_invoice_id"],
+            options.batch_size,
+            options.include_reviewed
+        )
+
+        for rows in batches:
+            if extract_pool is None:
+                apply(rows, extract_batch(rows))
+                continue
+
+            window.append((rows, extract_pool.submit(extract_batch, rows)))
+
+            if len(window) >= max_in_flight:
+                rows, future = window.popleft()
+                apply(rows, future.result())
+
+        while window:
+            rows, future = window.popleft()
+            apply(rows, future.result())
+
+        state["finished_at"] = datetime.utcnow().isoformat()
+        save_checkpoint(state)
+
+        return state
+    finally:
+        for _, future in window:
+            future.cancel()
+        if extract_pool:
+            extract_pool.shutdown(wait=True)
+        if index_pool:
+            index_pool.shutdown(wait=True)
+        db.close()
+
+
+class BackfillRunner:
+    """
+    Runs at most one backfill at a time in a background thread
+    (for the admin endpoint).
+    """
+
+    def __init__(self):
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        self._error: Optional[str] = None
+
+    def start(self, options: BackfillOptions) -> bool:
+        with self._lock:
+            if self.running:
+                return False
+
+            self._error = None
+            self._thread = threading.Thread(
+                target=self._run,
+                args=(options,),
+                name="backfill",
+                daemon=True
+            )
+            self._thread.start()
+            return True
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def status(self) -> Dict:
+        return {
+            "running": self.running,
+            "error": self._error,
+            "checkpoint": load_checkpoint()
+        }
+
+    def _run(self, options: BackfillOptions) -> None:
+        try:
+            run_backfill(options)
+        except Exception as e:
+            self._error = str(e)
+
+
+backfill_runner = BackfillRunner()
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Re-extract structured fields from stored invoice text."
+    )
+    parser.add_argument("--batch-size", type=int, default=settings.BACKFILL_BATCH_SIZE)
+    parser.add_argument("--workers", type=int, default=settings.BACKFILL_WORKERS)
+    parser.add_argument("--include-reviewed", action="store_true")
+    parser.add_argument("--rechunk", action="store_true")
+    parser.add_argument("--reindex", action="store_true")
+    parser.add_argument("--restart", action="store_true")
+    args = parser.parse_args()
+
+    options = BackfillOptions(
+        batch_size=args.batch_size,
+        workers=args.workers,
+        include_reviewed=args.include_reviewed,
+        rechunk=args.rechunk,
+        reindex=args.reindex,
+        restart=args.restart
+    )
+
+    def report(state: Dict) -> None:
+        print(
+            f"{state['invoices']} invoices, "
+            f"+{state['fields_inserted']} / ~{state['fields_updated']} fields, "
+            f"{state['rechunked']} re-chunked"
+        )
+
+    state = run_backfill(options, on_batch=report)
+    print(f"Done: {json.dumps(state, indent=2)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+import uuid
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Deque, Dict, List, NamedTuple, Tuple
+
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import Invoice, InvoiceDocument, InvoiceField, InvoicePage
+from app.ingestion.loader import PageText, SavedUpload, iter_document_pages
+from app.ingestion.parser import normalize_text
+from app.ingestion.pipeline import describe_invoice, find_duplicate, index_record
+from app.ingestion.structured_extractor import extract_structured_fields
+from app.rag.embedding_cache import EmbeddingUsage
+from app.rag.retriever import chunk_and_store_stream, delete_invoice_index
+
+
+class ExtractedDocument(NamedTuple):
+    pages: List[PageText]
+    raw_text: str
+    fields: Dict[str, str]
+
+
+def extract_document(upload: SavedUpload) -> ExtractedDocument:
+    """
+    CPU stage: load/OCR pages, normalize, extract structured fields.
+    """
+
+    pages = [
+        page._replace(text=normalize_text(page.text))
+        for page in iter_document_pages(upload.path)
+    ]
+    raw_text = " ".join(page.text for page in pages if page.text)
+
+    # Over the whole text, like ingest_document and the backfill
+    return ExtractedDocument(pages, raw_text, extract_structured_fields(raw_text))
+
+
+def index_document(
+    invoice_id: str,
+    document: ExtractedDocument
+) -> Tuple[int, EmbeddingUsage]:
+    """
+    I/O stage: chunk and embed.
+    """
+
+    usage = EmbeddingUsage()
+    chunks = chunk_and_store_stream(
+        (page.text for page in document.pages),
+        invoice_id,
+        usage=usage
+    )
+
+    return chunks, usage
+
+
+def build_rows(
+    invoice_id: str,
+    filename: str,
+    upload: SavedUpload,
+    document: ExtractedDocument,
+    chunk_count: int
+) -> List:
+    rows = [
+        Invoice(
+            id=invoice_id,
+            filename=filename,
+            ocr_used=any(page.ocr_used for page in document.pages),
+            raw_text=document.raw_text
+        ),
+        InvoiceDocument(
+            invoice_id=invoice_id,
+            sha256=upload.sha256,
+            size_bytes=upload.size,
+            file_path=upload.path
+        ),
+        index_record(
+            invoice_id,
+            chunk_count,
+            sum(len(page.text) for page in document.pages)
+        )
+    ]
+
+    rows += [
+        InvoicePage(
+            invoice_id=invoice_id,
+            page_number=page.page_number,
+            text=page.text,
+            ocr_used=page.ocr_used
+        )
+        for page in document.pages
+    ]
+    rows += [
+        InvoiceField(invoice_id=invoice_id, field=field, value=value)
+        for field, value in document.fields.items()
+    ]
+
+    return rows
+
+
+def ingest_batch(
+    db: Session,
+    uploads: List[Tuple[str, SavedUpload]],
+    force: bool = False
+) -> List[Dict]:
+    """
+    Ingest many uploads with the two stages pipelined:
+    while one document is being OCR'd/extracted, earlier ones are
+    already being embedded.
+
+    Rows are committed in bulk every INGEST_BATCH_COMMIT_SIZE
+    documents, once both stages have succeeded for them; if a commit
+    fails, those documents' stores are deleted again.
+    At most INGEST_BATCH_EXTRACT_WORKERS + INGEST_BATCH_INDEX_WORKERS
+    extracted documents are held in memory between the stages.
+    Returns one result per upload, in input order.
+    """
+
+    results: List[Dict] = [None] * len(uploads)
+    first_by_hash: Dict[str, int] = {}
+    to_process: List[int] = []
+
+    # Dedup against the DB and within the batch itself
+    for i, (filename, upload) in enumerate(uploads):
+        if upload.sha256 in first_by_hash:
+            results[i] = {
+                "filename": filename,
+                "status": "duplicate",
+                "duplicate_of": first_by_hash[upload.sha256]
+            }
+            continue
+        first_by_hash[upload.sha256] = i
+
+        existing = None if force else find_duplicate(db, upload.sha256)
+        if existing:
+            results[i] = {
+                "filename": filename,
+                "status": "duplicate",
+                **describe_invoice(db, existing)
+            }
+            continue
+
+        to_process.append(i)
+
+    extract_pool = ThreadPoolExecutor(settings.INGEST_BATCH_EXTRACT_WORKERS)
+    index_pool = ThreadPoolExecutor(settings.INGEST_BATCH_INDEX_WORKERS)
+
+    # Documents held between extraction and indexing: extraction only
+    # runs this far ahead of the embedding stage
+    window = (
+        settings.INGEST_BATCH_EXTRACT_WORKERS
+        + settings.INGEST_BATCH_INDEX_WORKERS
+    )
+    waiting = iter(to_process)
+    extracting: Deque[Tuple[int, Future]] = deque()
+    indexing: Deque[Tuple[int, str, ExtractedDocument, Future]] = deque()
+
+    pending_rows: List = []
+    pending_invoices: List[Tuple[int, str]] = []
+
+    def failed(i: int, error: Exception) -> Dict:
+        return {
+            "filename": uploads[i][0],
+            "status": "failed",
+            "error": str(error)
+        }
+
+    def fill() -> None:
+        while len(extracting) + len(indexing) < window:
+            i = next(waiting, None)
+            if i is None:
+                return
+            extracting.append(
+                (i, extract_pool.submit(extract_document, uploads[i][1]))
+            )
+
+    def commit_pending() -> None:
+        nonlocal pending_rows, pending_invoices
+
+        try:
+            db.add_all(pending_rows)
+            db.commit()
+        except Exception as e:
+            db.rollback()
+            # Their stores are already written: don't leave them orphaned
+            for i, invoice_id in pending_invoices:
+                delete_invoice_index(invoice_id)
+                results[i] = failed(i, e)
+
+        pending_rows, pending_invoices = [], []
+
+    try:
+        fill()
+
+        while extracting or indexing:
+            if (
+                extracting and indexing
+                and not extracting[0][1].done()
+                and not indexing[0][3].done()
+            ):
+                wait(
+                    [extracting[0][1], indexing[0][3]],
+                    return_when=FIRST_COMPLETED
+                )
+                continue
+
+            # Hand each document to the embedding stage as soon as its
+            # extraction is done, in submission order
+            if extracting and (extracting[0][1].done() or not indexing):
+                i, future = extracting.popleft()
+
+                try:
+                    document = future.result()
+                except Exception as e:
+                    results[i] = failed(i, e)
+                    fill()
+                    continue
+
+                invoice_id = str(uuid.uuid4())
+                indexing.append((
+                    i,
+                    invoice_id,
+                    document,
+                    index_pool.submit(index_document, invoice_id, document)
+                ))
+                continue
+
+            i, invoice_id, document, future = indexing.popleft()
+            filename, upload = uploads[i]
+
+            try:
+                chunks, usage = future.result()
+            except Exception as e:
+                delete_invoice_index(invoice_id)
+                results[i] = failed(i, e)
+                fill()
+                continue
+
+            pending_rows += build_rows(
+                invoice_id, filename, upload, document, chunks
+            )
+            pending_invoices.append((i, invoice_id))
+
+            results[i] = {
+                "filename": filename,
+                "status": "processed",
+                "invoice_id": invoice_id,
+                "ocr_used": any(p.ocr_used for p in document.pages),
+                "ocr_pages": [p.page_number for p in document.pages if p.ocr_used],
+                "fields": document.fields,
+                "chunks": chunks,
+                "embeddings": usage.as_dict()
+            }
+
+            if len(pending_invoices) >= settings.INGEST_BATCH_COMMIT_SIZE:
+                commit_pending()
+
+            fill()
+
+        if pending_rows:
+            commit_pending()
+    finally:
+        extract_pool.shutdown(wait=True, cancel_futures=True)
+        index_pool.shutdown(wait=True)
+
+    # Point in-batch duplicates at their first occurrence's invoice
+    for i, result in enumerate(results):
+        if "duplicate_of" in result:
+            first = results[result["duplicate_of"]]
+            results[i] = {
+                "filename": uploads[i][0],
+                "status": "duplicate" if first.get("invoice_id") else first["status"],
+                **{
+                    key: first.get(key)
+                    for key in ("invoice_id", "ocr_used", "ocr_pages", "fields", "error")
+                }
+            }
+
+    return results
@@ -0,0 +1,408 @@
+import logging
+import threading
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional
+
+from sqlalchemy import and_, func, insert, literal, or_, select
+from sqlalchemy.orm import Session
+
+from app.config import settings
+from app.database import (
+    IngestionJob,
+    Invoice,
+    InvoiceDocument,
+    InvoiceField,
+    InvoiceIndex,
+    InvoicePage,
+    SessionLocal
+)
+from app.ingestion.loader import SavedUpload
+from app.ingestion.pipeline import ingest_document
+
+
+# Pipeline stage → job column holding its progress counter
+STAGE_COLUMNS = {
+    "load_document": "pages_loaded",
+    "extract_structured_fields": "fields_extracted",
+    "chunk_and_store": "chunks_embedded",
+}
+
+# Minimum seconds between progress writes within one stage
+PROGRESS_INTERVAL = 0.5
+
+# Worker loop back-off after an error (database locked, ...)
+ERROR_BACKOFF_SECONDS = 1.0
+ERROR_BACKOFF_MAX_SECONDS = 30.0
+
+logger = logging.getLogger(__name__)
+
+
+class QueueFull(RuntimeError):
+    pass
+
+
+class LeaseLost(RuntimeError):
+    """
+    The job's lease couldn't be renewed: another worker may own it now.
+    """
+
+
+def enqueue_ingestion(
+    db: Session,
+    invoice_id: str,
+    filename: str,
+    upload: SavedUpload
+) -> IngestionJob:
+    """
+    Queue a saved upload for background ingestion.
+
+    The queue lives in the `ingestion_jobs` table, so it needs no
+    broker, survives restarts and is shared by every app worker.
+    Raises QueueFull when INGEST_QUEUE_MAX jobs are already waiting.
+    """
+
+    job_id = str(uuid.uuid4())
+    now = datetime.utcnow()
+
+    queued = (
+        select(func.count())
+        .select_from(IngestionJob)
+        .where(IngestionJob.status == "QUEUED")
+        .scalar_subquery()
+    )
+
+    # Count and insert in one statement, so concurrent uploads can't
+    # both pass the check
+    inserted = db.execute(
+        insert(IngestionJob).from_select(
+            [
+                "id", "invoice_id", "filename", "file_path", "sha256",
+                "size_bytes", "status", "created_at", "updated_at"
+            ],
+            select(
+                literal(job_id), literal(invoice_id), literal(filename),
+                literal(upload.path), literal(upload.sha256),
+                literal(upload.size), literal("QUEUED"), literal(now),
+                literal(now)
+            ).where(queued < settings.INGEST_QUEUE_MAX)
+        )
+    ).rowcount
+    db.commit()
+
+    if not inserted:
+        raise QueueFull(
+            f"Ingestion queue is full ({settings.INGEST_QUEUE_MAX} jobs waiting)"
+        )
+
+    job = db.get(IngestionJob, job_id)
+
+    ingestion_workers.start()
+    ingestion_workers.notify()
+
+    return job
+
+
+def describe_job(job: IngestionJob) -> Dict:
+    return {
+        "job_id": job.id,
+        "invoice_id": job.invoice_id,
+        "filename": job.filename,
+        "status": job.status,
+        "stage": job.stage,
+        "stages": {
+            "load_document": {"pages": job.pages_loaded or 0},
+            "extract_structured_fields": {"fields": job.fields_extracted or 0},
+            "chunk_and_store": {"chunks": job.chunks_embedded or 0},
+        },
+        "error": job.error,
+        "created_at": job.created_at,
+        "updated_at": job.updated_at
+    }
+
+
+def claimable(now: datetime):
+    """
+    QUEUED jobs, and RUNNING jobs whose worker's lease lapsed.
+    """
+
+    stale_before = now - timedelta(seconds=settings.INGEST_JOB_LEASE_SECONDS)
+
+    return or_(
+        IngestionJob.status == "QUEUED",
+        and_(
+            IngestionJob.status == "RUNNING",
+            IngestionJob.updated_at < stale_before
+        )
+    )
+
+
+def claim_next_job(worker_id: str) -> Optional[str]:
+    """
+    Atomically move the oldest claimable job to RUNNING for this worker.
+    """
+
+    db = SessionLocal()
+    try:
+        while True:
+            now = datetime.utcnow()
+            candidate = (
+                db.query(IngestionJob.id)
+                .filter(claimable(now))
+                .order_by(IngestionJob.created_at)
+                .first()
+            )
+
+            if not candidate:
+                return None
+
+            claimed = (
+                db.query(IngestionJob)
+                .filter(
+                    IngestionJob.id == candidate.id,
+                    claimable(now)
+                )
+                .update(
+                    {
+                        "status": "RUNNING",
+                        "claimed_by": worker_id,
+                        "updated_at": datetime.utcnow()
+                    },
+                    synchronize_session=False
+                )
+            )
+            db.commit()
+
+            # Lost the race to another worker: try the next one
+            if claimed:
+                return candidate.id
+    finally:
+        db.close()
+
+
+def renew_lease(job_id: str, worker_id: str) -> bool:
+    """
+    Mark the job as still being worked on; False if another worker
+    has since claimed it.
+    """
+
+    db = SessionLocal()
+    try:
+        renewed = (
+            db.query(IngestionJob)
+            .filter(
+                IngestionJob.id == job_id,
+                IngestionJob.status == "RUNNING",
+                IngestionJob.claimed_by == worker_id
+            )
+            .update(
+                {"updated_at": datetime.utcnow()},
+                synchronize_session=False
+            )
+        )
+        db.commit()
+        return bool(renewed)
+    finally:
+        db.close()
+
+
+def discard_partial_invoice(db: Session, invoice_id: str) -> None:
+    """
+    Remove what an interrupted or failed ingestion already committed
+    (the Invoice row, its pages, fields and index record), so the
+    invoice doesn't show up half-ingested. Completed ingestions
+    (with an InvoiceDocument row) are left alone.
+    """
+
+    completed = (
+        db.query(InvoiceDocument.id)
+        .filter(InvoiceDocument.invoice_id == invoice_id)
+        .first()
+    )
+    if completed:
+        return
+
+    for model in (InvoicePage, InvoiceField, InvoiceIndex):
+        db.query(model).filter(model.invoice_id == invoice_id).delete(
+            synchronize_session=False
+        )
+    db.query(Invoice).filter(Invoice.id == invoice_id).delete(
+        synchronize_session=False
+    )
+    db.commit()
+
+
+def run_job(job_id: str, worker_id: str) -> None:
+    """
+    Ingest one claimed job. If its lease is lost meanwhile, the
+    ingestion is abandoned at the next progress update and the job
+    left to the worker that reclaims it.
+    """
+
+    db = SessionLocal()
+    stop_heartbeat = threading.Event()
+    lease_lost = threading.Event()
+
+    def heartbeat() -> None:
+        interval = settings.INGEST_JOB_LEASE_SECONDS / 3
+        renewed_at = time.monotonic()
+        wait = interval
+
+        while not stop_heartbeat.wait(wait):
+            try:
+                renewed = renew_lease(job_id, worker_id)
+            except Exception:
+                logger.exception("Renewing the lease of job %s failed", job_id)
+                renewed = None
+
+            if renewed:
+                renewed_at = time.monotonic()
+                wait = interval
+                continue
+
+            if (
+                renewed is False
+                or time.monotonic() - renewed_at >= settings.INGEST_JOB_LEASE_SECONDS
+            ):
+                logger.warning("Lost the lease of job %s, abandoning it", job_id)
+                lease_lost.set()
+                return
+
+            # Retry well before the lease lapses
+            wait = min(interval, ERROR_BACKOFF_SECONDS)
+
+    def check_lease() -> None:
+        if lease_lost.is_set():
+            raise LeaseLost(f"Lease of job {job_id} lost")
+
+    try:
+        job = db.query(IngestionJob).filter(IngestionJob.id == job_id).first()
+
+        # Claimed again after its worker died: finish or restart it
+        if db.query(InvoiceDocument.id).filter(
+            InvoiceDocument.invoice_id == job.invoice_id
+        ).first():
+            job.status = "DONE"
+            job.stage = None
+            job.updated_at = datetime.utcnow()
+            db.commit()
+            return
+        discard_partial_invoice(db, job.invoice_id)
+
+        threading.Thread(
+            target=heartbeat,
+            name=f"ingestion-lease-{job_id[:8]}",
+            daemon=True
+        ).start()
+
+        current_stage = None
+        last_write = 0.0
+
+        def progress(stage: str, count: int) -> None:
+            nonlocal current_stage, last_write
+
+            check_lease()
+            setattr(job, STAGE_COLUMNS[stage], count)
+
+            now = time.monotonic()
+            if stage != current_stage or now - last_write >= PROGRESS_INTERVAL:
+                job.stage = current_stage = stage
+                job.updated_at = datetime.utcnow()
+                db.commit()
+                last_write = now
+
+        try:
+            ingest_document(
+                db=db,
+                invoice_id=job.invoice_id,
+                filename=job.filename,
+                upload=SavedUpload(job.file_path, job.sha256, job.size_bytes),
+                progress=progress
+            )
+            check_lease()
+            job.status = "DONE"
+            job.stage = None
+        except LeaseLost:
+            # The reclaiming worker cleans up and re-runs it
+            db.rollback()
+            return
+        except Exception as e:
+            db.rollback()
+            discard_partial_invoice(db, job.invoice_id)
+            job.status = "FAILED"
+            job.error = str(e)
+
+        job.updated_at = datetime.utcnow()
+        db.commit()
+    finally:
+        stop_heartbeat.set()
+        db.close()
+
+
+class IngestionWorkers:
+    """
+    Local pool of threads draining the ingestion job table.
+    OCR inside a job still fans out to the shared OCR process pool.
+    """
+
+    def __init__(self):
+        self._threads: List[threading.Thread] = []
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+
+    def start(self) -> None:
+        with self._lock:
+            if self._threads:
+                return
+
+            self._stop.clear()
+            for i in range(max(1, settings.INGEST_WORKERS)):
+                thread = threading.Thread(
+                    target=self._run,
+                    name=f"ingestion-worker-{i}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads.append(thread)
+
+    def notify(self) -> None:
+        self._wake.set()
+
+    def stop(self) -> None:
+        with self._lock:
+            self._stop.set()
+            self._wake.set()
+            for thread in self._threads:
+                thread.join()
+            self._threads = []
+
+    def _run(self) -> None:
+        worker_id = f"{threading.current_thread().name}-{uuid.uuid4().hex[:8]}"
+
+        backoff = ERROR_BACKOFF_SECONDS
+
+        while not self._stop.is_set():
+            try:
+                job_id = claim_next_job(worker_id)
+
+                if job_id is None:
+                    # Poll too, for jobs queued by other app processes
+                    self._wake.wait(settings.INGEST_POLL_SECONDS)
+                    self._wake.clear()
+                    continue
+
+                run_job(job_id, worker_id)
+            except Exception:
+                # Keep the worker alive: a job left RUNNING is picked
+                # up again once its lease lapses
+                logger.exception("Ingestion worker %s failed", worker_id)
+                self._stop.wait(backoff)
+                backoff = min(backoff * 2, ERROR_BACKOFF_MAX_SECONDS)
+                continue
+
+            backoff = ERROR_BACKOFF_SECONDS
+
+
+ingestion_workers = IngestionWorkers()
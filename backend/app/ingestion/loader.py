@@ -1,57 +1,192 @@
+import hashlib
 import os
-from typing import Tuple
+import tempfile
+from collections import deque
+from typing import Iterator, List, NamedTuple, Optional, Tuple
 from pypdf import PdfReader
 from PIL import Image
 
 from app.config import settings
-from app.ingestion.ocr import run_ocr_on_image
+from app.ingestion.ocr import run_ocr_on_image, iter_ocr_results
+from app.ingestion.preprocess import open_image_for_ocr
 
 
-def save_upload(file) -> str:
+class UploadTooLarge(ValueError):
+    pass
+
+
+class SavedUpload(NamedTuple):
+    path: str
+    sha256: str
+    size: int
+
+
+def upload_path_for(sha256: str, filename: str) -> str:
+    """
+    Content-addressed, fanned-out location for an upload:
+    UPLOAD_PATH/ab/cd/<sha256><ext>
+    """
+
+    extension = os.path.splitext(filename or "")[1].lower()
+
+    return os.path.join(
+        settings.UPLOAD_PATH,
+        sha256[:2],
+        sha256[2:4],
+        f"{sha256}{extension}"
+    )
+
+
+def save_upload(file) -> SavedUpload:
     """
     Save uploaded file to disk safely.
+
+    - Streams in fixed-size chunks (constant memory)
+    - Hashes while streaming
+    - Aborts as soon as MAX_UPLOAD_BYTES is exceeded
+    - Writes to a private temp file, then atomically renames it to
+      its content address, so concurrent uploads never collide
     """
-    os.makedirs(settings.UPLOAD_PATH, exist_ok=True)
 
-    file_path = os.path.join(settings.UPLOAD_PATH, file.filename)
+    max_bytes = settings.MAX_UPLOAD_BYTES
+
+    if getattr(file, "size", None) and file.size > max_bytes:
+        raise UploadTooLarge(
+            f"Upload exceeds the {max_bytes} byte limit"
+        )
+
+    tmp_dir = os.path.join(settings.UPLOAD_PATH, "tmp")
+    os.makedirs(tmp_dir, exist_ok=True)
 
-    with open(file_path, "wb") as f:
-        f.write(file.file.read())
+    digest = hashlib.sha256()
+    size = 0
 
-    return file_path
+    with tempfile.NamedTemporaryFile(dir=tmp_dir, delete=False) as tmp:
+        try:
+            while True:
+                chunk = file.file.read(settings.UPLOAD_CHUNK_BYTES)
+                if not chunk:
+                    break
+
+                size += len(chunk)
+                if size > max_bytes:
+                    raise UploadTooLarge(
+                        f"Upload exceeds the {max_bytes} byte limit"
+                    )
+
+                digest.update(chunk)
+                tmp.write(chunk)
+        except BaseException:
+            tmp.close()
+            os.unlink(tmp.name)
+            raise
+
+    sha256 = digest.hexdigest()
+    file_path = upload_path_for(sha256, file.filename)
+
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    os.replace(tmp.name, file_path)
+
+    return SavedUpload(file_path, sha256, size)
+
+
+class PageText(NamedTuple):
+    page_number: int
+    text: str
+    ocr_used: bool
 
 
 def load_document(file_path: str) -> Tuple[str, bool]:
     """
     Load document and return:
     - extracted text
-    - whether OCR was used
+    - whether OCR was used (on any page)
+    """
+
+    pages = load_document_pages(file_path)
+
+    text = "\n".join(page.text for page in pages)
+    used_ocr = any(page.ocr_used for page in pages)
+
+    return text, used_ocr
+
+
+def load_document_pages(file_path: str) -> List[PageText]:
+    """
+    Load document page by page.
+    Images are treated as a single OCR'd page.
+    """
+    return list(iter_document_pages(file_path))
+
+
+def iter_document_pages(file_path: str) -> Iterator[PageText]:
+    """
+    Stream a document's pages in order, one at a time.
     """
 
     if file_path.lower().endswith(".pdf"):
-        return load_pdf(file_path)
+        yield from iter_pdf_pages(file_path)
+        return
 
     if file_path.lower().endswith((".png", ".jpg", ".jpeg")):
-        text = run_ocr_on_image(Image.open(file_path))
-        return text, True
+        text = run_ocr_on_image(open_image_for_ocr(file_path))
+        yield PageText(1, text, True)
+        return
 
     raise ValueError("Unsupported file type")
-    
 
-def load_pdf(file_path: str) -> Tuple[str, bool]:
+
+def render_page_image(page) -> Optional[Image.Image]:
+    """
+    Return the image to OCR for a PDF page.
+
+    Scanned PDFs carry each page as one embedded raster image,
+    so the largest image on the page is used.
+    """
+
+    images = [img.image for img in page.images if img.image is not None]
+
+    if not images:
+        return None
+
+    return max(images, key=lambda img: img.width * img.height)
+
+
+def needs_ocr(page_text: str) -> bool:
+    """
+    Heuristic: a page without a usable text layer is scanned.
+    """
+    return len(page_text.strip()) < settings.OCR_PAGE_MIN_CHARS
+
+
+def load_pdf(file_path: str) -> List[PageText]:
+    return list(iter_pdf_pages(file_path))
+
+
+def iter_pdf_pages(file_path: str) -> Iterator[PageText]:
+    """
+    Classify each page on its own: keep the text layer where
+    there is one, OCR only the pages without.
+
+    Pages are yielded as they're ready; scanned pages are OCR'd in
+    the pool while later pages are still being read.
+    """
+
     reader = PdfReader(file_path)
 
-    text = ""
-    for page in reader.pages:
-        page_text = page.extract_text() or ""
-        text += page_text + "\n"
+    # Text layers of pages handed to the OCR window but not yet yielded
+    layer_text = deque()
 
-    # Heuristic: scanned PDF if text is too small
-    if len(text.strip()) < 100:
-        ocr_text = ""
+    def page_images():
         for page in reader.pages:
-            image = page.to_image()
-            ocr_text += run_ocr_on_image(image)
-        return ocr_text, True
+            text = page.extract_text() or ""
+            layer_text.append(text)
+            yield render_page_image(page) if needs_ocr(text) else None
+
+    for index, ocr_result in enumerate(iter_ocr_results(page_images())):
+        text = layer_text.popleft()
 
-    return text, False
+        if ocr_result.strip():
+            yield PageText(index + 1, ocr_result, True)
+        else:
+            yield PageText(index + 1, text, False)
@@ -1,14 +1,195 @@
+import threading
+from collections import deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Deque, Iterable, Iterator, List, Optional, Tuple, Union
+
 import pytesseract
 from PIL import Image
 
+from app.config import settings
+from app.ingestion.ocr_cache import ocr_cache
+from app.ingestion.preprocess import preprocess_for_ocr
 
-def run_ocr_on_image(image: Image.Image) -> str:
+
+_ocr_pool: Optional[ProcessPoolExecutor] = None
+_ocr_pool_lock = threading.Lock()
+
+
+def image_to_text(image: Image.Image) -> str:
     """
-    Run OCR on an image and return extracted text.
+    Run tesseract on an image (uncached; this is what pool workers run).
     """
 
     try:
-        text = pytesseract.image_to_string(image)
+        text = pytesseract.image_to_string(
+            image,
+            lang=settings.OCR_LANG,
+            config=settings.OCR_CONFIG
+        )
         return text
     except Exception as e:
         raise RuntimeError(f"OCR failed: {e}")
+
+
+def prepare_image(image: Image.Image) -> Image.Image:
+    if settings.OCR_PREPROCESS:
+        return preprocess_for_ocr(image)
+    return image
+
+
+def ocr_page(image: Image.Image) -> str:
+    """
+    Pre-process and OCR one page image (uncached). Runs in the pool
+    workers, so pre-processing is spread across them too.
+    """
+    return image_to_text(prepare_image(image))
+
+
+def cache_key(image: Image.Image) -> Optional[str]:
+    """
+    Cache key of an unprocessed page image: the pre-processing
+    settings are part of it, since they change what tesseract sees.
+    """
+
+    if not settings.OCR_CACHE_ENABLED:
+        return None
+
+    preprocess = (
+        f"preprocess:{settings.OCR_TARGET_DPI}:{settings.OCR_CROP_TO_CONTENT}"
+        if settings.OCR_PREPROCESS else "raw"
+    )
+    return ocr_cache.make_key(
+        image, settings.OCR_LANG, f"{settings.OCR_CONFIG}|{preprocess}"
+    )
+
+
+def run_ocr_on_image(image: Image.Image) -> str:
+    """
+    Run OCR on an image and return extracted text.
+    Repeat pages are served from the OCR cache.
+    """
+
+    key = cache_key(image)
+
+    if key:
+        cached = ocr_cache.get(key)
+        if cached is not None:
+            return cached
+
+    text = ocr_page(image)
+
+    if key:
+        ocr_cache.put(key, text)
+
+    return text
+
+
+def get_ocr_pool() -> ProcessPoolExecutor:
+    """
+    Return the process pool shared by all OCR requests.
+    Created lazily so importing this module stays cheap.
+    """
+
+    global _ocr_pool
+
+    with _ocr_pool_lock:
+        if _ocr_pool is None:
+            _ocr_pool = ProcessPoolExecutor(
+                max_workers=max(1, settings.OCR_WORKERS)
+            )
+        return _ocr_pool
+
+
+def shutdown_ocr_pool() -> None:
+    """
+    Stop the shared OCR pool (app shutdown, or resizing it).
+    """
+
+    global _ocr_pool
+
+    with _ocr_pool_lock:
+        if _ocr_pool is not None:
+            _ocr_pool.shutdown(wait=True)
+            _ocr_pool = None
+
+
+def run_ocr_on_images(
+    images: Iterable[Optional[Image.Image]],
+    max_in_flight: Optional[int] = None
+) -> List[str]:
+    """
+    OCR a sequence of page images, returning the texts in page order.
+    """
+    return list(iter_ocr_results(images, max_in_flight))
+
+
+def iter_ocr_results(
+    images: Iterable[Optional[Image.Image]],
+    max_in_flight: Optional[int] = None
+) -> Iterator[str]:
+    """
+    OCR a stream of page images in the shared process pool.
+
+    - Results are yielded in page order, as soon as they're ready.
+    - At most `max_in_flight` pages of this document are queued
+      at once, so one large upload can't monopolise the pool.
+    - Images are pulled lazily, so only a small window of pages
+      is held in memory at any time.
+    - `None` entries (pages with nothing to OCR) yield "".
+    - Cache lookups happen here, so only misses reach the pool;
+      pre-processing runs in the pool with the OCR.
+    """
+
+    if max_in_flight is None:
+        max_in_flight = settings.OCR_MAX_PAGES_PER_DOCUMENT
+    max_in_flight = max(1, max_in_flight)
+
+    # Single worker: no point paying for pickling
+    if settings.OCR_WORKERS <= 1:
+        for image in images:
+            yield run_ocr_on_image(image) if image is not None else ""
+        return
+
+    pool = get_ocr_pool()
+    window: Deque[Tuple[Union[str, Future], Optional[str]]] = deque()
+    in_flight = 0
+
+    def resolve():
+        nonlocal in_flight
+        result, key = window.popleft()
+
+        if isinstance(result, Future):
+            in_flight -= 1
+            result = result.result()
+            if key:
+                ocr_cache.put(key, result)
+
+        return result
+
+    def head_ready() -> bool:
+        head = window[0][0]
+        return not isinstance(head, Future) or head.done()
+
+    for image in images:
+        if image is None:
+            window.append(("", None))
+        else:
+            key = cache_key(image)
+            cached = ocr_cache.get(key) if key else None
+
+            if cached is not None:
+                window.append((cached, None))
+            else:
+                window.append((pool.submit(ocr_page, image), key))
+                in_flight += 1
+
+        # Hand back finished pages; block once the window is full
+        while window and (
+            head_ready()
+            or in_flight >= max_in_flight
+            or len(window) >= 4 * max_in_flight
+        ):
+            yield resolve()
+
+    while window:
+        yield resolve()
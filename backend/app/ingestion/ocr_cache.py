@@ -0,0 +1,150 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Optional
+
+from PIL import Image
+
+from app.config import settings
+
+
+class OCRCache:
+    """
+    Persistent OCR result cache.
+
+    - Keyed by a hash of the page pixels + tesseract lang/config
+    - Stored in a small SQLite file, safe to share across workers
+    - Size-bounded: least recently used entries are evicted first
+    """
+
+    def __init__(self, path: str, max_bytes: int):
+        self.path = path
+        self.max_bytes = max_bytes
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS ocr_cache (
+                    key TEXT PRIMARY KEY,
+                    text TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_ocr_cache_last_access "
+                "ON ocr_cache (last_access)"
+            )
+            conn.commit()
+            self._conn = conn
+
+        return self._conn
+
+    @staticmethod
+    def make_key(image: Image.Image, lang: str, config: str) -> str:
+        """
+        Hash the page image, plus how it will be prepared and read
+        (`config` carries the pre-processing settings).
+        """
+
+        digest = hashlib.sha256()
+        digest.update(f"{image.mode}|{image.size}|{lang}|{config}|".encode())
+        digest.update(image.tobytes())
+
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT text FROM ocr_cache WHERE key = ?", (key,)
+            ).fetchone()
+
+            if row is None:
+                self.misses += 1
+                return None
+
+            conn.execute(
+                "UPDATE ocr_cache SET last_access = ? WHERE key = ?",
+                (time.time(), key)
+            )
+            conn.commit()
+            self.hits += 1
+
+            return row[0]
+
+    def put(self, key: str, text: str) -> None:
+        size = len(text.encode("utf-8"))
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute(
+                "INSERT OR REPLACE INTO ocr_cache (key, text, size, last_access) "
+                "VALUES (?, ?, ?, ?)",
+                (key, text, size, time.time())
+            )
+            self._evict(conn)
+            conn.commit()
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM ocr_cache"
+        ).fetchone()[0]
+
+        if total <= self.max_bytes:
+            return
+
+        # Evict down to 90% so we don't evict on every insert
+        target = int(self.max_bytes * 0.9)
+        rows = conn.execute(
+            "SELECT key, size FROM ocr_cache ORDER BY last_access"
+        )
+
+        victims = []
+        for key, size in rows:
+            if total <= target:
+                break
+            victims.append((key,))
+            total -= size
+
+        conn.executemany("DELETE FROM ocr_cache WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM ocr_cache"
+            ).fetchone()
+
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+
+ocr_cache = OCRCache(
+    path=settings.OCR_CACHE_PATH,
+    max_bytes=settings.OCR_CACHE_MAX_BYTES
+)
@@ -0,0 +1,214 @@
+from datetime import datetime
+from typing import Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy.orm import Session
+
+from app.database import (
+    Invoice,
+    InvoiceDocument,
+    InvoiceField,
+    InvoiceIndex,
+    InvoicePage
+)
+from app.ingestion.loader import SavedUpload, iter_document_pages
+from app.ingestion.parser import normalize_text
+from app.ingestion.structured_extractor import extract_structured_fields
+from app.rag.embedding_cache import EmbeddingUsage
+from app.rag.retriever import chunk_and_store_stream, chunk_config_signature
+
+
+# Page rows flushed to the DB per commit
+PAGE_COMMIT_BATCH = 50
+
+# progress(stage, count): pages loaded / fields extracted / chunks embedded
+ProgressCallback = Callable[[str, int], None]
+
+
+def no_progress(stage: str, count: int) -> None:
+    pass
+
+
+def find_duplicate(db: Session, sha256: str) -> Optional[Invoice]:
+    """
+    Return the most recent fully ingested invoice with this content hash.
+    """
+
+    document = (
+        db.query(InvoiceDocument)
+        .filter(InvoiceDocument.sha256 == sha256)
+        .order_by(InvoiceDocument.created_at.desc())
+        .first()
+    )
+
+    if not document:
+        return None
+
+    return db.query(Invoice).filter(Invoice.id == document.invoice_id).first()
+
+
+def describe_invoice(db: Session, invoice: Invoice) -> Dict:
+    """
+    Summary of an already ingested invoice, in ingest_document's shape.
+    """
+
+    fields = (
+        db.query(InvoiceField)
+        .filter(InvoiceField.invoice_id == invoice.id)
+        .all()
+    )
+    ocr_pages = (
+        db.query(InvoicePage.page_number)
+        .filter(
+            InvoicePage.invoice_id == invoice.id,
+            InvoicePage.ocr_used.is_(True)
+        )
+        .order_by(InvoicePage.page_number)
+        .all()
+    )
+
+    return {
+        "invoice_id": invoice.id,
+        "ocr_used": invoice.ocr_used,
+        "ocr_pages": [page_number for (page_number,) in ocr_pages],
+        "fields": {f.field: f.value for f in fields}
+    }
+
+
+def index_record(
+    invoice_id: str,
+    chunk_count: int,
+    total_chars: int
+) -> InvoiceIndex:
+    """
+    Row describing how an invoice's vector store was built.
+    """
+
+    return InvoiceIndex(
+        invoice_id=invoice_id,
+        chunk_config=chunk_config_signature(),
+        chunk_count=chunk_count,
+        total_chars=total_chars,
+        updated_at=datetime.utcnow()
+    )
+
+
+def ingest_document(
+    db: Session,
+    invoice_id: str,
+    filename: str,
+    upload: SavedUpload,
+    progress: Optional[ProgressCallback] = None
+) -> Dict:
+    """
+    Stream a document through the ingestion pipeline:
+    load page → normalize → persist page → extract fields → chunk/embed.
+
+    Pages flow through one at a time and chunks are embedded in
+    bounded batches, so working memory stays flat however long the
+    document is. Only the joined raw_text grows with the document,
+    since it is stored on the Invoice row; fields are extracted from
+    it once all pages are in.
+
+    `progress` is told about each stage as it advances.
+    """
+
+    progress = progress or no_progress
+
+    invoice = Invoice(
+        id=invoice_id,
+        filename=filename,
+        ocr_used=False,
+        raw_text=""
+    )
+    db.add(invoice)
+    db.commit()
+
+    raw_text_parts: List[str] = []
+    ocr_pages: List[int] = []
+
+    def normalized_pages() -> Iterator[str]:
+        pending = 0
+
+        for page in iter_document_pages(upload.path):
+            text = normalize_text(page.text)
+
+            db.add(
+                InvoicePage(
+                    invoice_id=invoice_id,
+                    page_number=page.page_number,
+                    text=text,
+                    ocr_used=page.ocr_used
+                )
+            )
+            pending += 1
+            if pending >= PAGE_COMMIT_BATCH:
+                db.commit()
+                pending = 0
+
+            if page.ocr_used:
+                ocr_pages.append(page.page_number)
+
+            if text:
+                raw_text_parts.append(text)
+
+            progress("load_document", page.page_number)
+
+            yield text
+
+        db.commit()
+
+    usage = EmbeddingUsage()
+
+    chunk_count = chunk_and_store_stream(
+        normalized_pages(),
+        invoice_id,
+        on_batch=lambda count: progress("chunk_and_store", count),
+        usage=usage
+    )
+
+    invoice.raw_text = " ".join(raw_text_parts)
+    invoice.ocr_used = bool(ocr_pages)
+
+    # Over the whole text, as the backfill does: rules rank matches
+    # across pages (a later "Grand Total" beats an early "Total")
+    fields = extract_structured_fields(invoice.raw_text)
+
+    for field, value in fields.items():
+        db.add(
+            InvoiceField(
+                invoice_id=invoice_id,
+                field=field,
+                value=value
+            )
+        )
+
+    db.add(
+        index_record(
+            invoice_id,
+            chunk_count,
+            sum(len(text) for text in raw_text_parts)
+        )
+    )
+
+    # Recorded last, so only complete ingestions are reused by dedup
+    db.add(
+        InvoiceDocument(
+            invoice_id=invoice_id,
+            sha256=upload.sha256,
+            size_bytes=upload.size,
+            file_path=upload.path
+        )
+    )
+
+    db.commit()
+
+    progress("extract_structured_fields", len(fields))
+
+    return {
+        "invoice_id": invoice_id,
+        "ocr_used": invoice.ocr_used,
+        "ocr_pages": ocr_pages,
+        "fields": fields,
+        "chunks": chunk_count,
+        "embeddings": usage.as_dict()
+    }
@@ -0,0 +1,150 @@
+from typing import Optional
+
+from PIL import Image
+
+from app.config import settings
+
+
+# Long side of an A4 page; used when an image carries no usable DPI
+PAGE_LONG_SIDE_INCHES = 11.7
+
+
+def estimate_dpi(image: Image.Image) -> float:
+    """
+    Estimate the scan resolution of a page image.
+
+    Phone photos and embedded PDF images often report 72 DPI (or
+    nothing), so metadata is only trusted when it looks like a scanner.
+    """
+
+    dpi = image.info.get("dpi")
+    if dpi and dpi[0] >= 100:
+        return float(dpi[0])
+
+    return max(image.size) / PAGE_LONG_SIDE_INCHES
+
+
+def open_image_for_ocr(file_path: str) -> Image.Image:
+    """
+    Open an image file for OCR.
+
+    JPEGs are decoded in draft mode: grayscale and already scaled
+    down by 1/2, 1/4 or 1/8 towards the target DPI, which avoids
+    decoding a 12 MP photo at full size.
+    """
+
+    image = Image.open(file_path)
+
+    if settings.OCR_PREPROCESS and image.format == "JPEG":
+        full_width = image.width
+        scale = settings.OCR_TARGET_DPI / estimate_dpi(image)
+
+        if scale < 1:
+            image.draft(
+                "L",
+                (int(image.width * scale), int(image.height * scale))
+            )
+
+            # Keep DPI metadata in step with the reduced pixel size
+            dpi = image.info.get("dpi")
+            if dpi:
+                factor = image.width / full_width
+                image.info["dpi"] = (dpi[0] * factor, dpi[1] * factor)
+
+    return image
+
+
+def otsu_threshold(image: Image.Image) -> int:
+    """
+    Otsu's threshold from the 256-bin histogram of a grayscale image.
+    """
+
+    histogram = image.histogram()
+    total = sum(histogram)
+    sum_all = sum(i * h for i, h in enumerate(histogram))
+
+    weight_bg = 0
+    sum_bg = 0.0
+    best_threshold, best_variance = 127, 0.0
+
+    for level, count in enumerate(histogram):
+        weight_bg += count
+        if weight_bg == 0:
+            continue
+
+        weight_fg = total - weight_bg
+        if weight_fg == 0:
+            break
+
+        sum_bg += level * count
+        mean_bg = sum_bg / weight_bg
+        mean_fg = (sum_all - sum_bg) / weight_fg
+
+        variance = weight_bg * weight_fg * (mean_bg - mean_fg) ** 2
+        if variance > best_variance:
+            best_threshold, best_variance = level, variance
+
+    return best_threshold
+
+
+def content_box(image: Image.Image, threshold: int, margin: int = 10):
+    """
+    Bounding box of the dark (ink) pixels, padded by `margin`.
+    """
+
+    box = image.point(lambda p: 255 if p <= threshold else 0).getbbox()
+
+    if box is None:
+        return None
+
+    left, top, right, bottom = box
+
+    return (
+        max(0, left - margin),
+        max(0, top - margin),
+        min(image.width, right + margin),
+        min(image.height, bottom + margin)
+    )
+
+
+def preprocess_for_ocr(
+    image: Image.Image,
+    target_dpi: Optional[int] = None,
+    crop: Optional[bool] = None
+) -> Image.Image:
+    """
+    Prepare a page image for tesseract:
+    1. grayscale
+    2. downsample to the target DPI (never upsample)
+    3. optionally crop to the content area
+    4. binarize with an Otsu threshold
+    """
+
+    if target_dpi is None:
+        target_dpi = settings.OCR_TARGET_DPI
+    if crop is None:
+        crop = settings.OCR_CROP_TO_CONTENT
+
+    if image.mode == "1":
+        return image
+
+    # Measure before converting: convert() drops image.info
+    scale = target_dpi / estimate_dpi(image)
+
+    gray = image.convert("L")
+
+    if scale < 1:
+        gray = gray.resize(
+            (max(1, int(gray.width * scale)), max(1, int(gray.height * scale))),
+            Image.Resampling.BILINEAR,
+            reducing_gap=2.0
+        )
+
+    threshold = otsu_threshold(gray)
+
+    if crop:
+        box = content_box(gray, threshold)
+        if box:
+            gray = gray.crop(box)
+
+    return gray.point(lambda p: 255 if p > threshold else 0, mode="1")
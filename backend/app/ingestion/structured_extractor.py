@@ -1,58 +1,208 @@
 import re
-from typing import Dict
+from typing import Callable, Dict, List, NamedTuple, Optional, Pattern, Tuple, Union
+
+
+class FieldRule(NamedTuple):
+    field: str
+    priority: int              # lower wins; order of registration
+    keywords: Tuple[str, ...]  # lowercase literals the pattern starts with
+    pattern: Pattern
+
+
+# Field registry: regex rules + free-form extractors (e.g. line heuristics)
+FIELD_RULES: List[FieldRule] = []
+FIELD_EXTRACTORS: Dict[str, Callable[[str], Optional[str]]] = {}
+
+# keyword → rules it triggers, best-priority keywords first
+_keyword_index: Optional[List[Tuple[str, List[FieldRule]]]] = None
+
+
+def register_field(
+    field: str,
+    patterns: List[Tuple[Union[str, Tuple[str, ...]], str]]
+) -> None:
+    """
+    Register regex rules for a field.
+
+    `patterns` is a list of (keywords, pattern) pairs, highest priority
+    first. The pattern must capture the value in group 1 and must start
+    with one of its keywords: lowercase literals such as "invoice" or
+    ("usd", "eur"). The pattern is only tried where a keyword occurs.
+    """
+
+    global _keyword_index
+
+    existing = sum(1 for rule in FIELD_RULES if rule.field == field)
+
+    for offset, (keywords, pattern) in enumerate(patterns):
+        if isinstance(keywords, str):
+            keywords = (keywords,)
+
+        FIELD_RULES.append(
+            FieldRule(
+                field=field,
+                priority=existing + offset,
+                keywords=tuple(keywords),
+                pattern=re.compile(pattern, re.IGNORECASE)
+            )
+        )
+
+    _keyword_index = None
+
+
+def register_extractor(
+    field: str,
+    extractor: Callable[[str], Optional[str]]
+) -> None:
+    """
+    Register a free-form extractor for fields regex can't express.
+    Regex rules for the same field take precedence.
+    """
+    FIELD_EXTRACTORS[field] = extractor
+
+
+def keyword_index() -> List[Tuple[str, List[FieldRule]]]:
+    global _keyword_index
+
+    if _keyword_index is None:
+        by_keyword: Dict[str, List[FieldRule]] = {}
+        for rule in FIELD_RULES:
+            for keyword in rule.keywords:
+                by_keyword.setdefault(keyword, []).append(rule)
+
+        _keyword_index = sorted(
+            by_keyword.items(),
+            key=lambda item: min(rule.priority for rule in item[1])
+        )
+
+    return _keyword_index
 
 
 def extract_structured_fields(text: str) -> Dict[str, str]:
     """
     Extract key invoice fields using regex + heuristics.
     This is deterministic and safe (no LLM).
+
+    Rules never scan the text themselves. Each distinct keyword is
+    located once (str.find on a lowercased copy) and only the rules it
+    triggers are tried, anchored at that spot. Adding rules behind an
+    existing keyword therefore costs a few anchored matches, not
+    another full-text regex search.
+
+    Per field, the highest-priority rule wins and, within a rule, the
+    earliest match — the same result as trying patterns in order.
     """
 
-    fields = {}
-
-    # -------- Invoice Number --------
-    invoice_no_patterns = [
-        r"invoice\s*no[:\s]*([A-Z0-9\-\/]+)",
-        r"invoice\s*number[:\s]*([A-Z0-9\-\/]+)",
-    ]
-
-    for pattern in invoice_no_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            fields["invoice_number"] = match.group(1)
-            break
-
-    # -------- Invoice Date --------
-    date_patterns = [
-        r"date[:\s]*([0-9]{2}[\/\-][0-9]{2}[\/\-][0-9]{4})",
-        r"date[:\s]*([0-9]{4}[\/\-][0-9]{2}[\/\-][0-9]{2})",
-    ]
-
-    for pattern in date_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            fields["invoice_date"] = match.group(1)
-            break
-
-    # -------- Total Amount --------
-    total_patterns = [
-        r"total\s*amount[:\s₹$]*([0-9,]+\.\d{2})",
-        r"grand\s*total[:\s₹$]*([0-9,]+\.\d{2})",
-        r"total[:\s₹$]*([0-9,]+\.\d{2})",
-    ]
-
-    for pattern in total_patterns:
-        match = re.search(pattern, text, re.IGNORECASE)
-        if match:
-            fields["total_amount"] = match.group(1)
-            break
-
-    # -------- Vendor Name (heuristic) --------
+    lowered = text.lower()
+
+    # Lowercasing can change length for some non-ASCII characters,
+    # which would shift offsets; fall back to case-folded ASCII only
+    if len(lowered) != len(text):
+        lowered = "".join(
+            c.lower() if len(c.lower()) == 1 else c for c in text
+        )
+
+    best: Dict[str, Tuple[int, int, str]] = {}
+
+    for keyword, rules in keyword_index():
+        position = lowered.find(keyword)
+
+        while position != -1:
+            live = False
+
+            for rule in rules:
+                current = best.get(rule.field)
+                if current and current[:2] <= (rule.priority, position):
+                    continue
+
+                live = True
+                match = rule.pattern.match(text, position)
+                if match:
+                    best[rule.field] = (rule.priority, position, match.group(1))
+
+            # Nothing left that a later hit could improve on
+            if not live:
+                break
+
+            position = lowered.find(keyword, position + 1)
+
+    fields = {field: value for field, (_, _, value) in best.items()}
+
+    for field, extractor in FIELD_EXTRACTORS.items():
+        if field not in fields:
+            value = extractor(text)
+            if value:
+                fields[field] = value
+
+    return fields
+
+
+# =========================
+# Field definitions
+# =========================
+DATE = r"([0-9]{2}[\/\-][0-9]{2}[\/\-][0-9]{4}|[0-9]{4}[\/\-][0-9]{2}[\/\-][0-9]{2})"
+WORD_DATE = (
+    r"((?:jan|feb|mar|apr|may|jun|jul|aug|sep|oct|nov|dec)[a-z]*\.?"
+    r"\s+[0-9]{1,2},?\s+[0-9]{4})"
+)
+AMOUNT = r"([0-9,]+\.\d{2})"
+CURRENCY_CODES = ("usd", "eur", "gbp", "inr", "aud", "cad", "sgd", "jpy")
+
+# -------- Invoice Number --------
+register_field("invoice_number", [
+    ("invoice", r"invoice\s*no[:\s]*([A-Z0-9\-\/]+)"),
+    ("invoice", r"invoice\s*number[:\s]*([A-Z0-9\-\/]+)"),
+])
+
+# -------- Invoice Date --------
+register_field("invoice_date", [
+    ("date", r"date[:\s]*" + DATE),
+    ("date", r"date[:\s]*" + WORD_DATE),
+])
+
+# -------- Due Date --------
+register_field("due_date", [
+    ("due", r"due\s*date[:\s]*" + DATE),
+    ("due", r"due\s*date[:\s]*" + WORD_DATE),
+])
+
+# -------- Total Amount --------
+register_field("total_amount", [
+    ("total", r"total\s*amount[:\s₹$]*" + AMOUNT),
+    ("grand", r"grand\s*total[:\s₹$]*" + AMOUNT),
+    ("total", r"total[:\s₹$]*" + AMOUNT),
+])
+
+# -------- Tax / GST --------
+register_field("tax_amount", [
+    (("tax", "gst", "vat"), r"(?:tax|gst|vat)(?:\s*amount)?(?:\s*\([^)]*\))?[:\s₹$]*" + AMOUNT),
+])
+
+register_field("gst_number", [
+    ("gst", r"gst(?:in)?\s*(?:no|number)?[.:\s]*([0-9]{2}[A-Z]{5}[0-9]{4}[A-Z][A-Z0-9]Z[A-Z0-9])"),
+])
+
+# -------- Purchase Order --------
+register_field("po_number", [
+    ("purchase", r"purchase\s*order\s*(?:no|number|#)?[.:\s#]*([A-Z0-9\-\/]*[0-9][A-Z0-9\-\/]*)"),
+    (("po", "p.o"), r"\bp\.?o\b\.?\s*(?:no|number|#)?[.:\s#]*([A-Z0-9\-\/]*[0-9][A-Z0-9\-\/]*)"),
+])
+
+# -------- Currency --------
+register_field("currency", [
+    (CURRENCY_CODES, r"\b(" + "|".join(CURRENCY_CODES) + r")\b"),
+    (("₹", "$", "€", "£"), r"([₹$€£])"),
+])
+
+
+# -------- Vendor Name (heuristic) --------
+def extract_vendor(text: str) -> Optional[str]:
     # Assume vendor is in first 5 lines
     lines = text.split("\n")[:5]
     for line in lines:
         if len(line.strip()) > 3 and not re.search(r"invoice|date|gst", line, re.IGNORECASE):
-            fields["vendor"] = line.strip()
-            break
+            return line.strip()
+    return None
 
-    return fields
+
+register_extractor("vendor", extract_vendor)
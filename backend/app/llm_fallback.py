@@ -1,54 +1,73 @@
-from typing import List
+import asyncio
+import threading
+import time
+from contextlib import aclosing
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import AsyncIterator, Callable, Dict, List, Optional, Tuple
 
 from langchain_openai import ChatOpenAI
 from langchain_google_genai import ChatGoogleGenerativeAI
 from langchain_cohere import ChatCohere
-from langchain_community.llms import Ollama
-from langchain_community.chat_models import BedrockChat
 
 from app.config import settings
 
 
-def get_llm_chain() -> List:
+def provider_factories() -> List[Tuple[str, Callable]]:
     """
-    Returns a list of initialized LLMs.
-    The system will try each one in order until one succeeds.
+    (name, client factory) for each configured LLM, in fallback order.
+    Provider SDK retries are kept low: the pool falls back instead.
     """
 
-    llms = []
+    factories = []
 
- # 1. Cohere (DEFAULT)
+    # 1. Cohere (DEFAULT)
     if settings.COHERE_API_KEY:
-        try:
-            llms.append(
-                ChatCohere(
-                    temperature=0
-                )
+        factories.append((
+            "cohere",
+            lambda: ChatCohere(
+                temperature=0,
+                timeout_seconds=settings.LLM_TIMEOUT_SECONDS
             )
-        except Exception:
-            pass
+        ))
 
     # 2. OpenAI
     if settings.OPENAI_API_KEY:
-        try:
-            llms.append(
-                ChatOpenAI(
-                    temperature=0,
-                    model="gpt-4o-mini"
-                )
+        factories.append((
+            "openai:gpt-4o-mini",
+            lambda: ChatOpenAI(
+                temperature=0,
+                model="gpt-4o-mini",
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                max_retries=settings.LLM_PROVIDER_MAX_RETRIES
             )
-        except Exception:
-            pass
+        ))
 
     # 3. Gemini
     if settings.GEMINI_API_KEY:
-        try:
-            llms.append(
-                ChatGoogleGenerativeAI(
-                    model="gemini-pro",
-                    temperature=0
-                )
+        factories.append((
+            "gemini:gemini-pro",
+            lambda: ChatGoogleGenerativeAI(
+                model="gemini-pro",
+                temperature=0,
+                timeout=settings.LLM_TIMEOUT_SECONDS,
+                max_retries=settings.LLM_PROVIDER_MAX_RETRIES
             )
+        ))
+
+    return factories
+
+
+def get_llm_chain() -> List:
+    """
+    Returns a list of initialized LLMs.
+    The system will try each one in order until one succeeds.
+    """
+
+    llms = []
+
+    for _, factory in provider_factories():
+        try:
+            llms.append(factory())
         except Exception:
             pass
 
@@ -60,23 +79,665 @@ def get_llm_chain() -> List:
     return llms
 
 
-def safe_llm_invoke(prompt: str) -> str:
+def llm_chain_signature() -> str:
+    """
+    The models get_llm_chain() would try, in order. Cached answers
+    are only reused while this stays the same.
+    """
+
+    return ",".join(name for name, _ in provider_factories())
+
+
+# =========================
+# Provider pool
+# =========================
+class LLMDeadlineExceeded(TimeoutError):
+    """
+    The request's deadline passed before a provider answered.
+    """
+
+
+class CircuitBreaker:
     """
-    Try invoking LLMs one by one.
-    If one fails, move to the next.
+    Opens after `failure_threshold` consecutive failures, so the
+    provider is skipped for `reset_seconds`. Then one trial call is
+    let through (half-open): success closes the circuit, failure
+    opens it again.
     """
 
-    llms = get_llm_chain()
-    last_error = None
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_seconds = reset_seconds
+
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.trial_in_flight = False
+        self.times_opened = 0
+
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        if time.monotonic() - self.opened_at >= self.reset_seconds:
+            return "half_open"
+        return "open"
+
+    def allow(self) -> Tuple[bool, bool]:
+        """
+        (allowed, trial): `trial` when the call let through is the
+        half-open trial. Only that call may release() it.
+        """
+
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True, False
+            if state == "half_open" and not self.trial_in_flight:
+                self.trial_in_flight = True
+                return True, True
+            return False, False
+
+    def release(self) -> None:
+        """
+        The trial call ended without a result (cancelled, or its
+        consumer went away): let the next call be the trial.
+        """
+
+        with self._lock:
+            self.trial_in_flight = False
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.consecutive_failures = 0
+            self.opened_at = None
+            self.trial_in_flight = False
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.consecutive_failures += 1
+            self.trial_in_flight = False
+
+            if (
+                self.opened_at is not None
+                or self.consecutive_failures >= self.failure_threshold
+            ):
+                if self.opened_at is None:
+                    self.times_opened += 1
+                self.opened_at = time.monotonic()
+
+
+class Provider:
+    """
+    One long-lived LLM client plus its health: call counts, a
+    latency moving average and a circuit breaker.
+    The client is built on first use; a failed build counts as a
+    failed call and is retried on the next one.
+    """
+
+    def __init__(self, name: str, factory: Callable, breaker: CircuitBreaker):
+        self.name = name
+        self.factory = factory
+        self.breaker = breaker
+        self._llm = None
+
+        self.calls = 0
+        self.successes = 0
+        self.failures = 0
+        self.hedged_calls = 0
+        self.hedge_wins = 0
+        self.skipped = 0
+        self.latency_ewma: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+
+    @property
+    def llm(self):
+        with self._build_lock:
+            if self._llm is None:
+                self._llm = self.factory()
+            return self._llm
+
+    def invoke(
+        self,
+        prompt: str,
+        outcome: Optional[threading.Lock] = None,
+        trial: bool = False
+    ) -> str:
+        """
+        With `outcome`, the result is only recorded if the lock is
+        still free: the pool takes it when it gives up on the call.
+        `trial` as returned by the breaker's allow().
+        """
+
+        self.count("calls")
+        start = time.monotonic()
+
+        try:
+            content = self.llm.invoke(prompt).content
+        except Exception as e:
+            if outcome is None or outcome.acquire(blocking=False):
+                self._record_failure(e)
+            raise
+
+        if outcome is None or outcome.acquire(blocking=False):
+            self._record_success(time.monotonic() - start)
+        return content
+
+    async def _allm(self):
+        # Building a client may block (Cohere looks up its model)
+        if self._llm is None:
+            return await asyncio.to_thread(lambda: self.llm)
+        return self._llm
+
+    async def ainvoke(self, prompt: str, trial: bool = False) -> str:
+        self.count("calls")
+        start = time.monotonic()
+
+        try:
+            content = (await (await self._allm()).ainvoke(prompt)).content
+        except asyncio.CancelledError:
+            # Lost a hedge race or ran out of time: not the provider's fault
+            if trial:
+                self.breaker.release()
+            raise
+        except Exception as e:
+            self._record_failure(e)
+            raise
+
+        self._record_success(time.monotonic() - start)
+        return content
+
+    async def astream(self, prompt: str, trial: bool = False) -> AsyncIterator[str]:
+        """
+        Answer text as the provider produces it. The call counts as
+        a success once the stream completes; a stream cancelled or
+        closed before that (client gone, deadline) counts as neither.
+        """
+
+        self.count("calls")
+        start = time.monotonic()
+        recorded = False
 
-    for llm in llms:
         try:
-            response = llm.invoke(prompt)
-            return response.content
+            # Closing ours closes the client's stream (and its connection)
+            async with aclosing((await self._allm()).astream(prompt)) as chunks:
+                async for chunk in chunks:
+                    if isinstance(chunk.content, str) and chunk.content:
+                        yield chunk.content
         except Exception as e:
-            last_error = e
-            continue
+            recorded = True
+            self._record_failure(e)
+            raise
+        else:
+            recorded = True
+            self._record_success(time.monotonic() - start)
+        finally:
+            # Also reached on GeneratorExit, when the consumer stops reading
+            if not recorded and trial:
+                self.breaker.release()
+
+    def _record_failure(self, error: Exception) -> None:
+        with self._lock:
+            self.failures += 1
+            self.last_error = f"{type(error).__name__}: {error}"
+        self.breaker.record_failure()
+
+    def _record_success(self, elapsed: float) -> None:
+        with self._lock:
+            self.successes += 1
+            self.latency_ewma = (
+                elapsed if self.latency_ewma is None
+                else 0.8 * self.latency_ewma + 0.2 * elapsed
+            )
+        self.breaker.record_success()
+
+    def count(self, counter: str) -> None:
+        with self._lock:
+            setattr(self, counter, getattr(self, counter) + 1)
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "state": self.breaker.state,
+                "calls": self.calls,
+                "successes": self.successes,
+                "failures": self.failures,
+                "consecutive_failures": self.breaker.consecutive_failures,
+                "times_opened": self.breaker.times_opened,
+                "skipped_while_open": self.skipped,
+                "hedged_calls": self.hedged_calls,
+                "hedge_wins": self.hedge_wins,
+                "latency_ewma_ms": (
+                    round(self.latency_ewma * 1000, 1)
+                    if self.latency_ewma is not None else None
+                ),
+                "last_error": self.last_error
+            }
+
+
+class ProviderPool:
+    """
+    Long-lived LLM clients tried in fallback order, for all requests.
+
+    - Providers with an open circuit are skipped, so an outage costs
+      a few failed calls rather than a timeout on every question
+    - With `hedge_after_seconds`, if a provider hasn't answered by
+      then the next one is started too; the first answer wins
+    - Each request has a deadline: when it passes, the request fails
+      with LLMDeadlineExceeded instead of waiting on slower providers
+    """
+
+    def __init__(
+        self,
+        providers: List[Provider],
+        hedge_after_seconds: float,
+        deadline_seconds: float,
+        max_in_flight: int
+    ):
+        self.providers = providers
+        self.hedge_after_seconds = hedge_after_seconds
+        self.deadline_seconds = deadline_seconds
+
+        self.requests = 0
+        self.failures = 0
+        self.deadline_exceeded = 0
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=max(1, max_in_flight),
+            thread_name_prefix="llm"
+        )
+        self._lock = threading.Lock()
+
+    def _next(self, queue: List[Provider]) -> Optional[Tuple[Provider, bool]]:
+        """
+        Pop the next provider whose circuit lets a call through, and
+        whether that call is its half-open trial.
+        """
+
+        while queue:
+            provider = queue.pop(0)
+            allowed, trial = provider.breaker.allow()
+            if allowed:
+                return provider, trial
+            provider.count("skipped")
+        return None
+
+    def invoke(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """
+        Answer `prompt` from the first provider that succeeds.
+        `deadline` is a time.monotonic() instant; by default
+        LLM_DEADLINE_SECONDS from now.
+        """
+
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline_seconds
+
+        with self._lock:
+            self.requests += 1
+
+        queue = list(self.providers)
+        # future -> (provider, hedged, trial, outcome)
+        pending: Dict[Future, Tuple[Provider, bool, bool, threading.Lock]] = {}
+        last_error: Optional[Exception] = None
+
+        def launch(hedged: bool) -> bool:
+            allowed = self._next(queue)
+            if allowed is None:
+                return False
+            provider, trial = allowed
+            if hedged:
+                provider.count("hedged_calls")
+            outcome = threading.Lock()
+            future = self._executor.submit(provider.invoke, prompt, outcome, trial)
+            pending[future] = (provider, hedged, trial, outcome)
+            return True
+
+        launch(hedged=False)
+
+        while pending:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            hedge = self.hedge_after_seconds > 0 and bool(queue)
+            timeout = min(remaining, self.hedge_after_seconds) if hedge else remaining
+
+            done, _ = wait(pending, timeout=timeout, return_when=FIRST_COMPLETED)
+
+            if not done:
+                if hedge:
+                    launch(hedged=True)
+                continue
+
+            for future in done:
+                provider, hedged, _, _ = pending.pop(future)
+                try:
+                    content = future.result()
+                except Exception as e:
+                    last_error = e
+                    continue
+
+                if hedged:
+                    provider.count("hedge_wins")
+                for other, (other_provider, _, trial, _) in pending.items():
+                    if other.cancel() and trial:
+                        other_provider.breaker.release()
 
-    raise RuntimeError(
-        f"All LLM providers failed. Last error: {last_error}"
+                return content
+
+            if not pending:
+                launch(hedged=False)
+
+        if pending:
+            # Still running: count the overrun against those providers,
+            # once; the call itself finishes (or times out) in the
+            # background without recording its result again
+            for future, (provider, _, trial, outcome) in pending.items():
+                if future.cancel():
+                    if trial:
+                        provider.breaker.release()
+                elif outcome.acquire(blocking=False):
+                    provider.breaker.record_failure()
+
+            with self._lock:
+                self.deadline_exceeded += 1
+
+            raise LLMDeadlineExceeded(
+                "LLM deadline exceeded waiting on "
+                f"{', '.join(p.name for p, _, _, _ in pending.values())}"
+            )
+
+        with self._lock:
+            self.failures += 1
+
+        if last_error is None:
+            raise RuntimeError(
+                "All LLM providers are unavailable (circuits open)."
+            )
+
+        raise RuntimeError(
+            f"All LLM providers failed. Last error: {last_error}"
+        )
+
+    async def ainvoke(self, prompt: str, deadline: Optional[float] = None) -> str:
+        """
+        invoke, for the async chat path. Calls run as tasks on the
+        event loop: a losing hedge or a call past the deadline is
+        cancelled rather than left running.
+        """
+
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline_seconds
+
+        with self._lock:
+            self.requests += 1
+
+        queue = list(self.providers)
+        # task -> (provider, hedged)
+        pending: Dict[asyncio.Task, Tuple[Provider, bool]] = {}
+        last_error: Optional[Exception] = None
+
+        def launch(hedged: bool) -> bool:
+            allowed = self._next(queue)
+            if allowed is None:
+                return False
+            provider, trial = allowed
+            if hedged:
+                provider.count("hedged_calls")
+            pending[asyncio.ensure_future(provider.ainvoke(prompt, trial))] = (provider, hedged)
+            return True
+
+        launch(hedged=False)
+
+        try:
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                hedge = self.hedge_after_seconds > 0 and bool(queue)
+                timeout = min(remaining, self.hedge_after_seconds) if hedge else remaining
+
+                done, _ = await asyncio.wait(
+                    pending, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+
+                if not done:
+                    if hedge:
+                        launch(hedged=True)
+                    continue
+
+                for task in done:
+                    provider, hedged = pending.pop(task)
+                    try:
+                        content = task.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+
+                    if hedged:
+                        provider.count("hedge_wins")
+
+                    return content
+
+                if not pending:
+                    launch(hedged=False)
+
+            if pending:
+                # Cancelled below, so this is the only record of them
+                for provider, _ in pending.values():
+                    provider.breaker.record_failure()
+
+                with self._lock:
+                    self.deadline_exceeded += 1
+
+                raise LLMDeadlineExceeded(
+                    "LLM deadline exceeded waiting on "
+                    f"{', '.join(p.name for p, _ in pending.values())}"
+                )
+        finally:
+            for task in pending:
+                task.cancel()
+
+        with self._lock:
+            self.failures += 1
+
+        if last_error is None:
+            raise RuntimeError(
+                "All LLM providers are unavailable (circuits open)."
+            )
+
+        raise RuntimeError(
+            f"All LLM providers failed. Last error: {last_error}"
+        )
+
+    async def astream(
+        self,
+        prompt: str,
+        deadline: Optional[float] = None
+    ) -> AsyncIterator[str]:
+        """
+        Stream the answer from the first provider that produces text.
+        A provider failing before its first token is fallen back from,
+        as in ainvoke; once text has been sent, errors end the stream.
+        The deadline applies to every token; there is no hedging.
+        """
+
+        if deadline is None:
+            deadline = time.monotonic() + self.deadline_seconds
+
+        with self._lock:
+            self.requests += 1
+
+        queue = list(self.providers)
+        last_error: Optional[Exception] = None
+
+        while True:
+            allowed = self._next(queue)
+            if allowed is None:
+                break
+
+            provider, trial = allowed
+            tokens = provider.astream(prompt, trial)
+
+            try:
+                try:
+                    token = await self._anext_token(provider, tokens, deadline)
+                except LLMDeadlineExceeded:
+                    raise
+                except Exception as e:
+                    last_error = e
+                    continue
+
+                while token is not None:
+                    yield token
+                    token = await self._anext_token(provider, tokens, deadline)
+                return
+            finally:
+                # Our consumer may stop early (client disconnected): close
+                # the provider's stream now so it settles its breaker
+                await tokens.aclose()
+
+        with self._lock:
+            self.failures += 1
+
+        if last_error is None:
+            raise RuntimeError(
+                "All LLM providers are unavailable (circuits open)."
+            )
+
+        raise RuntimeError(
+            f"All LLM providers failed. Last error: {last_error}"
+        )
+
+    async def _anext_token(
+        self,
+        provider: Provider,
+        tokens: AsyncIterator[str],
+        deadline: float
+    ) -> Optional[str]:
+        task = asyncio.ensure_future(anext(tokens, None))
+
+        try:
+            done, _ = await asyncio.wait(
+                {task}, timeout=max(deadline - time.monotonic(), 0)
+            )
+        except asyncio.CancelledError:
+            await self._cancel_token(task)
+            raise
+
+        if done:
+            return task.result()
+
+        await self._cancel_token(task)
+        provider.breaker.record_failure()
+
+        with self._lock:
+            self.deadline_exceeded += 1
+
+        raise LLMDeadlineExceeded(
+            f"LLM deadline exceeded waiting on {provider.name}"
+        )
+
+    @staticmethod
+    async def _cancel_token(task: asyncio.Future) -> None:
+        """
+        Cancel a pending read of a provider's stream and wait for it
+        to unwind, so the stream can then be closed.
+        """
+
+        task.cancel()
+        await asyncio.wait({task})
+
+    def stats(self) -> Dict:
+        with self._lock:
+            pool = {
+                "requests": self.requests,
+                "failures": self.failures,
+                "deadline_exceeded": self.deadline_exceeded,
+                "hedge_after_seconds": self.hedge_after_seconds,
+                "deadline_seconds": self.deadline_seconds
+            }
+
+        return {
+            **pool,
+            "providers": {
+                provider.name: provider.stats()
+                for provider in self.providers
+            }
+        }
+
+
+def build_provider_pool() -> ProviderPool:
+    providers = [
+        Provider(
+            name,
+            factory,
+            CircuitBreaker(
+                failure_threshold=settings.LLM_CIRCUIT_FAILURES,
+                reset_seconds=settings.LLM_CIRCUIT_RESET_SECONDS
+            )
+        )
+        for name, factory in provider_factories()
+    ]
+
+    if not providers:
+        raise RuntimeError(
+            "No LLM available. Please configure at least one API key."
+        )
+
+    return ProviderPool(
+        providers,
+        hedge_after_seconds=settings.LLM_HEDGE_AFTER_SECONDS,
+        deadline_seconds=settings.LLM_DEADLINE_SECONDS,
+        max_in_flight=settings.LLM_MAX_IN_FLIGHT
     )
+
+
+_pool: Optional[ProviderPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_provider_pool() -> ProviderPool:
+    global _pool
+
+    with _pool_lock:
+        if _pool is None:
+            _pool = build_provider_pool()
+        return _pool
+
+
+def provider_pool_stats() -> Optional[Dict]:
+    """
+    Pool statistics, or None before the first LLM call.
+    """
+
+    return _pool.stats() if _pool is not None else None
+
+
+def safe_llm_invoke(prompt: str, deadline: Optional[float] = None) -> str:
+    """
+    Invoke the shared provider pool: configured LLMs in order,
+    skipping failing ones, within the request's deadline.
+    """
+
+    return get_provider_pool().invoke(prompt, deadline)
+
+
+async def safe_llm_ainvoke(prompt: str, deadline: Optional[float] = None) -> str:
+    return await get_provider_pool().ainvoke(prompt, deadline)
+
+
+def safe_llm_astream(
+    prompt: str,
+    deadline: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    safe_llm_ainvoke, streamed token by token.
+    """
+
+    return get_provider_pool().astream(prompt, deadline)
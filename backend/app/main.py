@@ -4,6 +4,11 @@ from app.api.upload import router as upload_router
 from app.api.chat import router as chat_router
 from app.api.review import router as review_router
 from app.api.invoice import router as invoice_router
+from app.api.admin import router as admin_router
+from app.ingestion.jobs import ingestion_workers
+from app.ingestion.ocr import shutdown_ocr_pool
+from app.rag.embedding_client import embedding_executor
+from app.rag.shared_index import flush_shared_index
 
 Base.metadata.create_all(bind=engine)
 
@@ -13,6 +18,22 @@ app.include_router(invoice_router, prefix="/invoice")
 app.include_router(review_router, prefix="/review")
 app.include_router(upload_router, prefix="/upload")
 app.include_router(chat_router, prefix="/chat")
+app.include_router(admin_router, prefix="/admin")
+
+
+@app.on_event("startup")
+def start_background_workers():
+    # Pick up jobs queued, or left running, before a restart
+    ingestion_workers.start()
+
+
+@app.on_event("shutdown")
+def stop_background_workers():
+    ingestion_workers.stop()
+    shutdown_ocr_pool()
+    flush_shared_index()
+    embedding_executor.shutdown()
+
 
 @app.get("/")
 def health_check():
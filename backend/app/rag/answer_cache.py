@@ -0,0 +1,363 @@
+import hashlib
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Callable, Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config import settings
+
+
+# Longer than any answer takes to generate: invalidation times older
+# than this can't affect an answer still in flight
+INVALIDATION_WINDOW_SECONDS = 600
+
+# Called with the invoice id by invalidate_answers, for answers kept
+# elsewhere (e.g. coalesced chat answers still in flight)
+_invalidation_listeners: List[Callable[[str], None]] = []
+
+
+def normalize_question(question: str) -> str:
+    """
+    Case, spacing and trailing punctuation don't change the question.
+    """
+    return re.sub(r"[\s?.!]+$", "", " ".join(question.lower().split()))
+
+
+def context_hash(documents: Sequence[Document]) -> str:
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(document.page_content.encode("utf-8"))
+        digest.update(b"\0")
+    return digest.hexdigest()
+
+
+class CachedAnswer(NamedTuple):
+    answer: str
+    # "exact" or "semantic"
+    tier: str
+
+
+class AnswerCache:
+    """
+    Persistent cache of LLM answers to invoice questions.
+
+    - Exact tier: keyed by (invoice, normalized question, hash of the
+      retrieved context, LLM chain/prompt identity)
+    - Semantic tier (optional): the same invoice and LLM identity, and
+      a question embedding within `semantic_threshold` cosine similarity
+      (paraphrases; the retrieved context may differ slightly)
+    - All of an invoice's entries are dropped when it is reviewed,
+      edited or re-ingested
+    - Size-bounded: least recently used entries are evicted first,
+      and entries older than `ttl_seconds` are ignored
+    """
+
+    def __init__(
+        self,
+        path: str,
+        max_bytes: int,
+        ttl_seconds: float,
+        semantic_threshold: float
+    ):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.semantic_threshold = semantic_threshold
+
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS answers (
+                    key TEXT PRIMARY KEY,
+                    invoice_id TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    question TEXT NOT NULL,
+                    answer TEXT NOT NULL,
+                    embedder TEXT,
+                    vector BLOB,
+                    size INTEGER NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_answers_invoice "
+                "ON answers (invoice_id, model)"
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_answers_last_access "
+                "ON answers (last_access)"
+            )
+            # invoice_id -> time of its last invalidation, shared by
+            # every process using the file, so an answer generated from
+            # data that changed meanwhile isn't stored
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS invalidations (
+                    invoice_id TEXT PRIMARY KEY,
+                    invalidated_at REAL NOT NULL
+                )
+                """
+            )
+            conn.commit()
+            self._conn = conn
+
+        return self._conn
+
+    @staticmethod
+    def make_key(invoice_id: str, question: str, context: str, model: str) -> str:
+        return hashlib.sha256(
+            f"{invoice_id}\0{normalize_question(question)}\0{context}\0{model}".encode("utf-8")
+        ).hexdigest()
+
+    def _fresh_after(self) -> float:
+        return time.time() - self.ttl_seconds if self.ttl_seconds > 0 else 0.0
+
+    def get(self, key: str) -> Optional[CachedAnswer]:
+        with self._lock:
+            conn = self._connection()
+            row = conn.execute(
+                "SELECT answer FROM answers WHERE key = ? AND created_at >= ?",
+                (key, self._fresh_after())
+            ).fetchone()
+
+            if row is None:
+                return None
+
+            self._touch(conn, key)
+            self.exact_hits += 1
+
+            return CachedAnswer(row[0], "exact")
+
+    def get_similar(
+        self,
+        invoice_id: str,
+        model: str,
+        embedder: str,
+        vector: List[float]
+    ) -> Optional[CachedAnswer]:
+        """
+        Best cached answer for this invoice whose question embedding
+        is within the similarity threshold.
+        """
+
+        query = np.asarray(vector, dtype="float32")
+        query_norm = np.linalg.norm(query)
+        if not query_norm:
+            return None
+
+        with self._lock:
+            conn = self._connection()
+            rows = conn.execute(
+                "SELECT key, answer, vector FROM answers "
+                "WHERE invoice_id = ? AND model = ? AND embedder = ? "
+                "AND vector IS NOT NULL AND created_at >= ?",
+                (invoice_id, model, embedder, self._fresh_after())
+            ).fetchall()
+
+            rows = [row for row in rows if len(row[2]) == query.nbytes]
+            if not rows:
+                return None
+
+            matrix = np.frombuffer(
+                b"".join(row[2] for row in rows), dtype="float32"
+            ).reshape(len(rows), -1)
+            norms = np.linalg.norm(matrix, axis=1)
+            norms[norms == 0] = 1.0
+            similarity = matrix @ query / (norms * query_norm)
+
+            best = int(np.argmax(similarity))
+            if similarity[best] < self.semantic_threshold:
+                return None
+
+            key, answer, _ = rows[best]
+            self._touch(conn, key)
+            self.semantic_hits += 1
+
+            return CachedAnswer(answer, "semantic")
+
+    def record_miss(self) -> None:
+        with self._lock:
+            self.misses += 1
+
+    def _touch(self, conn: sqlite3.Connection, key: str) -> None:
+        conn.execute(
+            "UPDATE answers SET last_access = ? WHERE key = ?",
+            (time.time(), key)
+        )
+        conn.commit()
+
+    def put(
+        self,
+        key: str,
+        invoice_id: str,
+        model: str,
+        question: str,
+        answer: str,
+        embedder: Optional[str] = None,
+        vector: Optional[List[float]] = None,
+        started_at: Optional[float] = None
+    ) -> None:
+        """
+        Store an answer. `started_at` is when answering began: if the
+        invoice was invalidated since, the answer is dropped.
+        """
+
+        blob = (
+            np.asarray(vector, dtype="float32").tobytes()
+            if vector is not None else None
+        )
+        size = (
+            len(question.encode("utf-8"))
+            + len(answer.encode("utf-8"))
+            + len(blob or b"")
+        )
+        now = time.time()
+
+        with self._lock:
+            conn = self._connection()
+
+            # Check and insert in one write transaction, so another
+            # process can't invalidate the invoice in between
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                if started_at is not None:
+                    row = conn.execute(
+                        "SELECT 1 FROM invalidations "
+                        "WHERE invoice_id = ? AND invalidated_at >= ?",
+                        (invoice_id, started_at)
+                    ).fetchone()
+                    if row is not None:
+                        conn.rollback()
+                        return
+
+                conn.execute(
+                    "INSERT OR REPLACE INTO answers "
+                    "(key, invoice_id, model, question, answer, embedder, vector, "
+                    "size, created_at, last_access) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (key, invoice_id, model, question, answer, embedder, blob, size, now, now)
+                )
+                self._evict(conn)
+                conn.commit()
+            except Exception:
+                conn.rollback()
+                raise
+
+    def invalidate(self, invoice_id: str) -> None:
+        now = time.time()
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM answers WHERE invoice_id = ?", (invoice_id,))
+            conn.execute(
+                "DELETE FROM invalidations WHERE invalidated_at < ?",
+                (now - INVALIDATION_WINDOW_SECONDS,)
+            )
+            conn.execute(
+                "INSERT OR REPLACE INTO invalidations (invoice_id, invalidated_at) "
+                "VALUES (?, ?)",
+                (invoice_id, now)
+            )
+            conn.commit()
+            self.invalidations += 1
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        expired = conn.execute(
+            "DELETE FROM answers WHERE created_at < ?", (self._fresh_after(),)
+        ).rowcount
+        self.evictions += max(expired, 0)
+
+        total = conn.execute(
+            "SELECT COALESCE(SUM(size), 0) FROM answers"
+        ).fetchone()[0]
+
+        if total <= self.max_bytes:
+            return
+
+        # Evict down to 90% so we don't evict on every insert
+        target = int(self.max_bytes * 0.9)
+        rows = conn.execute(
+            "SELECT key, size FROM answers ORDER BY last_access"
+        )
+
+        victims = []
+        for key, size in rows:
+            if total <= target:
+                break
+            victims.append((key,))
+            total -= size
+
+        conn.executemany("DELETE FROM answers WHERE key = ?", victims)
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries, size = self._connection().execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM answers"
+            ).fetchone()
+
+        hits = self.exact_hits + self.semantic_hits
+        lookups = hits + self.misses
+
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": hits / lookups if lookups else 0.0,
+            "llm_calls_avoided": hits,
+            "invalidations": self.invalidations,
+            "evictions": self.evictions,
+            "entries": entries,
+            "bytes": size,
+            "max_bytes": self.max_bytes
+        }
+
+
+answer_cache = AnswerCache(
+    path=settings.ANSWER_CACHE_PATH,
+    max_bytes=settings.ANSWER_CACHE_MAX_BYTES,
+    ttl_seconds=settings.ANSWER_CACHE_TTL_SECONDS,
+    semantic_threshold=settings.ANSWER_CACHE_SEMANTIC_THRESHOLD
+)
+
+
+def on_invalidate(listener: Callable[[str], None]) -> None:
+    """
+    Also call `listener(invoice_id)` whenever an invoice's answers
+    are invalidated.
+    """
+    _invalidation_listeners.append(listener)
+
+
+def invalidate_answers(invoice_id: str) -> None:
+    """
+    Forget cached answers for an invoice whose data just changed,
+    and notify the on_invalidate listeners.
+    """
+
+    for listener in _invalidation_listeners:
+        listener(invoice_id)
+
+    if settings.ANSWER_CACHE_ENABLED:
+        answer_cache.invalidate(invoice_id)
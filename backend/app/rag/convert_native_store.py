@@ -0,0 +1,119 @@
+import argparse
+import os
+from typing import Iterator, Tuple
+
+from app.config import settings
+from app.rag.native_store import (
+    convert_legacy_store,
+    is_legacy_store,
+    is_native_store,
+    read_meta,
+    read_native_store,
+    write_native_store
+)
+
+
+def iter_legacy_dirs(root: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (invoice_id, path) for every legacy FAISS directory.
+    """
+
+    if not os.path.isdir(root):
+        return
+
+    for invoice_id in sorted(os.listdir(root)):
+        path = os.path.join(root, invoice_id)
+        if is_legacy_store(path):
+            yield invoice_id, path
+
+
+def convert(root: str, replace: bool = False, remove_legacy: bool = False) -> dict:
+    """
+    Write the native format for every legacy store under `root`.
+    Invoices that already have one are skipped unless `replace`.
+    """
+
+    summary = {"converted": 0, "skipped": 0, "failed": 0, "chunks": 0}
+
+    for invoice_id, path in iter_legacy_dirs(root):
+        if not replace and is_native_store(path):
+            summary["skipped"] += 1
+            continue
+
+        try:
+            chunks = convert_legacy_store(path, remove_legacy)
+        except Exception as e:
+            print(f"{invoice_id}: {e}")
+            summary["failed"] += 1
+            continue
+
+        summary["converted"] += 1
+        summary["chunks"] += chunks
+
+    return summary
+
+
+def requantize(root: str) -> dict:
+    """
+    Rewrite every native store under `root` in the current
+    NATIVE_STORE_QUANTIZATION / NATIVE_STORE_RERANK layout.
+    Stores kept without float32 rows can't get them back: their
+    dequantized vectors are what gets rewritten.
+    """
+
+    summary = {"rewritten": 0, "failed": 0, "chunks": 0}
+
+    if not os.path.isdir(root):
+        return summary
+
+    for invoice_id in sorted(os.listdir(root)):
+        path = os.path.join(root, invoice_id)
+        if not is_native_store(path):
+            continue
+
+        try:
+            summary["chunks"] += write_native_store(
+                path,
+                [read_native_store(path)],
+                embedder=read_meta(path).get("embedder")
+            )
+        except Exception as e:
+            print(f"{invoice_id}: {e}")
+            summary["failed"] += 1
+            continue
+
+        summary["rewritten"] += 1
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Convert per-invoice FAISS directories to the native store format."
+    )
+    parser.add_argument("--source", default=settings.VECTOR_DB_PATH)
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="re-convert invoices that already have a native store"
+    )
+    parser.add_argument(
+        "--remove-legacy",
+        action="store_true",
+        help="delete index.faiss / index.pkl once converted"
+    )
+    parser.add_argument(
+        "--requantize",
+        action="store_true",
+        help="also rewrite existing native stores in the configured quantization"
+    )
+    args = parser.parse_args()
+
+    print(convert(args.source, args.replace, args.remove_legacy))
+
+    if args.requantize:
+        print(requantize(args.source))
+
+
+if __name__ == "__main__":
+    main()
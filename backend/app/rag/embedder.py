@@ -1,39 +1,191 @@
+import os
+import sqlite3
+import threading
+from typing import Optional
+
 from app.config import settings
 
 # Cohere embeddings
 from langchain_cohere import CohereEmbeddings
 
 # Optional providers (future-proof)
-# from langchain_openai import OpenAIEmbeddings
+from langchain_openai import OpenAIEmbeddings
 from langchain_google_genai import GoogleGenerativeAIEmbeddings
 
+# Offline, computed locally
+from app.rag.local_embeddings import HashingEmbeddings
+
+from app.rag.embedding_cache import model_key
+from app.rag.native_store import is_legacy_store, is_native_store, read_meta
+
+
+EMBEDDING_PROVIDERS = ("auto", "cohere", "openai", "gemini", "local")
+
+REINDEX_COMMAND = "python -m app.ingestion.backfill --reindex"
+REINDEX_HINT = f"re-index after switching EMBEDDING_PROVIDER ({REINDEX_COMMAND})"
+
+
+class EmbedderMismatch(RuntimeError):
+    pass
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
 
 def get_embedding_model():
+    """
+    Return the process-wide embedding client, created on first use.
+    Building a client per request re-does auth/session setup each time.
+    """
+
+    global _embedding_model
+
+    with _embedding_model_lock:
+        if _embedding_model is None:
+            _embedding_model = create_embedding_model()
+
+    return _embedding_model
+
+
+def create_embedding_model():
     """
     Select embedding model.
-    Priority:
+    EMBEDDING_PROVIDER picks one explicitly; "auto" uses priority:
     1. Cohere (DEFAULT)
     2. OpenAI
     3. Gemini
+    4. Local hashing embeddings (no API key / air-gapped), unless
+       existing vector stores were built with a provider's model
     """
 
+    provider = settings.EMBEDDING_PROVIDER
+
+    if provider not in EMBEDDING_PROVIDERS:
+        raise RuntimeError(
+            f"Unknown EMBEDDING_PROVIDER {provider!r}; "
+            f"expected one of {', '.join(EMBEDDING_PROVIDERS)}"
+        )
+
+    if provider == "local":
+        return create_local_embeddings()
+
     # ✅ DEFAULT: Cohere
-    if settings.COHERE_API_KEY:
+    if provider == "cohere" or (provider == "auto" and settings.COHERE_API_KEY):
         return CohereEmbeddings(
             model="embed-english-v3.0"
         )
 
     # Optional fallbacks
-    if settings.OPENAI_API_KEY:
+    if provider == "openai" or (provider == "auto" and settings.OPENAI_API_KEY):
         return OpenAIEmbeddings(
             model="text-embedding-3-large"
         )
 
-    if settings.GEMINI_API_KEY:
+    if provider == "gemini" or (provider == "auto" and settings.GEMINI_API_KEY):
         return GoogleGenerativeAIEmbeddings(
             model="models/embedding-001"
         )
 
-    raise RuntimeError(
-        "No embedding provider available. Please set COHERE_API_KEY (recommended)."
-    )
+    if built_with_provider_model(indexed_embedder()):
+        raise RuntimeError(
+            "No embedding provider available, and the existing vector stores "
+            "were built with a provider's model. Set its API key (COHERE_API_KEY "
+            "recommended), or set EMBEDDING_PROVIDER=local and re-index "
+            f"({REINDEX_COMMAND})"
+        )
+
+    return create_local_embeddings()
+
+
+def create_local_embeddings() -> HashingEmbeddings:
+    return HashingEmbeddings(dim=settings.EMBED_LOCAL_DIM)
+
+
+def embedding_dimension(embeddings) -> Optional[int]:
+    """
+    Vector size, where it's known without calling the model.
+    """
+    return embeddings.dim if isinstance(embeddings, HashingEmbeddings) else None
+
+
+def built_with_provider_model(embedder: Optional[str]) -> bool:
+    """
+    Whether a store's recorded embedder (see indexed_embedder) is a
+    provider model. Stores that recorded none predate local models.
+    """
+
+    if embedder is None:
+        return False
+    return not embedder.startswith(f"{HashingEmbeddings.__name__}:")
+
+
+def indexed_embedder() -> Optional[str]:
+    """
+    model_key recorded by the existing vector stores of the configured
+    backend (one is looked at: they share a model), "" if they
+    predate recording it, None if there are none.
+    """
+
+    if settings.VECTOR_STORE_BACKEND == "shared":
+        path = os.path.join(settings.SHARED_INDEX_PATH, "chunks.db")
+        if not os.path.isfile(path):
+            return None
+
+        conn = sqlite3.connect(f"file:{path}?mode=ro", uri=True)
+        try:
+            if conn.execute("SELECT 1 FROM chunks LIMIT 1").fetchone() is None:
+                return None
+            row = conn.execute(
+                "SELECT value FROM meta WHERE key = 'embedder'"
+            ).fetchone()
+            return row[0] if row else ""
+        except sqlite3.Error:
+            return None
+        finally:
+            conn.close()
+
+    if not os.path.isdir(settings.VECTOR_DB_PATH):
+        return None
+
+    with os.scandir(settings.VECTOR_DB_PATH) as entries:
+        for entry in entries:
+            if is_native_store(entry.path):
+                return read_meta(entry.path).get("embedder", "")
+            if is_legacy_store(entry.path):
+                return ""
+
+    return None
+
+
+def check_embedder(
+    where: str,
+    embedder: Optional[str],
+    dimension: Optional[int],
+    embeddings
+) -> None:
+    """
+    Raise EmbedderMismatch if the store at `where`, built with
+    `embedder` (model_key, if recorded) at `dimension`, can't be
+    queried with `embeddings`.
+    """
+
+    current = model_key(embeddings)
+    if embedder and embedder != current:
+        raise EmbedderMismatch(
+            f"{where} was built with {embedder}, not {current}: {REINDEX_HINT}"
+        )
+
+    size = embedding_dimension(embeddings)
+    if dimension and size and dimension != size:
+        raise EmbedderMismatch(
+            f"{where} holds {dimension}-d vectors, {current} makes {size}-d: "
+            f"{REINDEX_HINT}"
+        )
+
+
+def is_local_model(embeddings) -> bool:
+    """
+    Local models need neither the provider rate limit nor the
+    embedding cache: computing a vector is cheaper than looking it up.
+    """
+    return isinstance(embeddings, HashingEmbeddings)
@@ -0,0 +1,411 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+
+
+# Rows added to a vector file each time it has to grow
+GROW_ROWS = 4096
+
+
+def model_key(embeddings: Embeddings) -> str:
+    """
+    Provider + model identity, so vectors from different models
+    never mix. Wrappers (throttling etc.) are looked through.
+    """
+
+    while isinstance(getattr(embeddings, "embeddings", None), Embeddings):
+        embeddings = embeddings.embeddings
+
+    model = (
+        getattr(embeddings, "model", None)
+        or getattr(embeddings, "model_name", None)
+        or ""
+    )
+    return f"{type(embeddings).__name__}:{model}"
+
+
+def text_key(model: str, text: str) -> str:
+    return hashlib.sha256(f"{model}\0{text}".encode("utf-8")).hexdigest()
+
+
+class EmbeddingCache:
+    """
+    Persistent cache of document-chunk embeddings.
+
+    - Keyed by sha256(provider/model, chunk text)
+    - Vectors live in one memory-mapped float32 matrix per dimension
+      (vectors_<dim>.f32); SQLite maps each key to its row ("slot")
+    - LRU-bounded by entry count; evicted slots are reused
+    """
+
+    def __init__(self, path: str, max_entries: int):
+        self.path = path
+        self.max_entries = max_entries
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._matrices: Dict[int, np.memmap] = {}
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.path, exist_ok=True)
+
+            conn = sqlite3.connect(
+                os.path.join(self.path, "embeddings.db"),
+                check_same_thread=False,
+                isolation_level=None
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key TEXT PRIMARY KEY,
+                    dim INTEGER NOT NULL,
+                    slot INTEGER NOT NULL,
+                    last_access REAL NOT NULL
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_embeddings_last_access "
+                "ON embeddings (last_access)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS free_slots (
+                    dim INTEGER NOT NULL,
+                    slot INTEGER NOT NULL,
+                    PRIMARY KEY (dim, slot)
+                )
+                """
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS slot_counters (
+                    dim INTEGER PRIMARY KEY,
+                    next_slot INTEGER NOT NULL
+                )
+                """
+            )
+            self._conn = conn
+
+        return self._conn
+
+    # =========================
+    # Vector files
+    # =========================
+    def _matrix_path(self, dim: int) -> str:
+        return os.path.join(self.path, f"vectors_{dim}.f32")
+
+    def _matrix(self, dim: int, min_rows: int = 0) -> np.memmap:
+        """
+        Memory map of the vector file, grown to hold `min_rows` rows.
+        Re-mapped when the file has grown (here or in another process).
+        """
+
+        path = self._matrix_path(dim)
+        row_bytes = dim * 4
+
+        size = os.path.getsize(path) if os.path.exists(path) else 0
+        if size < min_rows * row_bytes:
+            rows = (min_rows // GROW_ROWS + 1) * GROW_ROWS
+            with open(path, "ab") as f:
+                f.truncate(rows * row_bytes)
+            size = rows * row_bytes
+
+        matrix = self._matrices.get(dim)
+        if matrix is None or matrix.shape[0] * row_bytes != size:
+            matrix = np.memmap(
+                path,
+                dtype="float32",
+                mode="r+",
+                shape=(size // row_bytes, dim)
+            )
+            self._matrices[dim] = matrix
+
+        return matrix
+
+    # =========================
+    # Lookups
+    # =========================
+    def get_many(self, keys: Sequence[str]) -> List[Optional[List[float]]]:
+        """
+        Cached vectors for `keys`, None where missing.
+        """
+
+        if not keys:
+            return []
+
+        with self._lock:
+            conn = self._connection()
+
+            # One IMMEDIATE transaction: no other process can evict
+            # and reuse a slot between the lookup and the vector read,
+            # and the last_access updates commit once
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                found = self._lookup(conn, keys)
+
+                vectors: List[Optional[List[float]]] = []
+                for key in keys:
+                    if key not in found:
+                        vectors.append(None)
+                        continue
+
+                    dim, slot = found[key]
+                    matrix = self._matrix(dim)
+                    if slot >= matrix.shape[0]:
+                        matrix = self._matrix(dim, slot + 1)
+                    vectors.append(matrix[slot].tolist())
+
+                if found:
+                    now = time.time()
+                    conn.executemany(
+                        "UPDATE embeddings SET last_access = ? WHERE key = ?",
+                        [(now, key) for key in found]
+                    )
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+
+            return vectors
+
+    @staticmethod
+    def _lookup(conn: sqlite3.Connection, keys: Sequence[str]) -> Dict:
+        """
+        key → (dim, slot) for the keys present.
+        """
+
+        found = {}
+        # Stay under SQLite's bound-parameter limit
+        for start in range(0, len(keys), 500):
+            part = list(keys[start:start + 500])
+            found.update(
+                (key, (dim, slot))
+                for key, dim, slot in conn.execute(
+                    "SELECT key, dim, slot FROM embeddings WHERE key IN (%s)"
+                    % ",".join("?" * len(part)),
+                    part
+                )
+            )
+        return found
+
+    def put_many(
+        self,
+        keys: Sequence[str],
+        vectors: Sequence[Sequence[float]]
+    ) -> None:
+        if not keys:
+            return
+
+        matrix_rows = np.asarray(vectors, dtype="float32")
+        dim = matrix_rows.shape[1]
+
+        with self._lock:
+            conn = self._connection()
+
+            # IMMEDIATE: slot allocation must not interleave with
+            # another process doing the same
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                known = self._lookup(conn, keys)
+                new = [
+                    (key, row)
+                    for key, row in zip(keys, matrix_rows)
+                    if key not in known
+                ]
+                # Same text twice in one batch: store it once
+                new = list({key: row for key, row in new}.items())
+
+                slots = self._allocate_slots(conn, dim, len(new))
+
+                if new:
+                    # Vectors first, so a committed row always points
+                    # at a written vector
+                    matrix = self._matrix(dim, max(slots) + 1)
+                    for (_, row), slot in zip(new, slots):
+                        matrix[slot] = row
+                    matrix.flush()
+
+                now = time.time()
+                conn.executemany(
+                    "INSERT INTO embeddings (key, dim, slot, last_access) "
+                    "VALUES (?, ?, ?, ?)",
+                    [(key, dim, slot, now) for (key, _), slot in zip(new, slots)]
+                )
+                self._evict(conn)
+                conn.execute("COMMIT")
+            except Exception:
+                conn.execute("ROLLBACK")
+                raise
+
+    def _allocate_slots(
+        self,
+        conn: sqlite3.Connection,
+        dim: int,
+        count: int
+    ) -> List[int]:
+        if not count:
+            return []
+
+        reused = [
+            slot
+            for (slot,) in conn.execute(
+                "SELECT slot FROM free_slots WHERE dim = ? LIMIT ?",
+                (dim, count)
+            )
+        ]
+        conn.executemany(
+            "DELETE FROM free_slots WHERE dim = ? AND slot = ?",
+            [(dim, slot) for slot in reused]
+        )
+
+        fresh = count - len(reused)
+        row = conn.execute(
+            "SELECT next_slot FROM slot_counters WHERE dim = ?", (dim,)
+        ).fetchone()
+        next_slot = row[0] if row else 0
+
+        conn.execute(
+            "INSERT OR REPLACE INTO slot_counters (dim, next_slot) VALUES (?, ?)",
+            (dim, next_slot + fresh)
+        )
+
+        return reused + list(range(next_slot, next_slot + fresh))
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        total = conn.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+
+        if total <= self.max_entries:
+            return
+
+        # Evict down to 90% so we don't evict on every insert
+        excess = total - int(self.max_entries * 0.9)
+        victims = conn.execute(
+            "SELECT key, dim, slot FROM embeddings ORDER BY last_access LIMIT ?",
+            (excess,)
+        ).fetchall()
+
+        conn.executemany(
+            "DELETE FROM embeddings WHERE key = ?",
+            [(key,) for key, _, _ in victims]
+        )
+        conn.executemany(
+            "INSERT OR IGNORE INTO free_slots (dim, slot) VALUES (?, ?)",
+            [(dim, slot) for _, dim, slot in victims]
+        )
+        self.evictions += len(victims)
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            entries = self._connection().execute(
+                "SELECT COUNT(*) FROM embeddings"
+            ).fetchone()[0]
+
+        lookups = self.hits + self.misses
+
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+            "evictions": self.evictions,
+            "entries": entries,
+            "max_entries": self.max_entries
+        }
+
+
+class EmbeddingUsage:
+    """
+    Per-ingestion tally of cached vs provider-embedded chunks.
+    """
+
+    def __init__(self):
+        self.chunks = 0
+        self.cache_hits = 0
+        self.provider_texts = 0
+        self.provider_calls = 0
+        self.calls_saved = 0
+
+    def as_dict(self) -> Dict[str, float]:
+        return {
+            "chunks": self.chunks,
+            "cache_hits": self.cache_hits,
+            "hit_rate": self.cache_hits / self.chunks if self.chunks else 0.0,
+            "provider_texts": self.provider_texts,
+            "texts_saved": self.chunks - self.provider_texts,
+            "provider_calls": self.provider_calls,
+            "calls_saved": self.calls_saved
+        }
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Wraps an embedding client so that only chunks missing from the
+    cache are sent to the provider. Queries are not cached: some
+    providers embed queries and documents differently.
+    """
+
+    def __init__(
+        self,
+        embeddings: Embeddings,
+        cache: "EmbeddingCache",
+        usage: Optional[EmbeddingUsage] = None
+    ):
+        self.embeddings = embeddings
+        self.cache = cache
+        self.usage = usage or EmbeddingUsage()
+        self.model = model_key(embeddings)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [text_key(self.model, text) for text in texts]
+        vectors = self.cache.get_many(keys)
+
+        missing: Dict[str, str] = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None:
+                missing.setdefault(key, text)
+
+        self.usage.chunks += len(texts)
+        self.usage.cache_hits += len(texts) - sum(v is None for v in vectors)
+
+        if missing:
+            embedded = self.embeddings.embed_documents(list(missing.values()))
+            self.cache.put_many(list(missing), embedded)
+
+            by_key = dict(zip(missing, embedded))
+            vectors = [
+                vector if vector is not None else by_key[key]
+                for key, vector in zip(keys, vectors)
+            ]
+
+            self.usage.provider_texts += len(missing)
+            self.usage.provider_calls += 1
+        else:
+            self.usage.calls_saved += 1
+
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embeddings.embed_query(text)
+
+
+embedding_cache = EmbeddingCache(
+    path=settings.EMBED_CACHE_PATH,
+    max_entries=settings.EMBED_CACHE_MAX_ENTRIES
+)
@@ -0,0 +1,338 @@
+import asyncio
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Dict, List, Optional, TypeVar
+
+from langchain_core.embeddings import Embeddings
+
+from app.config import settings
+
+
+T = TypeVar("T")
+
+# HTTP statuses worth retrying: throttling, timeouts, server trouble
+RETRYABLE_STATUSES = {408, 409, 425, 429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, up to `burst`
+    saved up. A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = max(burst, 1.0)
+
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _take(self, tokens: float) -> float:
+        """
+        Take `tokens` if available (returns 0), else the seconds
+        until they will be.
+        """
+
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(
+                self.burst,
+                self._tokens + (now - self._updated) * self.rate
+            )
+            self._updated = now
+
+            if self._tokens >= tokens:
+                self._tokens -= tokens
+                return 0.0
+
+            return (tokens - self._tokens) / self.rate
+
+    def acquire(self, tokens: float = 1.0) -> float:
+        """
+        Block until `tokens` are available. Returns seconds waited.
+        """
+
+        if self.rate <= 0:
+            return 0.0
+
+        # A request larger than the bucket would otherwise never fit
+        tokens = min(tokens, self.burst)
+        waited = 0.0
+
+        while True:
+            delay = self._take(tokens)
+            if not delay:
+                return waited
+
+            time.sleep(delay)
+            waited += delay
+
+    async def aacquire(self, tokens: float = 1.0) -> float:
+        """
+        acquire, waiting without blocking the event loop.
+        """
+
+        if self.rate <= 0:
+            return 0.0
+
+        tokens = min(tokens, self.burst)
+        waited = 0.0
+
+        while True:
+            delay = self._take(tokens)
+            if not delay:
+                return waited
+
+            await asyncio.sleep(delay)
+            waited += delay
+
+
+def error_status(error: Exception) -> Optional[int]:
+    """
+    HTTP status carried by a provider SDK exception, if any.
+    """
+
+    for source in (error, getattr(error, "response", None)):
+        status = getattr(source, "status_code", None) or getattr(source, "status", None)
+        if isinstance(status, int):
+            return status
+    return None
+
+
+def is_retryable(error: Exception) -> bool:
+    status = error_status(error)
+    if status is not None:
+        return status in RETRYABLE_STATUSES
+
+    if isinstance(error, (ConnectionError, TimeoutError)):
+        return True
+
+    name = type(error).__name__
+    return any(word in name for word in ("Timeout", "RateLimit", "Connection"))
+
+
+def retry_after(error: Exception) -> Optional[float]:
+    headers = getattr(getattr(error, "response", None), "headers", None) or {}
+    value = headers.get("retry-after") or headers.get("Retry-After")
+
+    try:
+        return float(value) if value is not None else None
+    except ValueError:
+        return None
+
+
+class EmbeddingExecutor:
+    """
+    Process-wide execution layer for embedding requests.
+
+    Every upload's requests go through the same pool (bounding
+    in-flight requests), the same token bucket (requests/second) and
+    the same retry policy, so concurrent uploads share one provider
+    budget instead of each bursting on its own.
+    """
+
+    def __init__(
+        self,
+        max_in_flight: int,
+        requests_per_second: float,
+        burst: float,
+        max_retries: int,
+        retry_base_seconds: float,
+        retry_max_seconds: float,
+        request_max_texts: int,
+        request_max_chars: int
+    ):
+        self.max_in_flight = max(1, max_in_flight)
+        self.request_max_texts = request_max_texts
+        self.request_max_chars = request_max_chars
+        self.bucket = TokenBucket(requests_per_second, burst)
+        self.max_retries = max_retries
+        self.retry_base_seconds = retry_base_seconds
+        self.retry_max_seconds = retry_max_seconds
+
+        self.requests = 0
+        self.retries = 0
+        self.failures = 0
+        self.throttled_seconds = 0.0
+
+        self._pool: Optional[ThreadPoolExecutor] = None
+        self._lock = threading.Lock()
+
+    def _executor(self) -> ThreadPoolExecutor:
+        with self._lock:
+            if self._pool is None:
+                self._pool = ThreadPoolExecutor(
+                    max_workers=self.max_in_flight,
+                    thread_name_prefix="embed"
+                )
+            return self._pool
+
+    def call(self, request: Callable[[], T]) -> T:
+        """
+        Run one provider request under the rate limit, retrying
+        transient failures with full-jitter exponential backoff
+        (or the provider's Retry-After, when it sends one).
+        """
+
+        attempt = 0
+
+        while True:
+            self._record_request(self.bucket.acquire())
+
+            try:
+                return request()
+            except Exception as e:
+                time.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    async def acall(self, request: Callable[[], Awaitable[T]]) -> T:
+        """
+        call, for async provider requests: same rate limit and
+        retry policy, waiting without blocking the event loop.
+        """
+
+        attempt = 0
+
+        while True:
+            self._record_request(await self.bucket.aacquire())
+
+            try:
+                return await request()
+            except Exception as e:
+                await asyncio.sleep(self._retry_delay(e, attempt))
+                attempt += 1
+
+    def _record_request(self, throttled: float) -> None:
+        with self._lock:
+            self.requests += 1
+            self.throttled_seconds += throttled
+
+    def _retry_delay(self, error: Exception, attempt: int) -> float:
+        """
+        Backoff before retrying `error`; re-raises it when it
+        shouldn't be retried.
+        """
+
+        if attempt >= self.max_retries or not is_retryable(error):
+            with self._lock:
+                self.failures += 1
+            raise error
+
+        backoff = random.uniform(
+            0,
+            min(self.retry_max_seconds, self.retry_base_seconds * 2 ** attempt)
+        )
+
+        with self._lock:
+            self.retries += 1
+
+        return max(backoff, retry_after(error) or 0.0)
+
+    def embed_documents(
+        self,
+        embeddings: Embeddings,
+        texts: List[str]
+    ) -> List[List[float]]:
+        """
+        Split texts into provider-sized requests and run them on the
+        shared pool. Results come back in input order.
+        """
+
+        requests = list(split_requests(
+            texts,
+            self.request_max_texts,
+            self.request_max_chars
+        ))
+
+        if len(requests) == 1:
+            return self._executor().submit(
+                self.call, lambda: embeddings.embed_documents(requests[0])
+            ).result()
+
+        futures = [
+            self._executor().submit(
+                self.call, lambda part=part: embeddings.embed_documents(part)
+            )
+            for part in requests
+        ]
+
+        vectors: List[List[float]] = []
+        for future in futures:
+            vectors.extend(future.result())
+        return vectors
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "retries": self.retries,
+                "failures": self.failures,
+                "throttled_seconds": round(self.throttled_seconds, 3),
+                "max_in_flight": self.max_in_flight,
+                "requests_per_second": self.bucket.rate
+            }
+
+    def shutdown(self) -> None:
+        with self._lock:
+            if self._pool is not None:
+                self._pool.shutdown(wait=True)
+                self._pool = None
+
+
+def split_requests(texts: List[str], max_texts: int, max_chars: int):
+    """
+    Group texts into requests of at most `max_texts` texts and about
+    `max_chars` characters (a single longer text goes alone).
+    """
+
+    batch: List[str] = []
+    chars = 0
+
+    for text in texts:
+        if batch and (len(batch) >= max_texts or chars + len(text) > max_chars):
+            yield batch
+            batch, chars = [], 0
+
+        batch.append(text)
+        chars += len(text)
+
+    if batch:
+        yield batch
+
+
+class ThrottledEmbeddings(Embeddings):
+    """
+    Routes an embedding client's calls through the shared executor.
+    Queries run inline (they shouldn't queue behind bulk ingestion)
+    but still draw from the rate limit and get retries.
+    """
+
+    def __init__(self, embeddings: Embeddings, executor: EmbeddingExecutor):
+        self.embeddings = embeddings
+        self.executor = executor
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self.executor.embed_documents(self.embeddings, texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.executor.call(lambda: self.embeddings.embed_query(text))
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await self.executor.acall(lambda: self.embeddings.aembed_query(text))
+
+
+embedding_executor = EmbeddingExecutor(
+    max_in_flight=settings.EMBED_MAX_IN_FLIGHT,
+    requests_per_second=settings.EMBED_RATE_LIMIT_RPS,
+    burst=settings.EMBED_RATE_LIMIT_BURST,
+    max_retries=settings.EMBED_MAX_RETRIES,
+    retry_base_seconds=settings.EMBED_RETRY_BASE_SECONDS,
+    retry_max_seconds=settings.EMBED_RETRY_MAX_SECONDS,
+    request_max_texts=settings.EMBED_REQUEST_MAX_TEXTS,
+    request_max_chars=settings.EMBED_REQUEST_MAX_CHARS
+)
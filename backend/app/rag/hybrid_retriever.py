@@ -0,0 +1,254 @@
+import asyncio
+import threading
+from typing import Dict, List, NamedTuple, Optional, Sequence, Tuple
+
+from langchain_core.documents import Document
+
+from app.config import settings
+from app.rag.lexical_index import (
+    LexicalHit,
+    LexicalIndex,
+    get_lexical_index,
+    save_lexical_index
+)
+from app.rag.native_store import NativeVectorStore, is_native_store
+from app.rag.vector_store import (
+    get_query_embeddings,
+    get_vector_store,
+    invoice_store_path,
+    use_native_store
+)
+
+
+RETRIEVAL_MODES = ("hybrid", "vector", "lexical")
+
+
+class Retrieval(NamedTuple):
+    documents: List[Document]
+    # "lexical", "vector", "hybrid" or "full_context": what actually ran
+    mode: str
+
+
+class RetrievalStats:
+    def __init__(self):
+        self.counts = {mode: 0 for mode in (*RETRIEVAL_MODES, "full_context")}
+        self._lock = threading.Lock()
+
+    def record(self, mode: str) -> None:
+        with self._lock:
+            self.counts[mode] += 1
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            total = sum(self.counts.values())
+            return {
+                **self.counts,
+                "embedding_calls_skipped": (
+                    self.counts["lexical"] + self.counts["full_context"]
+                ),
+                "lexical_rate": self.counts["lexical"] / total if total else 0.0
+            }
+
+
+retrieval_stats = RetrievalStats()
+
+
+def document_key(document: Document) -> str:
+    return document.metadata.get("chunk_id") or document.page_content
+
+
+def reciprocal_rank_fusion(
+    rankings: Sequence[List[Document]],
+    k: int,
+    rrf_k: int = 60
+) -> List[Document]:
+    """
+    Merge ranked lists by summing 1 / (rrf_k + rank) per chunk.
+    Ties keep first-seen order.
+    """
+
+    scores: Dict[str, float] = {}
+    documents: Dict[str, Document] = {}
+
+    for ranking in rankings:
+        for rank, document in enumerate(ranking, start=1):
+            key = document_key(document)
+            scores[key] = scores.get(key, 0.0) + 1.0 / (rrf_k + rank)
+            documents.setdefault(key, document)
+
+    best = sorted(scores, key=scores.get, reverse=True)[:k]
+    return [documents[key] for key in best]
+
+
+def lexically_confident(hits: List[LexicalHit]) -> bool:
+    """
+    Trust BM25 alone when its best chunk contains every query term
+    and clearly beats the runner-up.
+    """
+
+    if not hits or hits[0].coverage < settings.LEXICAL_MIN_COVERAGE:
+        return False
+
+    if len(hits) == 1:
+        return True
+
+    return hits[0].score >= settings.LEXICAL_MIN_MARGIN * hits[1].score
+
+
+def ensure_lexical_index(invoice_id: str) -> Optional[LexicalIndex]:
+    """
+    The invoice's lexical index. Native stores indexed before
+    lexical indexes existed get one built from their chunks.
+    """
+
+    index = get_lexical_index(invoice_id)
+    if index is not None:
+        return index
+
+    path = invoice_store_path(invoice_id)
+    if not use_native_store() or not is_native_store(path):
+        return None
+
+    store = NativeVectorStore.open(path)
+    index = LexicalIndex.build(store.documents(range(store.count)))
+    save_lexical_index(invoice_id, index)
+
+    return index
+
+
+def full_context(invoice_id: str, text: str) -> Retrieval:
+    """
+    The whole invoice as a single document: no index load, no
+    embedding call. For invoices within FULL_CONTEXT_MAX_CHARS.
+    """
+
+    document = Document(
+        page_content=text,
+        metadata={"invoice_id": invoice_id}
+    )
+    return record(Retrieval([document], "full_context"))
+
+
+def retrieval_mode() -> str:
+    mode = settings.RETRIEVAL_MODE
+
+    if mode not in RETRIEVAL_MODES:
+        raise RuntimeError(
+            f"Unknown RETRIEVAL_MODE {mode!r}; "
+            f"expected one of {', '.join(RETRIEVAL_MODES)}"
+        )
+
+    return mode
+
+
+def lexical_candidates(
+    lexical: LexicalIndex,
+    question: str,
+    mode: str,
+    k: int
+) -> Tuple[List[Document], Optional[Retrieval]]:
+    """
+    BM25's candidates, and the final retrieval if they're enough
+    on their own (lexical mode, or a confident shortcut).
+    """
+
+    hits = lexical.search(question, max(k, settings.HYBRID_CANDIDATES))
+    documents = [lexical.documents[hit.position] for hit in hits]
+
+    if mode == "lexical" or (
+        settings.LEXICAL_SHORTCUT and lexically_confident(hits)
+    ):
+        return documents, Retrieval(documents[:k], "lexical")
+
+    return documents, None
+
+
+def fuse(
+    lexical_documents: List[Document],
+    vector_documents: List[Document],
+    k: int
+) -> Retrieval:
+    if not lexical_documents:
+        return Retrieval(vector_documents[:k], "vector")
+
+    documents = reciprocal_rank_fusion(
+        [lexical_documents, vector_documents],
+        k=k,
+        rrf_k=settings.RRF_K
+    )
+    return Retrieval(documents, "hybrid")
+
+
+def retrieve(invoice_id: str, question: str, k: int = 4) -> Retrieval:
+    """
+    Chunks for answering `question`, per RETRIEVAL_MODE:
+    - vector: embedding similarity only
+    - lexical: BM25 only (no embedding call)
+    - hybrid: BM25 and vectors merged with reciprocal-rank fusion,
+      skipping the embedding call when BM25 is confident
+    """
+
+    mode = retrieval_mode()
+    lexical = ensure_lexical_index(invoice_id) if mode != "vector" else None
+
+    if lexical is None:
+        documents = get_vector_store(invoice_id).similarity_search(question, k=k)
+        return record(Retrieval(documents, "vector"))
+
+    lexical_documents, final = lexical_candidates(lexical, question, mode, k)
+    if final:
+        return record(final)
+
+    vector_documents = get_vector_store(invoice_id).similarity_search(
+        question,
+        k=max(k, settings.HYBRID_CANDIDATES)
+    )
+    return record(fuse(lexical_documents, vector_documents, k))
+
+
+async def avector_search(invoice_id: str, question: str, k: int) -> List[Document]:
+    """
+    similarity_search for the event loop: the store is loaded and
+    searched on a worker thread, the query embedding is awaited.
+    """
+
+    store = await asyncio.to_thread(get_vector_store, invoice_id)
+    embedding = await get_query_embeddings().aembed_query(question)
+
+    results = await asyncio.to_thread(
+        store.similarity_search_with_score_by_vector, embedding, k
+    )
+    return [doc for doc, _ in results]
+
+
+async def aretrieve(invoice_id: str, question: str, k: int = 4) -> Retrieval:
+    """
+    retrieve, for the async chat path.
+    """
+
+    mode = retrieval_mode()
+    lexical = (
+        await asyncio.to_thread(ensure_lexical_index, invoice_id)
+        if mode != "vector" else None
+    )
+
+    if lexical is None:
+        documents = await avector_search(invoice_id, question, k)
+        return record(Retrieval(documents, "vector"))
+
+    # In-memory BM25 over one invoice: well under a millisecond
+    lexical_documents, final = lexical_candidates(lexical, question, mode, k)
+    if final:
+        return record(final)
+
+    vector_documents = await avector_search(
+        invoice_id,
+        question,
+        max(k, settings.HYBRID_CANDIDATES)
+    )
+    return record(fuse(lexical_documents, vector_documents, k))
+
+
+def record(retrieval: Retrieval) -> Retrieval:
+    retrieval_stats.record(retrieval.mode)
+    return retrieval
@@ -0,0 +1,247 @@
+import json
+import os
+import re
+import uuid
+from collections import Counter
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config import settings
+from app.rag.store_cache import VectorStoreCache
+
+
+FORMAT_VERSION = 1
+
+# BM25 parameters (the usual defaults)
+BM25_K1 = 1.2
+BM25_B = 0.75
+
+TOKEN_PATTERN = re.compile(r"[a-z0-9]+")
+
+# Question words that would otherwise match boilerplate
+STOPWORDS = frozenset(
+    "a an and are as at be by can does for from give how i in is it me "
+    "of on or please show tell that the this to was what when where "
+    "which who whom whose why with you your".split()
+)
+
+
+def tokenize(text: str) -> List[str]:
+    return [
+        token
+        for token in TOKEN_PATTERN.findall(text.lower())
+        if token not in STOPWORDS
+    ]
+
+
+class LexicalHit(NamedTuple):
+    position: int
+    score: float
+    # Fraction of the distinct query terms found in this chunk
+    coverage: float
+
+
+class LexicalIndex:
+    """
+    Per-invoice inverted index with BM25 scoring.
+
+    Postings are kept as NumPy arrays (chunk positions, term
+    frequencies) so a query is a handful of vectorised updates.
+    Chunk text and metadata are stored alongside, so lexical-only
+    answers never touch the vector store.
+    """
+
+    def __init__(
+        self,
+        documents: List[Document],
+        lengths: np.ndarray,
+        postings: Dict[str, np.ndarray]
+    ):
+        self.documents = documents
+        self.lengths = lengths
+        self.postings = postings
+        self.average_length = float(lengths.mean()) if len(lengths) else 0.0
+
+    @classmethod
+    def build(cls, documents: Iterable[Document]) -> "LexicalIndex":
+        builder = LexicalIndexBuilder()
+        builder.add(documents)
+        return builder.build()
+
+    def search(self, query: str, k: int = 4) -> List[LexicalHit]:
+        terms = set(tokenize(query))
+        if not terms or not self.documents:
+            return []
+
+        total = len(self.documents)
+        scores = np.zeros(total)
+        matched = np.zeros(total)
+
+        norms = BM25_K1 * (
+            1 - BM25_B + BM25_B * self.lengths / max(self.average_length, 1.0)
+        )
+
+        for term in terms:
+            posting = self.postings.get(term)
+            if posting is None:
+                continue
+
+            positions, frequencies = posting[0], posting[1]
+            df = len(positions)
+            idf = np.log(1 + (total - df + 0.5) / (df + 0.5))
+
+            scores[positions] += idf * frequencies * (BM25_K1 + 1) / (
+                frequencies + norms[positions]
+            )
+            matched[positions] += 1
+
+        candidates = np.flatnonzero(scores)
+        best = candidates[np.argsort(-scores[candidates], kind="stable")][:k]
+
+        return [
+            LexicalHit(int(i), float(scores[i]), float(matched[i] / len(terms)))
+            for i in best
+        ]
+
+    def memory_bytes(self) -> int:
+        size = self.lengths.nbytes
+        for term, posting in self.postings.items():
+            size += len(term) + posting.nbytes
+        for document in self.documents:
+            size += len(document.page_content.encode("utf-8"))
+        return size
+
+    # =========================
+    # Persistence
+    # =========================
+    def to_json(self) -> dict:
+        return {
+            "format": FORMAT_VERSION,
+            "documents": [
+                [doc.page_content, doc.metadata] for doc in self.documents
+            ],
+            "lengths": self.lengths.tolist(),
+            # term → [positions..., frequencies...] flattened
+            "postings": {
+                term: posting.ravel().tolist()
+                for term, posting in self.postings.items()
+            }
+        }
+
+    @classmethod
+    def from_json(cls, data: dict) -> "LexicalIndex":
+        if data.get("format") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported lexical index format {data.get('format')}")
+
+        return cls(
+            documents=[
+                Document(page_content=text, metadata=metadata)
+                for text, metadata in data["documents"]
+            ],
+            lengths=np.asarray(data["lengths"], dtype=np.int32),
+            postings={
+                term: np.asarray(flat, dtype=np.int32).reshape(2, -1)
+                for term, flat in data["postings"].items()
+            }
+        )
+
+
+class LexicalIndexBuilder:
+    """
+    Accumulates postings as chunk batches stream past during
+    ingestion, so the documents are only tokenised once.
+    """
+
+    def __init__(self):
+        self.documents: List[Document] = []
+        self.lengths: List[int] = []
+        self.postings: Dict[str, List[List[int]]] = {}
+
+    def add(self, documents: Iterable[Document]) -> None:
+        for document in documents:
+            position = len(self.documents)
+            counts = Counter(tokenize(document.page_content))
+
+            for term, count in counts.items():
+                posting = self.postings.setdefault(term, [[], []])
+                posting[0].append(position)
+                posting[1].append(count)
+
+            self.documents.append(document)
+            self.lengths.append(sum(counts.values()))
+
+    def collect(self, batches: Iterable[List[Document]]) -> Iterator[List[Document]]:
+        """
+        Pass batches through unchanged, indexing each one.
+        """
+
+        for batch in batches:
+            self.add(batch)
+            yield batch
+
+    def build(self) -> LexicalIndex:
+        return LexicalIndex(
+            documents=self.documents,
+            lengths=np.asarray(self.lengths, dtype=np.int32),
+            postings={
+                term: np.asarray(posting, dtype=np.int32)
+                for term, posting in self.postings.items()
+            }
+        )
+
+
+# =========================
+# Storage
+# =========================
+def lexical_index_path(invoice_id: str) -> str:
+    return os.path.join(settings.LEXICAL_INDEX_PATH, f"{invoice_id}.json")
+
+
+def save_lexical_index(invoice_id: str, index: LexicalIndex) -> None:
+    """
+    Atomically replace the invoice's lexical index on disk.
+    """
+
+    path = lexical_index_path(invoice_id)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(index.to_json(), f, separators=(",", ":"))
+
+    os.replace(tmp_path, path)
+    lexical_cache.invalidate(invoice_id)
+
+
+def delete_lexical_index(invoice_id: str) -> None:
+    path = lexical_index_path(invoice_id)
+    if os.path.exists(path):
+        os.remove(path)
+    lexical_cache.invalidate(invoice_id)
+
+
+def load_lexical_index(invoice_id: str) -> Optional[LexicalIndex]:
+    """
+    The invoice's lexical index, or None if it was indexed before
+    lexical indexes existed.
+    """
+
+    path = lexical_index_path(invoice_id)
+    if not os.path.exists(path):
+        return None
+
+    with open(path, encoding="utf-8") as f:
+        return LexicalIndex.from_json(json.load(f))
+
+
+def get_lexical_index(invoice_id: str) -> Optional[LexicalIndex]:
+    return lexical_cache.get(invoice_id, load_lexical_index)
+
+
+lexical_cache = VectorStoreCache(
+    max_entries=settings.VECTOR_STORE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.VECTOR_STORE_CACHE_MAX_BYTES,
+    ttl_seconds=settings.VECTOR_STORE_CACHE_TTL_SECONDS
+)
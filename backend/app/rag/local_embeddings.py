@@ -0,0 +1,116 @@
+from typing import List, Sequence, Tuple
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+# 32-bit FNV-1a
+FNV_OFFSET = np.uint32(2166136261)
+FNV_PRIME = np.uint32(16777619)
+
+# Separates texts in a batch buffer; never part of a hashed n-gram
+SEPARATOR = 0
+
+
+class HashingEmbeddings(Embeddings):
+    """
+    Local, offline embeddings: hashed character n-grams.
+
+    Each text is lowercased and whitespace-collapsed, every n-gram of
+    its UTF-8 bytes (n in `ngram_range`, spanning word boundaries so
+    short phrases like "due date" count) is hashed into one of `dim`
+    signed buckets, counts are log-scaled and rows L2-normalised.
+
+    A whole batch is hashed at once with vectorised NumPy, so this
+    costs microseconds per chunk and needs no network or model files.
+    Vectors are deterministic across processes and restarts.
+    """
+
+    def __init__(self, dim: int = 512, ngram_range: Tuple[int, int] = (3, 5)):
+        self.dim = dim
+        self.ngram_range = ngram_range
+        self.model = f"hashing-char{ngram_range[0]}-{ngram_range[1]}-{dim}"
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.embed_matrix(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_matrix([text])[0].tolist()
+
+    def embed_matrix(self, texts: Sequence[str]) -> np.ndarray:
+        """
+        (len(texts), dim) float32 matrix of unit-length vectors
+        (all-zero for texts with no n-grams).
+        """
+
+        if not texts:
+            return np.zeros((0, self.dim), dtype="float32")
+
+        encoded = [
+            " ".join(text.lower().split()).encode("utf-8")
+            for text in texts
+        ]
+
+        # texts back to back, each followed by a separator byte
+        buffer = np.frombuffer(
+            b"".join(data + bytes([SEPARATOR]) for data in encoded),
+            dtype=np.uint8
+        )
+        owner = np.repeat(
+            np.arange(len(texts)),
+            [len(data) + 1 for data in encoded]
+        )
+        is_separator = buffer == SEPARATOR
+
+        low, high = self.ngram_range
+        rows, buckets, signs = [], [], []
+
+        # Extend every position's hash one byte at a time; positions
+        # whose n-gram would reach a separator drop out
+        hashes = np.full(len(buffer), FNV_OFFSET, dtype=np.uint32)
+        valid = np.ones(len(buffer), dtype=bool)
+
+        for n in range(1, high + 1):
+            starts = len(buffer) - n + 1
+            if starts <= 0:
+                break
+
+            hashes = (hashes[:starts] ^ buffer[n - 1:]) * FNV_PRIME
+            valid = valid[:starts] & ~is_separator[n - 1:]
+
+            if n < low:
+                continue
+
+            mixed = mix(hashes[valid] ^ np.uint32(n))
+            rows.append(owner[:starts][valid])
+            buckets.append(mixed % np.uint32(self.dim))
+            signs.append(np.where(mixed >> np.uint32(31), -1.0, 1.0))
+
+        matrix = np.zeros((len(texts), self.dim), dtype="float64")
+
+        if rows:
+            flat = np.concatenate(rows) * self.dim + np.concatenate(buckets)
+            matrix = np.bincount(
+                flat,
+                weights=np.concatenate(signs),
+                minlength=len(texts) * self.dim
+            ).reshape(len(texts), self.dim)
+
+        # Sublinear term frequency, then unit length
+        matrix = np.sign(matrix) * np.log1p(np.abs(matrix))
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        np.divide(matrix, norms, out=matrix, where=norms > 0)
+
+        return matrix.astype("float32")
+
+
+def mix(hashes: np.ndarray) -> np.ndarray:
+    """
+    Murmur3 finaliser: spreads FNV's weak low bits across the word.
+    """
+
+    hashes = hashes ^ (hashes >> np.uint32(16))
+    hashes = hashes * np.uint32(0x85EBCA6B)
+    hashes = hashes ^ (hashes >> np.uint32(13))
+    hashes = hashes * np.uint32(0xC2B2AE35)
+    return hashes ^ (hashes >> np.uint32(16))
@@ -0,0 +1,117 @@
+import argparse
+import os
+import shutil
+from typing import Iterator, List, Tuple
+
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config import settings
+from app.rag.native_store import (
+    is_legacy_store,
+    is_native_store,
+    read_legacy_store,
+    read_native_store
+)
+from app.rag.shared_index import SharedIndex, get_shared_index
+
+
+def iter_invoice_dirs(root: str) -> Iterator[Tuple[str, str]]:
+    """
+    Yield (invoice_id, path) for every per-invoice store directory.
+    """
+
+    if not os.path.isdir(root):
+        return
+
+    for invoice_id in sorted(os.listdir(root)):
+        path = os.path.join(root, invoice_id)
+        if is_native_store(path) or is_legacy_store(path):
+            yield invoice_id, path
+
+
+def read_invoice_store(path: str) -> Tuple[List[Document], np.ndarray]:
+    """
+    Documents and vectors of a per-invoice store, native format
+    preferred. No embedding model needed.
+    """
+
+    if is_native_store(path):
+        return read_native_store(path)
+
+    return read_legacy_store(path)
+
+
+def migrate(
+    index: SharedIndex,
+    root: str,
+    replace: bool = False,
+    delete_source: bool = False
+) -> dict:
+    """
+    Import every per-invoice store under `root` into the shared index.
+    Invoices already in the shared index are skipped unless `replace`.
+    """
+
+    summary = {"imported": 0, "skipped": 0, "failed": 0, "chunks": 0}
+
+    for invoice_id, path in iter_invoice_dirs(root):
+        if not replace and index.has_invoice(invoice_id):
+            summary["skipped"] += 1
+            continue
+
+        try:
+            documents, vectors = read_invoice_store(path)
+            ids = index.add(invoice_id, documents, vectors)
+            if ids:
+                index.delete_invoice(invoice_id, before_id=ids[0])
+        except Exception as e:
+            print(f"{invoice_id}: {e}")
+            summary["failed"] += 1
+            continue
+
+        summary["imported"] += 1
+        summary["chunks"] += len(documents)
+
+        if delete_source:
+            shutil.rmtree(path)
+
+    index.flush()
+
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description="Import per-invoice vector stores into the shared index."
+    )
+    parser.add_argument("--source", default=settings.VECTOR_DB_PATH)
+    parser.add_argument(
+        "--replace",
+        action="store_true",
+        help="re-import invoices already in the shared index"
+    )
+    parser.add_argument(
+        "--delete-source",
+        action="store_true",
+        help="remove each per-invoice directory once imported"
+    )
+    parser.add_argument(
+        "--compact",
+        action="store_true",
+        help="drop deleted chunks and rebuild the ANN index afterwards"
+    )
+    args = parser.parse_args()
+
+    index = get_shared_index()
+    summary = migrate(index, args.source, args.replace, args.delete_source)
+
+    if args.compact:
+        summary["live_chunks"] = index.rebuild()
+
+    print(summary)
+    print("Set VECTOR_STORE_BACKEND=shared to serve from the shared index.")
+
+
+if __name__ == "__main__":
+    main()
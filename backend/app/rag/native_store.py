@@ -0,0 +1,647 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+import uuid
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config import settings
+
+
+CHUNKS_FILE = "chunks.db"
+LOCK_FILE = ".write.lock"
+FORMAT_VERSION = "1"
+
+# The only classes a FAISS.save_local docstore pickle needs
+LEGACY_PICKLE_CLASSES = {
+    ("langchain_community.docstore.in_memory", "InMemoryDocstore"),
+    ("langchain.docstore.in_memory", "InMemoryDocstore"),
+    ("langchain_core.documents.base", "Document"),
+    ("langchain_core.documents", "Document"),
+    ("langchain.schema.document", "Document"),
+    ("langchain.docstore.document", "Document"),
+}
+
+
+def is_native_store(path: str) -> bool:
+    return os.path.isfile(os.path.join(path, CHUNKS_FILE))
+
+
+def is_legacy_store(path: str) -> bool:
+    return (
+        os.path.isfile(os.path.join(path, "index.faiss"))
+        and os.path.isfile(os.path.join(path, "index.pkl"))
+    )
+
+
+# =========================
+# Quantization
+# =========================
+QUANTIZATIONS = ("none", "int8")
+
+# Rows dequantized per block while scanning int8 codes
+SCAN_BLOCK_ROWS = 65536
+
+
+def quantize_int8(matrix: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Per-row symmetric int8: row ≈ codes * scale, scale = max|row| / 127.
+    Returns (codes, scales).
+    """
+
+    scales = np.abs(matrix).max(axis=1) / 127
+    scales[scales == 0] = 1.0
+    codes = np.rint(matrix / scales[:, None]).astype(np.int8)
+    return codes, scales.astype("float32")
+
+
+def int8_distances(
+    codes: np.ndarray,
+    scales: np.ndarray,
+    norms: np.ndarray,
+    query: np.ndarray
+) -> np.ndarray:
+    """
+    Approximate squared L2 from int8 codes, using the exact row norms:
+    |v - q|^2 = |v|^2 - 2 scale (codes . q) + |q|^2.
+    Scanned in blocks so the float32 copy stays bounded.
+    """
+
+    dots = np.empty(len(codes), dtype="float32")
+    for start in range(0, len(codes), SCAN_BLOCK_ROWS):
+        block = codes[start:start + SCAN_BLOCK_ROWS].astype("float32")
+        dots[start:start + len(block)] = block @ query
+
+    distances = norms - 2 * scales * dots + query @ query
+    return np.maximum(distances, 0, out=distances)
+
+
+def top_k(distances: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(distances))
+    best = np.argpartition(distances, k - 1)[:k]
+    return best[np.argsort(distances[best], kind="stable")]
+
+
+# =========================
+# Reading
+# =========================
+class StaleGeneration(RuntimeError):
+    """
+    The store was rewritten since this generation was opened.
+    """
+
+
+class NativeGeneration:
+    """
+    One generation of a native store: its mapped files, searched and
+    resolved against the sidecar rows written with them.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        meta: Dict[str, str],
+        rerank_factor: Optional[int] = None
+    ):
+        self.path = path
+        self.rerank_factor = (
+            settings.NATIVE_STORE_RERANK_FACTOR
+            if rerank_factor is None else rerank_factor
+        )
+
+        self.generation = meta["generation"]
+        self.count = int(meta["count"])
+        self.dim = int(meta["dim"])
+        self.quantization = meta.get("quantization", "none")
+        # model_key of the embedding model (unknown for older stores)
+        self.embedder = meta.get("embedder")
+
+        self.vectors = (
+            self._map("vectors", "float32", (self.count, self.dim))
+            if meta.get("vectors", "1") == "1" else None
+        )
+        self.norms = (
+            self._map("norms", "float32", (self.count,))
+            if meta.get("norms") == "1" else None
+        )
+        self.codes = self.scales = None
+
+        if self.quantization == "int8":
+            self.codes = self._map("codes", "int8", (self.count, self.dim))
+            self.scales = self._map("scales", "float32", (self.count,))
+
+    def _map(self, kind: str, dtype: str, shape: Tuple[int, ...]) -> np.ndarray:
+        if not self.count:
+            return np.zeros(shape, dtype=dtype)
+
+        return np.memmap(
+            os.path.join(self.path, generation_file(kind, self.generation, dtype)),
+            dtype=dtype,
+            mode="r",
+            shape=shape
+        )
+
+    @classmethod
+    def open(cls, path: str) -> "NativeGeneration":
+        # A writer may swap generations between reading the sidecar
+        # and mapping the files; the second attempt sees the new one
+        for attempt in range(2):
+            try:
+                return cls(path, read_meta(path))
+            except FileNotFoundError:
+                if attempt:
+                    raise
+
+    def documents(self, positions: Sequence[int]) -> List[Document]:
+        """
+        Chunks at `positions`. Raises StaleGeneration if the sidecar
+        now belongs to a newer generation: its rows wouldn't match.
+        """
+
+        positions = [int(p) for p in positions]
+        rows = {}
+
+        # One connection reads one sidecar file, even across a swap
+        conn = connect_readonly(self.path)
+        try:
+            (generation,) = conn.execute(
+                "SELECT value FROM meta WHERE key = 'generation'"
+            ).fetchone()
+            if generation != self.generation:
+                raise StaleGeneration(
+                    f"{self.path} was rewritten since it was opened"
+                )
+
+            # Stay under SQLite's bound-parameter limit
+            for start in range(0, len(positions), 500):
+                part = positions[start:start + 500]
+                rows.update(
+                    (position, (text, metadata))
+                    for position, text, metadata in conn.execute(
+                        "SELECT position, text, metadata FROM chunks "
+                        "WHERE position IN (%s)" % ",".join("?" * len(part)),
+                        part
+                    )
+                )
+        finally:
+            conn.close()
+
+        return [
+            Document(page_content=rows[p][0], metadata=json.loads(rows[p][1]))
+            for p in positions
+        ]
+
+    def all_vectors(self) -> np.ndarray:
+        """
+        Every row as float32: exact if kept, else dequantized.
+        """
+
+        if self.vectors is not None:
+            return np.array(self.vectors)
+        return self.codes.astype("float32") * self.scales[:, None]
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        (positions, squared L2 distances) of the k nearest rows.
+        """
+
+        if self.norms is None:
+            # Stores written before norms were kept: compute once
+            self.norms = np.einsum("ij,ij->i", self.vectors, self.vectors)
+
+        if self.codes is None:
+            # |v - q|^2 = |v|^2 - 2 v.q + |q|^2: one BLAS pass over
+            # the mapped rows per query
+            distances = self.norms - 2 * (self.vectors @ query) + query @ query
+            np.maximum(distances, 0, out=distances)
+            best = top_k(distances, k)
+            return best, distances[best]
+
+        distances = int8_distances(self.codes, self.scales, self.norms, query)
+
+        if self.vectors is None or self.rerank_factor <= 1:
+            best = top_k(distances, k)
+            return best, distances[best]
+
+        # Exact re-rank: only the candidates' float32 rows are read
+        candidates = np.sort(top_k(distances, k * self.rerank_factor))
+        exact = ((self.vectors[candidates] - query) ** 2).sum(axis=1)
+        order = top_k(exact, k)
+        return candidates[order], exact[order]
+
+
+class NativeVectorStore:
+    """
+    Per-invoice store in the native format:
+
+    - vectors-<generation>.f32: raw row-major float32, memory-mapped
+      read-only, so loads are O(1) and every worker process shares
+      the same OS page cache
+    - norms-<generation>.f32: squared L2 norm per row
+    - with int8 quantization, codes-<generation>.i8 and
+      scales-<generation>.f32 (a quarter of the float32 size) are what
+      gets scanned; the float32 rows, if kept, are only read to
+      re-rank the best candidates exactly
+    - chunks.db: SQLite sidecar with chunk text/metadata (JSON) by
+      row position, plus the dimension, count, layout and current
+      generation
+
+    No pickle anywhere. Unquantized search is exact L2, like the
+    IndexFlatL2 that FAISS.from_documents builds, and only the top-k
+    rows' text is read.
+
+    Stays valid across rewrites: a search that finds the store
+    rewritten (by another process, the backfill CLI) switches to the
+    current generation and runs again.
+    """
+
+    def __init__(self, path: str, generation: NativeGeneration, embeddings=None):
+        self.path = path
+        self.embeddings = embeddings
+        self._current = generation
+
+    @classmethod
+    def open(cls, path: str, embeddings=None) -> "NativeVectorStore":
+        return cls(path, NativeGeneration.open(path), embeddings)
+
+    @property
+    def generation(self) -> str:
+        return self._current.generation
+
+    @property
+    def count(self) -> int:
+        return self._current.count
+
+    @property
+    def dim(self) -> int:
+        return self._current.dim
+
+    @property
+    def embedder(self) -> Optional[str]:
+        return self._current.embedder
+
+    def __len__(self) -> int:
+        return self.count
+
+    def documents(self, positions: Sequence[int]) -> List[Document]:
+        return self._current.documents(positions)
+
+    def all_vectors(self) -> np.ndarray:
+        return self._current.all_vectors()
+
+    def search(self, query: np.ndarray, k: int) -> Tuple[np.ndarray, np.ndarray]:
+        return self._current.search(query, k)
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        query = np.asarray(embedding, dtype="float32")
+
+        for attempt in range(2):
+            # Searched and resolved in the same generation
+            current = self._current
+            if not current.count:
+                return []
+            if len(query) != current.dim:
+                raise ValueError(
+                    f"Query embedding has {len(query)} dimensions, the store at "
+                    f"{self.path} {current.dim}: re-index after switching "
+                    "EMBEDDING_PROVIDER"
+                )
+
+            positions, distances = current.search(query, k)
+
+            try:
+                documents = current.documents(positions)
+            except StaleGeneration:
+                if attempt:
+                    raise
+                self._current = NativeGeneration.open(self.path)
+                continue
+
+            return list(zip(documents, (float(d) for d in distances)))
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embeddings.embed_query(query), k
+        )
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+
+def read_native_store(path: str) -> Tuple[List[Document], np.ndarray]:
+    """
+    Every chunk and vector of a native store, in position order.
+    """
+
+    store = NativeVectorStore.open(path)
+    return store.documents(range(store.count)), store.all_vectors()
+
+
+FILE_SUFFIXES = {"float32": "f32", "int8": "i8"}
+
+
+def generation_file(kind: str, generation: str, dtype: str = "float32") -> str:
+    return f"{kind}-{generation}.{FILE_SUFFIXES[dtype]}"
+
+
+def connect_readonly(path: str) -> sqlite3.Connection:
+    return sqlite3.connect(
+        f"file:{os.path.join(path, CHUNKS_FILE)}?mode=ro",
+        uri=True
+    )
+
+
+def read_meta(path: str) -> dict:
+    if not is_native_store(path):
+        raise FileNotFoundError(f"No native vector store at {path}")
+
+    conn = connect_readonly(path)
+    try:
+        return dict(conn.execute("SELECT key, value FROM meta"))
+    finally:
+        conn.close()
+
+
+# =========================
+# Writing
+# =========================
+_held_locks = threading.local()
+
+
+@contextmanager
+def store_write_lock(path: str) -> Iterator[None]:
+    """
+    Exclusive lock on changing the store at `path`, across threads
+    and processes (a lock file inside it). Re-entrant per thread.
+    """
+
+    held = _held_locks.__dict__.setdefault("paths", set())
+    key = os.path.abspath(path)
+    if key in held:
+        yield
+        return
+
+    os.makedirs(path, exist_ok=True)
+
+    with open(os.path.join(path, LOCK_FILE), "a+b") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_EX)
+        else:
+            f.seek(0)
+            while True:
+                try:
+                    msvcrt.locking(f.fileno(), msvcrt.LK_LOCK, 1)
+                    break
+                except OSError:
+                    # LK_LOCK gives up after ~10 s: keep waiting
+                    continue
+
+        held.add(key)
+        try:
+            yield
+        finally:
+            held.discard(key)
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            else:
+                f.seek(0)
+                msvcrt.locking(f.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+def generation_files(path: str, meta: Dict[str, str]) -> List[str]:
+    """
+    Paths of the data files a sidecar's generation refers to.
+    """
+
+    generation = meta["generation"]
+    kinds = []
+    if meta.get("norms") == "1":
+        kinds.append(("norms", "float32"))
+    if meta.get("vectors", "1") == "1":
+        kinds.append(("vectors", "float32"))
+    if meta.get("quantization", "none") == "int8":
+        kinds += [("codes", "int8"), ("scales", "float32")]
+
+    return [
+        os.path.join(path, generation_file(kind, generation, dtype))
+        for kind, dtype in kinds
+    ]
+
+
+def write_native_store(
+    path: str,
+    batches: Iterable[Tuple[Sequence[Document], Sequence[Sequence[float]]]],
+    quantization: Optional[str] = None,
+    keep_vectors: Optional[bool] = None,
+    embedder: Optional[str] = None
+) -> int:
+    """
+    Write (documents, vectors) batches as a new generation of the
+    store at `path`, streaming vectors to disk batch by batch.
+    `embedder` (model_key of the embedding model) is recorded so the
+    store isn't queried with another model's vectors.
+
+    `quantization` ("none" / "int8") and `keep_vectors` (keep float32
+    rows next to int8 codes, for exact re-ranking) default to
+    NATIVE_STORE_QUANTIZATION / NATIVE_STORE_RERANK.
+
+    Readers keep seeing the previous generation until the sidecar is
+    swapped in with os.replace. The swap and the removal of the
+    generation it replaced happen under store_write_lock, so
+    concurrent writers never delete the files of the generation that
+    ends up current. Returns the number of chunks written.
+    """
+
+    if quantization is None:
+        quantization = settings.NATIVE_STORE_QUANTIZATION
+    if quantization not in QUANTIZATIONS:
+        raise ValueError(
+            f"Unknown quantization {quantization!r}; "
+            f"expected one of {', '.join(QUANTIZATIONS)}"
+        )
+    if keep_vectors is None:
+        keep_vectors = settings.NATIVE_STORE_RERANK
+    keep_vectors = keep_vectors or quantization == "none"
+
+    os.makedirs(path, exist_ok=True)
+
+    generation = uuid.uuid4().hex
+    kinds = {"norms": "float32"}
+    if keep_vectors:
+        kinds["vectors"] = "float32"
+    if quantization == "int8":
+        kinds.update(codes="int8", scales="float32")
+
+    paths = {
+        kind: os.path.join(path, generation_file(kind, generation, dtype))
+        for kind, dtype in kinds.items()
+    }
+    sidecar_tmp = os.path.join(path, f"{CHUNKS_FILE}.{generation}.tmp")
+
+    conn = sqlite3.connect(sidecar_tmp)
+    files = {}
+    count = 0
+    dim: Optional[int] = None
+
+    try:
+        conn.execute(
+            "CREATE TABLE chunks ("
+            "position INTEGER PRIMARY KEY, text TEXT NOT NULL, metadata TEXT NOT NULL)"
+        )
+        conn.execute("CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+        files = {kind: open(file_path, "wb") for kind, file_path in paths.items()}
+
+        for documents, vectors in batches:
+            matrix = np.ascontiguousarray(vectors, dtype="float32")
+            if not len(matrix):
+                continue
+
+            if dim is None:
+                dim = matrix.shape[1]
+            elif matrix.shape[1] != dim:
+                raise ValueError("Embedding dimension changed mid-store")
+
+            arrays = {"norms": np.einsum("ij,ij->i", matrix, matrix)}
+            if keep_vectors:
+                arrays["vectors"] = matrix
+            if quantization == "int8":
+                arrays["codes"], arrays["scales"] = quantize_int8(matrix)
+
+            for kind, array in arrays.items():
+                files[kind].write(np.ascontiguousarray(array).tobytes())
+
+            conn.executemany(
+                "INSERT INTO chunks (position, text, metadata) VALUES (?, ?, ?)",
+                [
+                    (count + i, doc.page_content, json.dumps(doc.metadata))
+                    for i, doc in enumerate(documents)
+                ]
+            )
+            count += len(matrix)
+
+        for f in files.values():
+            f.flush()
+            os.fsync(f.fileno())
+            f.close()
+
+        conn.executemany(
+            "INSERT INTO meta (key, value) VALUES (?, ?)",
+            [
+                ("format", FORMAT_VERSION),
+                ("generation", generation),
+                ("count", str(count)),
+                ("dim", str(dim or 0)),
+                ("quantization", quantization),
+                ("vectors", "1" if keep_vectors else "0"),
+                ("norms", "1"),
+            ] + ([("embedder", embedder)] if embedder else [])
+        )
+        conn.commit()
+        conn.close()
+
+        with store_write_lock(path):
+            previous = read_meta(path) if is_native_store(path) else None
+            os.replace(sidecar_tmp, os.path.join(path, CHUNKS_FILE))
+
+            # Mapped old generations stay readable until unmapped (POSIX)
+            if previous is not None and previous["generation"] != generation:
+                for old in generation_files(path, previous):
+                    try:
+                        os.remove(old)
+                    except OSError:
+                        pass
+    except Exception:
+        conn.close()
+        for f in files.values():
+            f.close()
+        for leftover in (sidecar_tmp, *paths.values()):
+            if os.path.exists(leftover):
+                os.remove(leftover)
+        raise
+
+    return count
+
+
+# =========================
+# Legacy FAISS directories
+# =========================
+class LegacyDocstoreUnpickler(pickle.Unpickler):
+    """
+    Loads FAISS.save_local's index.pkl without running arbitrary
+    code: only the docstore and Document classes may be referenced.
+    """
+
+    def find_class(self, module: str, name: str):
+        if (module, name) in LEGACY_PICKLE_CLASSES:
+            return super().find_class(module, name)
+        raise pickle.UnpicklingError(
+            f"Refusing to load {module}.{name} from a vector store pickle"
+        )
+
+
+def load_legacy_docstore(path: str) -> Tuple[Any, Dict[int, str]]:
+    """
+    (docstore, index → docstore ID map) from a legacy index.pkl.
+    """
+
+    with open(os.path.join(path, "index.pkl"), "rb") as f:
+        return LegacyDocstoreUnpickler(f).load()
+
+
+def read_legacy_store(path: str) -> Tuple[List[Document], np.ndarray]:
+    """
+    Read a FAISS.save_local directory directly: vectors from
+    index.faiss, documents from the (docstore, id map) pickle.
+    No embedding model needed.
+    """
+
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    vectors = index.reconstruct_n(0, index.ntotal)
+
+    docstore, index_to_docstore_id = load_legacy_docstore(path)
+
+    documents = [
+        docstore.search(index_to_docstore_id[i])
+        for i in range(index.ntotal)
+    ]
+
+    return documents, vectors
+
+
+def convert_legacy_store(path: str, remove_legacy: bool = False) -> int:
+    """
+    Write the native format next to a legacy FAISS directory,
+    holding the store's write lock throughout.
+    Returns the number of chunks converted.
+    """
+
+    with store_write_lock(path):
+        documents, vectors = read_legacy_store(path)
+        count = write_native_store(path, [(documents, vectors)])
+
+        if remove_legacy:
+            for name in ("index.faiss", "index.pkl"):
+                os.remove(os.path.join(path, name))
+
+    return count
@@ -1,9 +1,21 @@
-from typing import List
+import asyncio
+import hashlib
+import time
+from typing import AsyncIterator, List, NamedTuple, Optional
 
 from langchain_core.documents import Document
 from langchain_core.prompts import PromptTemplate
 
-from app.llm_fallback import safe_llm_invoke
+from app.config import settings
+from app.llm_fallback import (
+    llm_chain_signature,
+    safe_llm_ainvoke,
+    safe_llm_astream,
+    safe_llm_invoke
+)
+from app.rag.answer_cache import answer_cache, context_hash, normalize_question
+from app.rag.embedding_cache import model_key
+from app.rag.vector_store import get_query_embeddings
 
 
 QA_PROMPT = PromptTemplate(
@@ -43,19 +55,238 @@ def format_context(documents: List[Document]) -> str:
     )
 
 
+def build_prompt(documents: List[Document], question: str) -> str:
+    return QA_PROMPT.format(
+        context=format_context(documents),
+        question=question
+    )
+
+
 def answer_question(
     documents: List[Document],
-    question: str
+    question: str,
+    deadline: Optional[float] = None
 ) -> str:
     """
     Generate grounded answer using retrieved context.
+    `deadline` (time.monotonic()) bounds the LLM call.
     """
 
-    context = format_context(documents)
+    return safe_llm_invoke(build_prompt(documents, question), deadline)
 
-    prompt = QA_PROMPT.format(
-        context=context,
-        question=question
+
+def answer_model_key() -> str:
+    """
+    LLM chain + prompt identity: changing either retires cached answers.
+    """
+
+    prompt = hashlib.sha256(QA_PROMPT.template.encode("utf-8")).hexdigest()[:16]
+    return f"{llm_chain_signature()}|prompt:{prompt}"
+
+
+class AnswerLookup(NamedTuple):
+    # The cached answer, or None on a miss
+    answer: Optional[str]
+    key: str
+    model: str
+    embedder: Optional[str]
+    vector: Optional[List[float]]
+    started_at: float
+
+
+def lookup_answer(
+    invoice_id: str,
+    documents: List[Document],
+    question: str,
+    started_at: Optional[float] = None
+) -> AnswerLookup:
+    """
+    Exact matches first, then (ANSWER_CACHE_SEMANTIC) paraphrases of
+    earlier questions about the same invoice.
+    `started_at` (time.time()) is when answering began, before
+    retrieval: the answer isn't cached if the invoice was invalidated
+    since. Defaults to now.
+    """
+
+    if started_at is None:
+        started_at = time.time()
+    model = answer_model_key()
+    key = answer_cache.make_key(
+        invoice_id, question, context_hash(documents), model
+    )
+
+    cached = answer_cache.get(key)
+    if cached:
+        return AnswerLookup(cached.answer, key, model, None, None, started_at)
+
+    embedder = vector = None
+
+    if settings.ANSWER_CACHE_SEMANTIC:
+        embeddings = get_query_embeddings()
+        embedder = model_key(embeddings)
+        vector = embeddings.embed_query(normalize_question(question))
+
+        cached = answer_cache.get_similar(invoice_id, model, embedder, vector)
+        if cached:
+            return AnswerLookup(cached.answer, key, model, embedder, vector, started_at)
+
+    answer_cache.record_miss()
+    return AnswerLookup(None, key, model, embedder, vector, started_at)
+
+
+def store_answer(
+    invoice_id: str,
+    question: str,
+    lookup: AnswerLookup,
+    answer: str
+) -> None:
+    answer_cache.put(
+        lookup.key,
+        invoice_id=invoice_id,
+        model=lookup.model,
+        question=question,
+        answer=answer,
+        embedder=lookup.embedder,
+        vector=lookup.vector,
+        started_at=lookup.started_at
+    )
+
+
+def cached_answer_question(
+    invoice_id: str,
+    documents: List[Document],
+    question: str,
+    deadline: Optional[float] = None,
+    started_at: Optional[float] = None
+) -> str:
+    """
+    answer_question, through the answer cache. Only misses reach
+    the LLM. `started_at` as for lookup_answer.
+    """
+
+    if not settings.ANSWER_CACHE_ENABLED:
+        return answer_question(documents, question, deadline)
+
+    lookup = lookup_answer(invoice_id, documents, question, started_at)
+    if lookup.answer is not None:
+        return lookup.answer
+
+    answer = answer_question(documents, question, deadline)
+    store_answer(invoice_id, question, lookup, answer)
+
+    return answer
+
+
+# =========================
+# Async variants (chat API)
+# =========================
+async def aanswer_question(
+    documents: List[Document],
+    question: str,
+    deadline: Optional[float] = None
+) -> str:
+    return await safe_llm_ainvoke(build_prompt(documents, question), deadline)
+
+
+async def astream_answer_question(
+    documents: List[Document],
+    question: str,
+    deadline: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    aanswer_question, yielding the answer as the LLM produces it.
+    """
+
+    async for token in safe_llm_astream(build_prompt(documents, question), deadline):
+        yield token
+
+
+async def alookup_answer(
+    invoice_id: str,
+    documents: List[Document],
+    question: str,
+    started_at: Optional[float] = None
+) -> AnswerLookup:
+    """
+    lookup_answer with the question embedding awaited and the cache's
+    SQLite reads on a worker thread.
+    """
+
+    if started_at is None:
+        started_at = time.time()
+    model = answer_model_key()
+    key = answer_cache.make_key(
+        invoice_id, question, context_hash(documents), model
     )
 
-    return safe_llm_invoke(prompt)
+    cached = await asyncio.to_thread(answer_cache.get, key)
+    if cached:
+        return AnswerLookup(cached.answer, key, model, None, None, started_at)
+
+    embedder = vector = None
+
+    if settings.ANSWER_CACHE_SEMANTIC:
+        embeddings = get_query_embeddings()
+        embedder = model_key(embeddings)
+        vector = await embeddings.aembed_query(normalize_question(question))
+
+        cached = await asyncio.to_thread(
+            answer_cache.get_similar, invoice_id, model, embedder, vector
+        )
+        if cached:
+            return AnswerLookup(cached.answer, key, model, embedder, vector, started_at)
+
+    answer_cache.record_miss()
+    return AnswerLookup(None, key, model, embedder, vector, started_at)
+
+
+async def cached_aanswer_question(
+    invoice_id: str,
+    documents: List[Document],
+    question: str,
+    deadline: Optional[float] = None,
+    started_at: Optional[float] = None
+) -> str:
+    if not settings.ANSWER_CACHE_ENABLED:
+        return await aanswer_question(documents, question, deadline)
+
+    lookup = await alookup_answer(invoice_id, documents, question, started_at)
+    if lookup.answer is not None:
+        return lookup.answer
+
+    answer = await aanswer_question(documents, question, deadline)
+    await asyncio.to_thread(store_answer, invoice_id, question, lookup, answer)
+
+    return answer
+
+
+async def cached_astream_answer_question(
+    invoice_id: str,
+    documents: List[Document],
+    question: str,
+    deadline: Optional[float] = None,
+    started_at: Optional[float] = None
+) -> AsyncIterator[str]:
+    """
+    astream_answer_question, through the answer cache: a cached answer
+    comes back as one chunk, a new one is cached once it's complete.
+    """
+
+    if not settings.ANSWER_CACHE_ENABLED:
+        async for token in astream_answer_question(documents, question, deadline):
+            yield token
+        return
+
+    lookup = await alookup_answer(invoice_id, documents, question, started_at)
+    if lookup.answer is not None:
+        yield lookup.answer
+        return
+
+    parts: List[str] = []
+    async for token in astream_answer_question(documents, question, deadline):
+        parts.append(token)
+        yield token
+
+    await asyncio.to_thread(
+        store_answer, invoice_id, question, lookup, "".join(parts)
+    )
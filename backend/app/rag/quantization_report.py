@@ -0,0 +1,252 @@
+import argparse
+import os
+from typing import Callable, List, Tuple
+
+import faiss
+import numpy as np
+
+from app.config import settings
+from app.rag.native_store import (
+    NativeVectorStore,
+    int8_distances,
+    is_legacy_store,
+    is_native_store,
+    quantize_int8,
+    top_k
+)
+
+
+# Distances from a query to every corpus row, under one encoding
+DistanceFn = Callable[[np.ndarray], np.ndarray]
+
+
+def read_vectors(path: str) -> np.ndarray:
+    """
+    float32 rows of a per-invoice store, native or legacy.
+    """
+
+    if is_native_store(path):
+        return NativeVectorStore.open(path).all_vectors()
+
+    index = faiss.read_index(os.path.join(path, "index.faiss"))
+    return index.reconstruct_n(0, index.ntotal)
+
+
+def load_corpus(root: str, limit: int = 0) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    (vectors, owner) for every store under `root`: all rows stacked,
+    plus the index of the invoice each row belongs to.
+    """
+
+    matrices, owners = [], []
+
+    for name in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+        path = os.path.join(root, name)
+        if not (is_native_store(path) or is_legacy_store(path)):
+            continue
+
+        vectors = read_vectors(path)
+        if len(vectors):
+            owners.append(np.full(len(vectors), len(matrices)))
+            matrices.append(vectors)
+
+        if limit and len(matrices) >= limit:
+            break
+
+    if not matrices:
+        return np.zeros((0, 0), dtype="float32"), np.zeros(0, dtype=int)
+
+    dims = {m.shape[1] for m in matrices}
+    if len(dims) > 1:
+        raise ValueError(
+            f"Stores use different embedding dimensions {sorted(dims)}; "
+            "report on one model's stores at a time"
+        )
+
+    return np.vstack(matrices).astype("float32"), np.concatenate(owners)
+
+
+def exact_distances(vectors: np.ndarray, norms: np.ndarray) -> DistanceFn:
+    return lambda q: np.maximum(norms - 2 * (vectors @ q) + q @ q, 0)
+
+
+def int8_method(vectors: np.ndarray, norms: np.ndarray) -> DistanceFn:
+    codes, scales = quantize_int8(vectors)
+    return lambda q: int8_distances(codes, scales, norms, q)
+
+
+def pq_method(vectors: np.ndarray, m: int, seed: int) -> DistanceFn:
+    """
+    Product quantization, 8 bits per sub-vector, trained on the
+    corpus itself. Distances to the decoded rows equal FAISS's
+    asymmetric (ADC) distances.
+    """
+
+    quantizer = faiss.ProductQuantizer(vectors.shape[1], m, 8)
+    quantizer.cp.seed = seed
+    # Small corpora are reported on anyway (see main); don't let
+    # k-means warn once per sub-quantizer
+    quantizer.cp.min_points_per_centroid = 1
+    quantizer.train(vectors)
+
+    decoded = quantizer.decode(quantizer.compute_codes(vectors))
+    return exact_distances(decoded, np.einsum("ij,ij->i", decoded, decoded))
+
+
+def search(
+    distances: DistanceFn,
+    query_row: int,
+    query: np.ndarray,
+    rows: np.ndarray,
+    k: int,
+    rerank: int,
+    vectors: np.ndarray
+) -> np.ndarray:
+    """
+    Top-k rows (among `rows`, excluding the query's own row), with
+    optional exact re-ranking of the best k x `rerank` candidates.
+    """
+
+    scores = distances(query)[rows]
+    scores[rows == query_row] = np.inf
+
+    if rerank <= 1:
+        return rows[top_k(scores, k)]
+
+    candidates = rows[top_k(scores, k * rerank)]
+    candidates = candidates[candidates != query_row]
+    exact = ((vectors[candidates] - query) ** 2).sum(axis=1)
+    return candidates[top_k(exact, k)]
+
+
+def recall_at_k(
+    method: DistanceFn,
+    baseline: DistanceFn,
+    vectors: np.ndarray,
+    owner: np.ndarray,
+    queries: np.ndarray,
+    k: int,
+    rerank: int,
+    per_invoice: bool
+) -> float:
+    """
+    Mean recall@k against exact float32 search.
+    Per-invoice search only counts invoices with more than k other
+    chunks, where the answer isn't trivially "all of them".
+    """
+
+    everything = np.arange(len(vectors))
+    recalls: List[float] = []
+
+    for row in queries:
+        rows = np.flatnonzero(owner == owner[row]) if per_invoice else everything
+        if len(rows) <= k + 1:
+            continue
+
+        query = vectors[row]
+        truth = search(baseline, row, query, rows, k, 1, vectors)
+        found = search(method, row, query, rows, k, rerank, vectors)
+
+        recalls.append(len(np.intersect1d(truth, found)) / k)
+
+    return float(np.mean(recalls)) if recalls else float("nan")
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=(
+            "Memory saved vs recall@k lost by quantizing the vectors of the "
+            "per-invoice stores, measured on the stores themselves."
+        )
+    )
+    parser.add_argument("--source", default=settings.VECTOR_DB_PATH)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--queries", type=int, default=500, help="chunks sampled as queries")
+    parser.add_argument("--rerank-factor", type=int, default=settings.NATIVE_STORE_RERANK_FACTOR)
+    parser.add_argument(
+        "--pq-m",
+        default="",
+        help="comma-separated PQ sub-vector counts (must divide the dimension); "
+             "default dim/8 and dim/32"
+    )
+    parser.add_argument("--limit-invoices", type=int, default=0)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    vectors, owner = load_corpus(args.source, args.limit_invoices)
+    if not len(vectors):
+        print(f"No vector stores under {args.source}")
+        return
+
+    count, dim = vectors.shape
+    rng = np.random.default_rng(args.seed)
+    queries = rng.choice(count, size=min(args.queries, count), replace=False)
+    norms = np.einsum("ij,ij->i", vectors, vectors)
+
+    print(
+        f"{owner.max() + 1} invoices, {count} chunks, dim {dim}, "
+        f"{len(queries)} query chunks, k={args.k}, re-rank x{args.rerank_factor}"
+    )
+
+    baseline = exact_distances(vectors, norms)
+
+    # (label, distances, bytes scanned per row, bytes on disk per row, rerank)
+    methods: List[Tuple[str, DistanceFn, int, int, int]] = [
+        ("float32 (exact)", baseline, dim * 4 + 4, dim * 4 + 4, 1)
+    ]
+
+    int8 = int8_method(vectors, norms)
+    methods += [
+        ("int8", int8, dim + 8, dim + 8, 1),
+        ("int8 + re-rank", int8, dim + 8, dim * 5 + 8, args.rerank_factor),
+    ]
+
+    pq_ms = (
+        [int(m) for m in args.pq_m.split(",") if m]
+        or [m for m in (dim // 8, dim // 32) if m and dim % m == 0]
+    )
+    if pq_ms and 256 <= count < 256 * 39:
+        print(
+            f"PQ codebooks trained on only {count} chunks "
+            f"(FAISS recommends {256 * 39}); PQ recall will be pessimistic"
+        )
+
+    for m in pq_ms:
+        if count < 256:
+            print(f"PQ m={m}: skipped, needs at least 256 chunks to train")
+            continue
+        pq = pq_method(vectors, m, args.seed)
+        methods += [
+            (f"PQ m={m}", pq, m, m, 1),
+            (f"PQ m={m} + re-rank", pq, m, m + dim * 4, args.rerank_factor),
+        ]
+
+    print(
+        f"{'method':<22} {'scan MB':>9} {'disk MB':>9} {'saved':>7} "
+        f"{'recall/inv':>11} {'recall/all':>11}"
+    )
+
+    float_bytes = methods[0][2] * count
+
+    for label, distances, scanned, disk, rerank in methods:
+        per_invoice = recall_at_k(
+            distances, baseline, vectors, owner, queries, args.k, rerank, True
+        )
+        overall = recall_at_k(
+            distances, baseline, vectors, owner, queries, args.k, rerank, False
+        )
+        print(
+            f"{label:<22} {scanned * count / 2**20:>9.2f} {disk * count / 2**20:>9.2f} "
+            f"{1 - scanned * count / float_bytes:>7.0%} "
+            f"{per_invoice:>11.3f} {overall:>11.3f}"
+        )
+
+    print(
+        "scan MB: what each query reads (stays in memory when hot); "
+        "recall/inv: per-invoice search as /chat does it; "
+        "recall/all: across all invoices"
+    )
+
+
+if __name__ == "__main__":
+    main()
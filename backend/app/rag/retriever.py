@@ -1,10 +1,50 @@
-from typing import List
+from itertools import chain
+from typing import Callable, Iterable, Iterator, List, Optional
 from uuid import uuid4
 
 from langchain_core.documents import Document
 from langchain_text_splitters import RecursiveCharacterTextSplitter
 
-from app.rag.vector_store import create_vector_store
+from app.config import settings
+from app.rag.answer_cache import invalidate_answers
+from app.rag.embedding_cache import EmbeddingUsage
+from app.rag.lexical_index import (
+    LexicalIndex,
+    LexicalIndexBuilder,
+    delete_lexical_index,
+    save_lexical_index
+)
+from app.rag.vector_store import build_vector_store, create_vector_store, delete_vector_store
+
+
+CHUNK_SIZE = 800
+CHUNK_OVERLAP = 150
+
+# Bump when chunk boundaries or metadata change, so backfill re-chunks
+CHUNKING_SCHEME = "recursive-paged"
+
+
+def chunk_config_signature() -> str:
+    """
+    Identifies how stored chunks were produced. Invoices indexed
+    under a different signature are stale.
+    """
+    return f"{CHUNKING_SCHEME}:{CHUNK_SIZE}:{CHUNK_OVERLAP}"
+
+
+def fits_full_context(total_chars: int) -> bool:
+    """
+    Small enough for chat to send the whole text instead of
+    retrieving chunks.
+    """
+    return total_chars <= settings.FULL_CONTEXT_MAX_CHARS
+
+
+def get_splitter() -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter(
+        chunk_size=CHUNK_SIZE,
+        chunk_overlap=CHUNK_OVERLAP
+    )
 
 
 def chunk_and_store(
@@ -15,10 +55,7 @@ def chunk_and_store(
     Split invoice text into chunks and store embeddings.
     """
 
-    splitter = RecursiveCharacterTextSplitter(
-        chunk_size=800,
-        chunk_overlap=150
-    )
+    splitter = get_splitter()
 
     chunks = splitter.split_text(text)
 
@@ -36,4 +73,136 @@ def chunk_and_store(
             )
         )
 
-    return create_vector_store(documents, invoice_id)
+    vector_store = create_vector_store(documents, invoice_id)
+    save_lexical_index(invoice_id, LexicalIndex.build(documents))
+    invalidate_answers(invoice_id)
+
+    return vector_store
+
+
+def iter_chunk_batches(
+    pages: Iterable[str],
+    invoice_id: str,
+    batch_size: int
+) -> Iterator[List[Document]]:
+    """
+    Chunk pages as they arrive and group the chunks into
+    batches of at most `batch_size` documents.
+    """
+
+    splitter = get_splitter()
+    batch: List[Document] = []
+    chunk_index = 0
+
+    for page_number, page_text in enumerate(pages, start=1):
+        for chunk in splitter.split_text(page_text):
+            batch.append(
+                Document(
+                    page_content=chunk,
+                    metadata={
+                        "invoice_id": invoice_id,
+                        "chunk_id": str(uuid4()),
+                        "chunk_index": chunk_index,
+                        "page_number": page_number
+                    }
+                )
+            )
+            chunk_index += 1
+
+            if len(batch) >= batch_size:
+                yield batch
+                batch = []
+
+    if batch:
+        yield batch
+
+
+def chunk_and_store_stream(
+    pages: Iterable[str],
+    invoice_id: str,
+    batch_size: int = None,
+    on_batch: Optional[Callable[[int], None]] = None,
+    usage: Optional[EmbeddingUsage] = None,
+    skip_small: bool = True
+) -> int:
+    """
+    Streaming variant of chunk_and_store.
+
+    Pages are chunked one at a time and embedded in bounded
+    batches, so memory doesn't grow with document length.
+    Chunks never span a page boundary.
+    `on_batch` is called with the running chunk count after each
+    batch is embedded; `usage` collects embedding cache hits.
+    The invoice's BM25 index is built from the same batches, and its
+    cached chat answers are dropped.
+
+    With `skip_small` (and SKIP_SMALL_DOCUMENT_INDEX), documents that
+    fit the chat full-context budget aren't indexed at all: pages are
+    held back only until the budget is exceeded, and any stores left
+    from an earlier, larger version are deleted.
+    Returns the number of chunks stored (0 when skipped).
+    """
+
+    if batch_size is None:
+        batch_size = settings.EMBED_BATCH_SIZE
+
+    if skip_small and settings.SKIP_SMALL_DOCUMENT_INDEX:
+        pages = iter(pages)
+        held: List[str] = []
+        total_chars = 0
+
+        for page in pages:
+            held.append(page)
+            total_chars += len(page or "")
+            if not fits_full_context(total_chars):
+                break
+        else:
+            # A re-ingested invoice may still have stores from when it
+            # was larger: chat would otherwise retrieve from them
+            delete_invoice_index(invoice_id)
+            return 0
+
+        pages = chain(held, pages)
+
+    lexical = LexicalIndexBuilder()
+    batches = lexical.collect(iter_chunk_batches(pages, invoice_id, batch_size))
+
+    if on_batch:
+        batches = report_batches(batches, on_batch)
+
+    count = build_vector_store(batches, invoice_id, usage)
+
+    if count:
+        save_lexical_index(invoice_id, lexical.build())
+    else:
+        # Nothing indexed: no BM25 over the previous version either
+        delete_lexical_index(invoice_id)
+
+    # Re-ingested text: earlier answers may no longer hold
+    invalidate_answers(invoice_id)
+
+    return count
+
+
+def delete_invoice_index(invoice_id: str) -> None:
+    """
+    Drop an invoice's vector store, lexical index and cached answers.
+    """
+
+    delete_vector_store(invoice_id)
+    delete_lexical_index(invoice_id)
+    invalidate_answers(invoice_id)
+
+
+def report_batches(
+    batches: Iterable[List[Document]],
+    on_batch: Callable[[int], None]
+) -> Iterator[List[Document]]:
+    done = 0
+
+    for batch in batches:
+        yield batch
+
+        # Resumed only once the consumer has embedded the batch
+        done += len(batch)
+        on_batch(done)
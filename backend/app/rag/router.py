@@ -1,24 +1,48 @@
 import re
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
 from typing import Optional
 
 from app.database import InvoiceField
 
 
+# Checked in order: more specific fields come before the generic
+# ones they overlap with (due date / date, tax / total)
 STRUCTURED_FIELD_MAP = {
     "invoice_number": [
         r"invoice\s*number",
         r"invoice\s*no"
     ],
+    "po_number": [
+        r"purchase\s*order",
+        r"\bp\.?o\b"
+    ],
+    "due_date": [
+        r"due\s*date",
+        r"\bdue\b"
+    ],
     "invoice_date": [
         r"invoice\s*date",
         r"date"
     ],
+    "gst_number": [
+        r"gstin",
+        r"gst\s*(number|no)"
+    ],
+    "tax_amount": [
+        r"\btax\b",
+        r"\bgst\b",
+        r"\bvat\b"
+    ],
     "total_amount": [
         r"total\s*amount",
         r"grand\s*total",
         r"total"
     ],
+    "currency": [
+        r"currency"
+    ],
     "vendor": [
         r"vendor",
         r"supplier",
@@ -63,3 +87,22 @@ def answer_from_structured_db(
         return record.value
 
     return None
+
+
+async def aanswer_from_structured_db(
+    db: AsyncSession,
+    invoice_id: str,
+    field: str
+) -> Optional[str]:
+    """
+    answer_from_structured_db, for the async chat path.
+    """
+
+    return await db.scalar(
+        select(InvoiceField.value)
+        .where(
+            InvoiceField.invoice_id == invoice_id,
+            InvoiceField.field == field
+        )
+        .limit(1)
+    )
@@ -0,0 +1,587 @@
+import json
+import os
+import sqlite3
+import threading
+from typing import Dict, List, Optional, Sequence, Set, Tuple
+
+import faiss
+import numpy as np
+from langchain_core.documents import Document
+
+from app.config import settings
+
+
+class SharedIndex:
+    """
+    One vector index for every invoice's chunks.
+
+    - SQLite (chunks.db) is the source of truth: text, metadata,
+      float32 vector and a deleted flag per chunk
+    - An HNSW index (index.faiss) over all live chunks serves
+      cross-invoice search; it's checkpointed every `flush_every`
+      adds. Each process keeps its own copy in memory and catches it
+      up from SQLite (on load: every live chunk missing from the
+      checkpoint, since another process may have written it; then
+      chunks committed since, before each search and checkpoint)
+    - Per-invoice search reads that invoice's vectors through the
+      invoice_id index and scores them exactly, so it doesn't depend
+      on ANN recall inside a tiny subset
+    - Deletes are tombstones until rebuild() compacts the index
+    """
+
+    def __init__(
+        self,
+        path: str,
+        hnsw_m: int,
+        ef_search: int,
+        flush_every: int
+    ):
+        self.path = path
+        self.hnsw_m = hnsw_m
+        self.ef_search = ef_search
+        self.flush_every = flush_every
+
+        self._lock = threading.RLock()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._index: Optional[faiss.Index] = None
+        self._deleted: Set[int] = set()
+        self._unsaved = 0
+        # Highest chunk id this process's index has caught up to
+        self._synced_id = 0
+
+    @property
+    def index_path(self) -> str:
+        return os.path.join(self.path, "index.faiss")
+
+    def _connection(self) -> sqlite3.Connection:
+        if self._conn is None:
+            os.makedirs(self.path, exist_ok=True)
+
+            conn = sqlite3.connect(
+                os.path.join(self.path, "chunks.db"),
+                check_same_thread=False
+            )
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS chunks (
+                    id INTEGER PRIMARY KEY AUTOINCREMENT,
+                    invoice_id TEXT NOT NULL,
+                    text TEXT NOT NULL,
+                    metadata TEXT NOT NULL,
+                    vector BLOB NOT NULL,
+                    deleted INTEGER NOT NULL DEFAULT 0
+                )
+                """
+            )
+            conn.execute(
+                "CREATE INDEX IF NOT EXISTS ix_chunks_invoice "
+                "ON chunks (invoice_id, deleted)"
+            )
+            conn.execute(
+                """
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL
+                )
+                """
+            )
+            conn.commit()
+            self._conn = conn
+
+        return self._conn
+
+    # =========================
+    # Index lifecycle
+    # =========================
+    def dimension(self) -> Optional[int]:
+        row = self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'dimension'"
+        ).fetchone()
+        return int(row[0]) if row else None
+
+    def embedder(self) -> Optional[str]:
+        """
+        model_key of the embedding model the index was built with
+        (None if unknown: empty, or imported from older stores).
+        """
+
+        row = self._connection().execute(
+            "SELECT value FROM meta WHERE key = 'embedder'"
+        ).fetchone()
+        return row[0] if row else None
+
+    def _new_index(self, dimension: int) -> faiss.Index:
+        hnsw = faiss.IndexHNSWFlat(dimension, self.hnsw_m)
+        hnsw.hnsw.efSearch = self.ef_search
+        return faiss.IndexIDMap2(hnsw)
+
+    def _load_index(self) -> Optional[faiss.Index]:
+        if self._index is not None:
+            return self._index
+
+        dimension = self.dimension()
+        if dimension is None:
+            return None
+
+        conn = self._connection()
+
+        if os.path.exists(self.index_path):
+            index = faiss.read_index(self.index_path)
+            faiss.downcast_index(index.index).hnsw.efSearch = self.ef_search
+        else:
+            index = self._new_index(dimension)
+
+        # The checkpoint may have been written by another process, so
+        # add every live chunk it lacks rather than only newer ids
+        synced_id = self._max_id()
+        indexed = set(faiss.vector_to_array(index.id_map).tolist())
+        live = {
+            row_id
+            for (row_id,) in conn.execute(
+                "SELECT id FROM chunks WHERE deleted = 0 AND id <= ?",
+                (synced_id,)
+            )
+        }
+        missing = sorted(live - indexed)
+        self._add_rows(index, missing, dimension)
+
+        self._deleted = indexed - live
+        self._synced_id = synced_id
+        self._unsaved = len(missing)
+        self._index = index
+
+        return index
+
+    def _max_id(self) -> int:
+        return self._connection().execute(
+            "SELECT COALESCE(MAX(id), 0) FROM chunks"
+        ).fetchone()[0]
+
+    def _add_rows(self, index: faiss.Index, ids: List[int], dimension: int) -> None:
+        conn = self._connection()
+
+        for start in range(0, len(ids), 500):
+            batch = ids[start:start + 500]
+            rows = conn.execute(
+                "SELECT id, vector FROM chunks WHERE id IN (%s)"
+                % ",".join("?" * len(batch)),
+                batch
+            ).fetchall()
+            if rows:
+                index.add_with_ids(
+                    self._matrix([vector for _, vector in rows], dimension),
+                    np.array([row_id for row_id, _ in rows], dtype="int64")
+                )
+
+    def _catch_up(self, index: faiss.Index, exclude: Set[int] = frozenset()) -> None:
+        """
+        Add chunks committed (by any process) since the last catch-up.
+        Chunk ids grow in commit order: SQLite has a single writer.
+        """
+
+        conn = self._connection()
+        synced_id = self._max_id()
+
+        rows = [
+            (row_id, vector)
+            for row_id, vector in conn.execute(
+                "SELECT id, vector FROM chunks "
+                "WHERE id > ? AND id <= ? AND deleted = 0 ORDER BY id",
+                (self._synced_id, synced_id)
+            )
+            if row_id not in exclude
+        ]
+
+        if rows:
+            index.add_with_ids(
+                self._matrix([vector for _, vector in rows], self.dimension()),
+                np.array([row_id for row_id, _ in rows], dtype="int64")
+            )
+            self._unsaved += len(rows)
+
+        self._synced_id = max(self._synced_id, synced_id)
+
+    def load(self) -> None:
+        """
+        Open the ANN index now rather than on first use.
+        """
+        with self._lock:
+            self._load_index()
+
+    def flush(self) -> None:
+        """
+        Checkpoint the ANN index to disk (atomically).
+        """
+
+        with self._lock:
+            if self._index is not None and self._unsaved:
+                self._write_index()
+
+    def _write_index(self) -> None:
+        # Don't checkpoint without other processes' chunks
+        self._catch_up(self._index)
+
+        tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+        faiss.write_index(self._index, tmp_path)
+        os.replace(tmp_path, self.index_path)
+        self._unsaved = 0
+
+    def rebuild(self) -> int:
+        """
+        Drop deleted chunks for good and rebuild the ANN index
+        from the live ones. Returns the number of live chunks.
+        """
+
+        with self._lock:
+            conn = self._connection()
+            conn.execute("DELETE FROM chunks WHERE deleted = 1")
+            conn.commit()
+
+            dimension = self.dimension()
+            if dimension is None:
+                return 0
+
+            index = self._new_index(dimension)
+            count = 0
+            synced_id = self._max_id()
+            cursor = conn.execute(
+                "SELECT id, vector FROM chunks WHERE id <= ? ORDER BY id",
+                (synced_id,)
+            )
+
+            while True:
+                rows = cursor.fetchmany(10000)
+                if not rows:
+                    break
+                index.add_with_ids(
+                    self._matrix([vector for _, vector in rows], dimension),
+                    np.array([row_id for row_id, _ in rows], dtype="int64")
+                )
+                count += len(rows)
+
+            self._index = index
+            self._deleted = set()
+            self._synced_id = synced_id
+            self._write_index()
+
+            return count
+
+    # =========================
+    # Writes
+    # =========================
+    def add(
+        self,
+        invoice_id: str,
+        documents: Sequence[Document],
+        vectors: Sequence[Sequence[float]],
+        embedder: Optional[str] = None
+    ) -> List[int]:
+        """
+        Store chunks with their embeddings. Returns their row ids.
+        `embedder` (model_key of the embedding model) must match the
+        one the index was built with, if it recorded one.
+        """
+
+        matrix = np.asarray(vectors, dtype="float32")
+        if not len(matrix):
+            return []
+
+        with self._lock:
+            conn = self._connection()
+            dimension = self.dimension()
+
+            if dimension is None:
+                dimension = matrix.shape[1]
+                conn.execute(
+                    "INSERT INTO meta (key, value) VALUES ('dimension', ?)",
+                    (str(dimension),)
+                )
+            elif matrix.shape[1] != dimension:
+                raise ValueError(
+                    f"Embedding dimension {matrix.shape[1]} doesn't match "
+                    f"the shared index ({dimension})"
+                )
+
+            if embedder:
+                stored = self.embedder()
+                if stored is None:
+                    conn.execute(
+                        "INSERT INTO meta (key, value) VALUES ('embedder', ?)",
+                        (embedder,)
+                    )
+                elif stored != embedder:
+                    conn.rollback()
+                    raise ValueError(
+                        f"The shared index was built with {stored}, not "
+                        f"{embedder}: rebuild it after switching EMBEDDING_PROVIDER"
+                    )
+
+            # Load (and catch up) before inserting, so the new rows
+            # aren't picked up twice
+            index = self._load_index()
+
+            ids = []
+            for document, vector in zip(documents, matrix):
+                cursor = conn.execute(
+                    "INSERT INTO chunks (invoice_id, text, metadata, vector) "
+                    "VALUES (?, ?, ?, ?)",
+                    (
+                        invoice_id,
+                        document.page_content,
+                        json.dumps(document.metadata),
+                        vector.tobytes()
+                    )
+                )
+                ids.append(cursor.lastrowid)
+            conn.commit()
+
+            # Other processes' chunks committed before these
+            self._catch_up(index, exclude=set(ids))
+
+            index.add_with_ids(
+                matrix,
+                np.array(ids, dtype="int64")
+            )
+            self._unsaved += len(ids)
+
+            if self._unsaved >= self.flush_every:
+                self.flush()
+
+        return ids
+
+    def delete_invoice(
+        self,
+        invoice_id: str,
+        before_id: Optional[int] = None
+    ) -> int:
+        """
+        Tombstone an invoice's chunks (only those with id < before_id,
+        if given, so a re-index can replace the old chunks after the
+        new ones are in). Returns the number of chunks deleted.
+        """
+
+        with self._lock:
+            conn = self._connection()
+
+            query = "SELECT id FROM chunks WHERE invoice_id = ? AND deleted = 0"
+            params: Tuple = (invoice_id,)
+            if before_id is not None:
+                query += " AND id < ?"
+                params += (before_id,)
+
+            ids = [row_id for (row_id,) in conn.execute(query, params)]
+
+            conn.executemany(
+                "UPDATE chunks SET deleted = 1 WHERE id = ?",
+                [(row_id,) for row_id in ids]
+            )
+            conn.commit()
+
+            if self._index is not None:
+                self._deleted.update(ids)
+
+            return len(ids)
+
+    # =========================
+    # Reads
+    # =========================
+    def has_invoice(self, invoice_id: str) -> bool:
+        with self._lock:
+            row = self._connection().execute(
+                "SELECT 1 FROM chunks WHERE invoice_id = ? AND deleted = 0 LIMIT 1",
+                (invoice_id,)
+            ).fetchone()
+        return row is not None
+
+    def search(
+        self,
+        vector: Sequence[float],
+        k: int = 4,
+        invoice_id: Optional[str] = None
+    ) -> List[Tuple[Document, float]]:
+        """
+        Nearest chunks by squared L2 distance (as FAISS reports it),
+        within one invoice or across all of them.
+        """
+
+        query = np.asarray(vector, dtype="float32")
+
+        with self._lock:
+            if invoice_id is not None:
+                return self._search_invoice(query, k, invoice_id)
+            return self._search_all(query, k)
+
+    def _search_invoice(
+        self,
+        query: np.ndarray,
+        k: int,
+        invoice_id: str
+    ) -> List[Tuple[Document, float]]:
+        rows = self._connection().execute(
+            "SELECT text, metadata, vector FROM chunks "
+            "WHERE invoice_id = ? AND deleted = 0",
+            (invoice_id,)
+        ).fetchall()
+
+        if not rows:
+            return []
+
+        matrix = self._matrix([vector for _, _, vector in rows], len(query))
+        distances = ((matrix - query) ** 2).sum(axis=1)
+        best = np.argsort(distances, kind="stable")[:k]
+
+        return [
+            (
+                Document(
+                    page_content=rows[i][0],
+                    metadata=json.loads(rows[i][1])
+                ),
+                float(distances[i])
+            )
+            for i in best
+        ]
+
+    def _search_all(
+        self,
+        query: np.ndarray,
+        k: int
+    ) -> List[Tuple[Document, float]]:
+        index = self._load_index()
+        if index is None:
+            return []
+
+        self._catch_up(index)
+        if index.ntotal == 0:
+            return []
+
+        while True:
+            hits = self._nearest_live(index, query, k)
+            if not hits:
+                return []
+
+            rows = {
+                row_id: (text, metadata)
+                for row_id, text, metadata in self._connection().execute(
+                    "SELECT id, text, metadata FROM chunks "
+                    "WHERE deleted = 0 AND id IN (%s)"
+                    % ",".join("?" * len(hits)),
+                    [row_id for row_id, _ in hits]
+                )
+            }
+
+            # Deleted by another process since: search again without them
+            gone = [row_id for row_id, _ in hits if row_id not in rows]
+            if not gone:
+                break
+            self._deleted.update(gone)
+
+        return [
+            (
+                Document(
+                    page_content=rows[row_id][0],
+                    metadata=json.loads(rows[row_id][1])
+                ),
+                distance
+            )
+            for row_id, distance in hits
+        ]
+
+    def _nearest_live(
+        self,
+        index: faiss.Index,
+        query: np.ndarray,
+        k: int
+    ) -> List[Tuple[int, float]]:
+        # Over-fetch to make up for tombstoned hits
+        fetch = k
+        while True:
+            fetch = min(fetch + len(self._deleted), index.ntotal)
+            distances, ids = index.search(query.reshape(1, -1), fetch)
+
+            hits = [
+                (int(row_id), float(distance))
+                for row_id, distance in zip(ids[0], distances[0])
+                if row_id != -1 and row_id not in self._deleted
+            ]
+            if len(hits) >= k or fetch >= index.ntotal:
+                return hits[:k]
+            fetch *= 2
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            chunks, invoices, deleted = self._connection().execute(
+                "SELECT SUM(deleted = 0), COUNT(DISTINCT CASE WHEN deleted = 0 "
+                "THEN invoice_id END), SUM(deleted) FROM chunks"
+            ).fetchone()
+
+            return {
+                "chunks": chunks or 0,
+                "invoices": invoices or 0,
+                "deleted": deleted or 0,
+                "unsaved": self._unsaved
+            }
+
+    @staticmethod
+    def _matrix(blobs: List[bytes], dimension: int) -> np.ndarray:
+        return np.frombuffer(b"".join(blobs), dtype="float32").reshape(
+            -1, dimension
+        )
+
+
+class InvoiceVectors:
+    """
+    FAISS-like view of one invoice's chunks in the shared index,
+    so callers can keep using similarity_search().
+    """
+
+    def __init__(self, index: SharedIndex, invoice_id: str, embeddings):
+        self.index = index
+        self.invoice_id = invoice_id
+        self.embeddings = embeddings
+
+    def similarity_search_with_score_by_vector(
+        self,
+        embedding: List[float],
+        k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        return self.index.search(embedding, k, invoice_id=self.invoice_id)
+
+    def similarity_search_with_score(
+        self,
+        query: str,
+        k: int = 4
+    ) -> List[Tuple[Document, float]]:
+        return self.similarity_search_with_score_by_vector(
+            self.embeddings.embed_query(query), k
+        )
+
+    def similarity_search(self, query: str, k: int = 4) -> List[Document]:
+        return [doc for doc, _ in self.similarity_search_with_score(query, k)]
+
+
+_shared_index: Optional[SharedIndex] = None
+_shared_index_lock = threading.Lock()
+
+
+def get_shared_index() -> SharedIndex:
+    global _shared_index
+
+    with _shared_index_lock:
+        if _shared_index is None:
+            _shared_index = SharedIndex(
+                path=settings.SHARED_INDEX_PATH,
+                hnsw_m=settings.SHARED_INDEX_HNSW_M,
+                ef_search=settings.SHARED_INDEX_EF_SEARCH,
+                flush_every=settings.SHARED_INDEX_FLUSH_EVERY
+            )
+
+    return _shared_index
+
+
+def flush_shared_index() -> None:
+    """
+    Checkpoint the shared index, if this process opened it.
+    """
+    if _shared_index is not None:
+        _shared_index.flush()
@@ -0,0 +1,144 @@
+import asyncio
+import threading
+import time
+from typing import Awaitable, Callable, Dict, NamedTuple, Tuple, TypeVar
+
+from app.llm_fallback import LLMDeadlineExceeded
+from app.rag.answer_cache import on_invalidate
+
+
+T = TypeVar("T")
+
+# (invoice_id, normalized question)
+FlightKey = Tuple[str, str]
+
+
+class Flight(NamedTuple):
+    task: asyncio.Task
+    # The leader's deadline, which bounds the computation
+    deadline: float
+
+
+class SingleFlight:
+    """
+    Coalesces identical chat questions that are in flight at once.
+
+    - Keyed by (invoice, normalized question)
+    - The first request for a key starts the computation as its own
+      task; requests arriving while it runs await the same task and
+      share its result or exception
+    - A waiter giving up (client gone, its own deadline) doesn't
+      cancel the computation for the others
+    - A waiter with a later deadline than the leader's doesn't fail
+      with it: if the leader runs out of time, the waiter computes
+      again within its own budget
+    - Nothing is kept once the computation finishes: this is not a
+      cache, only concurrent duplicates are merged
+    """
+
+    def __init__(self):
+        self.requests = 0
+        self.leaders = 0
+        self.coalesced = 0
+        self.deadline_fallbacks = 0
+
+        self._flights: Dict[FlightKey, Flight] = {}
+        # Invalidation comes from sync endpoints on other threads
+        self._lock = threading.Lock()
+
+    async def run(
+        self,
+        key: FlightKey,
+        compute: Callable[[], Awaitable[T]],
+        deadline: float
+    ) -> T:
+        """
+        Result of `compute()` for `key`, joining a computation
+        already in flight if there is one. Raises LLMDeadlineExceeded
+        if it isn't done by `deadline` (time.monotonic()).
+        """
+
+        with self._lock:
+            self.requests += 1
+
+        joined_before = False
+
+        while True:
+            with self._lock:
+                flight = self._flights.get(key)
+                leader = flight is None or flight.task.done()
+
+                if leader:
+                    task = asyncio.ensure_future(compute())
+                    flight = Flight(task, deadline)
+                    task.add_done_callback(lambda done: self._land(key, done))
+                    self._flights[key] = flight
+                    self.leaders += 1
+                elif not joined_before:
+                    self.coalesced += 1
+
+            # Neither a timeout nor this caller's cancellation cancels the task
+            done, _ = await asyncio.wait(
+                {flight.task}, timeout=max(0.0, deadline - time.monotonic())
+            )
+            if not done:
+                raise LLMDeadlineExceeded("LLM deadline exceeded waiting on a coalesced answer")
+
+            if (
+                not leader
+                and flight.deadline < deadline
+                and not flight.task.cancelled()
+                and isinstance(flight.task.exception(), LLMDeadlineExceeded)
+                and time.monotonic() < deadline
+            ):
+                # The leader's budget ran out before this caller's
+                with self._lock:
+                    self.deadline_fallbacks += 1
+                joined_before = True
+                continue
+
+            return flight.task.result()
+
+    def _land(self, key: FlightKey, task: asyncio.Task) -> None:
+        with self._lock:
+            # Invalidation may have replaced it with a newer flight
+            flight = self._flights.get(key)
+            if flight is not None and flight.task is task:
+                del self._flights[key]
+
+        # Every waiter may have given up: don't warn about an
+        # exception nobody retrieved
+        if not task.cancelled():
+            task.exception()
+
+    def forget_invoice(self, invoice_id: str) -> None:
+        """
+        Requests arriving from now on start a fresh computation
+        instead of joining one that began before the invoice changed.
+        """
+
+        with self._lock:
+            self._flights = {
+                key: flight
+                for key, flight in self._flights.items()
+                if key[0] != invoice_id
+            }
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "requests": self.requests,
+                "computations": self.leaders,
+                "coalesced_requests": self.coalesced,
+                "coalesced_rate": (
+                    self.coalesced / self.requests if self.requests else 0.0
+                ),
+                "deadline_fallbacks": self.deadline_fallbacks,
+                "in_flight": len(self._flights)
+            }
+
+
+chat_flights = SingleFlight()
+
+# Invalidated invoices' questions stop joining answers already in flight
+on_invalidate(chat_flights.forget_invoice)
@@ -0,0 +1,159 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple
+
+from app.config import settings
+
+
+class CachedStore(NamedTuple):
+    store: Any
+    size: int
+    loaded_at: float
+
+
+def estimate_store_bytes(store: Any) -> int:
+    """
+    Rough in-memory size of a loaded store: vectors plus chunk text
+    (or the store's own memory_bytes(), when it has one).
+    Views onto the shared index and memory-mapped native stores hold
+    no vectors of their own (the OS page cache does).
+    """
+
+    if hasattr(store, "memory_bytes"):
+        return store.memory_bytes()
+
+    size = 0
+
+    index = getattr(store, "index", None)
+    if hasattr(index, "ntotal") and hasattr(index, "d"):
+        size += index.ntotal * index.d * 4
+
+    documents = getattr(getattr(store, "docstore", None), "_dict", {})
+    for document in documents.values():
+        size += len(document.page_content.encode("utf-8"))
+
+    return size
+
+
+class VectorStoreCache:
+    """
+    In-process LRU of loaded vector stores, keyed by invoice ID.
+
+    - Bounded by entry count and by estimated memory
+    - Entries older than `ttl_seconds` are reloaded, which also bounds
+      staleness for stores rebuilt by another process
+    - Re-ingestion in this process invalidates the entry right away
+    """
+
+    def __init__(self, max_entries: int, max_bytes: int, ttl_seconds: float):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+        self._entries: "OrderedDict[str, CachedStore]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+
+    def get(self, invoice_id: str, loader: Callable[[str], Any]) -> Any:
+        """
+        Return the cached store, loading it with `loader` on a miss.
+        """
+
+        if self.max_entries <= 0:
+            return loader(invoice_id)
+
+        with self._lock:
+            entry = self._entries.get(invoice_id)
+
+            if entry and time.monotonic() - entry.loaded_at > self.ttl_seconds:
+                self._remove(invoice_id)
+                self.expirations += 1
+                entry = None
+
+            if entry:
+                self._entries.move_to_end(invoice_id)
+                self.hits += 1
+                return entry.store
+
+            self.misses += 1
+            invalidations = self.invalidations
+
+        # Load outside the lock so one slow load doesn't block other
+        # invoices; concurrent misses on the same invoice may both load
+        store = loader(invoice_id)
+
+        size = estimate_store_bytes(store)
+
+        with self._lock:
+            # Skip caching if an invalidation raced with the load,
+            # or if it wouldn't fit even in an empty cache
+            if self.invalidations == invalidations and size <= self.max_bytes:
+                self._put(invoice_id, store, size)
+
+        return store
+
+    def _put(self, invoice_id: str, store: Any, size: int) -> None:
+        if invoice_id in self._entries:
+            self._remove(invoice_id)
+
+        self._entries[invoice_id] = CachedStore(store, size, time.monotonic())
+        self._bytes += size
+
+        while (
+            len(self._entries) > self.max_entries
+            or self._bytes > self.max_bytes
+        ):
+            oldest = next(iter(self._entries))
+            self._remove(oldest)
+            self.evictions += 1
+
+    def invalidate(self, invoice_id: str) -> None:
+        """
+        Drop an invoice's store after it's been rebuilt. Counted even
+        when nothing is cached, so an in-flight load is discarded too.
+        """
+
+        with self._lock:
+            if invoice_id in self._entries:
+                self._remove(invoice_id)
+            self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def _remove(self, invoice_id: str) -> None:
+        entry = self._entries.pop(invoice_id)
+        self._bytes -= entry.size
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes
+            }
+
+
+store_cache = VectorStoreCache(
+    max_entries=settings.VECTOR_STORE_CACHE_MAX_ENTRIES,
+    max_bytes=settings.VECTOR_STORE_CACHE_MAX_BYTES,
+    ttl_seconds=settings.VECTOR_STORE_CACHE_TTL_SECONDS
+)
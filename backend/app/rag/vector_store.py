@@ -1,27 +1,106 @@
 import os
-from typing import List
+import shutil
+from itertools import chain
+from typing import Iterable, List, Optional, Union
 
+import faiss
 from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
 
 from app.config import settings
-from app.rag.embedder import get_embedding_model
+from app.rag.embedder import check_embedder, get_embedding_model, is_local_model
+from app.rag.embedding_cache import (
+    CachedEmbeddings,
+    EmbeddingUsage,
+    embedding_cache,
+    model_key
+)
+from app.rag.embedding_client import ThrottledEmbeddings, embedding_executor
+from app.rag.native_store import (
+    LOCK_FILE,
+    NativeVectorStore,
+    convert_legacy_store,
+    is_legacy_store,
+    is_native_store,
+    load_legacy_docstore,
+    store_write_lock,
+    write_native_store
+)
+from app.rag.shared_index import InvoiceVectors, get_shared_index
+from app.rag.store_cache import store_cache
+
+
+VectorStore = Union[NativeVectorStore, FAISS, InvoiceVectors]
+
+
+def use_shared_index() -> bool:
+    return settings.VECTOR_STORE_BACKEND == "shared"
+
+
+def use_native_store() -> bool:
+    return settings.VECTOR_STORE_BACKEND == "native"
+
+
+def invoice_store_path(invoice_id: str) -> str:
+    return os.path.join(
+        settings.VECTOR_DB_PATH,
+        invoice_id
+    )
+
+
+def get_query_embeddings():
+    """
+    Embedding client for questions: rate-limited and retried
+    through the shared embedding executor (local models run inline).
+    """
+
+    model = get_embedding_model()
+
+    if is_local_model(model):
+        return model
+
+    return ThrottledEmbeddings(model, embedding_executor)
+
+
+def get_document_embeddings(usage: Optional[EmbeddingUsage] = None):
+    """
+    Embedding client for indexing chunks: served from the
+    embedding cache where possible, misses batched through the
+    shared embedding executor. Local models are used directly.
+    """
+
+    model = get_embedding_model()
+
+    if is_local_model(model):
+        return model
+
+    embeddings = ThrottledEmbeddings(model, embedding_executor)
+
+    if not settings.EMBED_CACHE_ENABLED:
+        return embeddings
+
+    return CachedEmbeddings(embeddings, embedding_cache, usage)
 
 
 def create_vector_store(
     documents: List[Document],
     invoice_id: str
-) -> FAISS:
+) -> VectorStore:
     """
     Create and persist FAISS vector store for an invoice.
     """
 
-    embeddings = get_embedding_model()
+    if use_shared_index():
+        build_shared_vectors([documents], invoice_id)
+        return load_vector_store(invoice_id)
 
-    invoice_path = os.path.join(
-        settings.VECTOR_DB_PATH,
-        invoice_id
-    )
+    if use_native_store():
+        build_native_store([documents], invoice_id)
+        return load_vector_store(invoice_id)
+
+    embeddings = get_document_embeddings()
+
+    invoice_path = invoice_store_path(invoice_id)
 
     os.makedirs(invoice_path, exist_ok=True)
 
@@ -31,29 +110,229 @@ def create_vector_store(
     )
 
     vector_store.save_local(invoice_path)
+    store_cache.invalidate(invoice_id)
 
     return vector_store
 
 
-def load_vector_store(invoice_id: str) -> FAISS:
+def build_vector_store(
+    batches: Iterable[List[Document]],
+    invoice_id: str,
+    usage: Optional[EmbeddingUsage] = None
+) -> int:
     """
-    Load existing FAISS index from disk.
+    Create and persist a FAISS store from batches of documents,
+    embedding one batch at a time.
+    `usage` collects embedding cache hits and provider calls.
+    With no batches at all, the invoice's previous vectors are
+    deleted rather than replaced by an empty store.
+    Returns the number of documents stored.
     """
 
-    embeddings = get_embedding_model()
+    batches = iter(batches)
+    first = next(batches, None)
+    if first is None:
+        delete_vector_store(invoice_id)
+        return 0
+    batches = chain([first], batches)
 
-    invoice_path = os.path.join(
-        settings.VECTOR_DB_PATH,
-        invoice_id
+    if use_shared_index():
+        return build_shared_vectors(batches, invoice_id, usage)
+
+    if use_native_store():
+        return build_native_store(batches, invoice_id, usage)
+
+    embeddings = get_document_embeddings(usage)
+
+    vector_store: Optional[FAISS] = None
+    count = 0
+
+    for batch in batches:
+        if vector_store is None:
+            vector_store = FAISS.from_documents(batch, embeddings)
+        else:
+            vector_store.add_documents(batch)
+        count += len(batch)
+
+    if vector_store is None:
+        return 0
+
+    invoice_path = invoice_store_path(invoice_id)
+
+    os.makedirs(invoice_path, exist_ok=True)
+    vector_store.save_local(invoice_path)
+    store_cache.invalidate(invoice_id)
+
+    return count
+
+
+def build_native_store(
+    batches: Iterable[List[Document]],
+    invoice_id: str,
+    usage: Optional[EmbeddingUsage] = None
+) -> int:
+    """
+    build_vector_store for the native format: each batch's vectors
+    are appended to disk as soon as they're embedded. A previous
+    store stays readable until the new one is complete.
+    """
+
+    embeddings = get_document_embeddings(usage)
+    invoice_path = invoice_store_path(invoice_id)
+
+    embedded = (
+        (batch, embeddings.embed_documents([doc.page_content for doc in batch]))
+        for batch in batches
+    )
+
+    count = write_native_store(
+        invoice_path, embedded, embedder=model_key(embeddings)
     )
 
-    if not os.path.exists(invoice_path):
+    if not count:
+        return 0
+
+    # A legacy FAISS copy would now be stale
+    with store_write_lock(invoice_path):
+        for name in ("index.faiss", "index.pkl"):
+            path = os.path.join(invoice_path, name)
+            if os.path.exists(path):
+                os.remove(path)
+
+    store_cache.invalidate(invoice_id)
+
+    return count
+
+
+def build_shared_vectors(
+    batches: Iterable[List[Document]],
+    invoice_id: str,
+    usage: Optional[EmbeddingUsage] = None
+) -> int:
+    """
+    build_vector_store for the shared index. The invoice's previous
+    chunks are only dropped once all new ones are stored.
+    """
+
+    embeddings = get_document_embeddings(usage)
+    index = get_shared_index()
+
+    first_id = None
+    count = 0
+
+    for batch in batches:
+        vectors = embeddings.embed_documents(
+            [doc.page_content for doc in batch]
+        )
+        ids = index.add(
+            invoice_id, batch, vectors, embedder=model_key(embeddings)
+        )
+
+        if first_id is None and ids:
+            first_id = ids[0]
+        count += len(batch)
+
+    if first_id is not None:
+        index.delete_invoice(invoice_id, before_id=first_id)
+        store_cache.invalidate(invoice_id)
+
+    return count
+
+
+def delete_vector_store(invoice_id: str) -> None:
+    """
+    Remove an invoice's vectors, whichever backend holds them.
+    """
+
+    invoice_path = invoice_store_path(invoice_id)
+
+    if use_shared_index():
+        get_shared_index().delete_invoice(invoice_id)
+    elif os.path.isdir(invoice_path):
+        # Keep the lock file: a writer waiting on it must not end up
+        # locking a different one than the next writer
+        with store_write_lock(invoice_path):
+            for name in os.listdir(invoice_path):
+                if name == LOCK_FILE:
+                    continue
+                entry = os.path.join(invoice_path, name)
+                if os.path.isdir(entry):
+                    shutil.rmtree(entry, ignore_errors=True)
+                else:
+                    try:
+                        os.remove(entry)
+                    except OSError:
+                        pass
+
+    store_cache.invalidate(invoice_id)
+
+
+def load_vector_store(invoice_id: str) -> VectorStore:
+    """
+    Load existing FAISS index from disk.
+    Raises EmbedderMismatch if it was built with another embedding
+    model than the configured one.
+    """
+
+    embeddings = get_query_embeddings()
+    model = get_embedding_model()
+
+    if use_shared_index():
+        index = get_shared_index()
+        if not index.has_invoice(invoice_id):
+            raise FileNotFoundError(
+                f"No vector store found for invoice {invoice_id}"
+            )
+        check_embedder(
+            "The shared index", index.embedder(), index.dimension(), model
+        )
+        return InvoiceVectors(index, invoice_id, embeddings)
+
+    invoice_path = invoice_store_path(invoice_id)
+
+    if use_native_store():
+        if not is_native_store(invoice_path):
+            if not is_legacy_store(invoice_path):
+                raise FileNotFoundError(
+                    f"No vector store found for invoice {invoice_id}"
+                )
+            # Invoices indexed before the native format: convert once,
+            # one request at a time; the others then find it converted
+            with store_write_lock(invoice_path):
+                if not is_native_store(invoice_path):
+                    if not is_legacy_store(invoice_path):
+                        raise FileNotFoundError(
+                            f"No vector store found for invoice {invoice_id}"
+                        )
+                    convert_legacy_store(invoice_path)
+
+        store = NativeVectorStore.open(invoice_path, embeddings)
+        check_embedder(
+            f"The vector store of invoice {invoice_id}",
+            store.embedder,
+            store.dim if store.count else None,
+            model
+        )
+        return store
+
+    if not is_legacy_store(invoice_path):
         raise FileNotFoundError(
             f"No vector store found for invoice {invoice_id}"
         )
 
-    return FAISS.load_local(
-        invoice_path,
-        embeddings,
-        allow_dangerous_deserialization=True
+    # Same as FAISS.load_local, minus unrestricted unpickling
+    docstore, index_to_docstore_id = load_legacy_docstore(invoice_path)
+    index = faiss.read_index(os.path.join(invoice_path, "index.faiss"))
+    check_embedder(
+        f"The vector store of invoice {invoice_id}", None, index.d, model
     )
+
+    return FAISS(embeddings, index, docstore, index_to_docstore_id)
+
+
+def get_vector_store(invoice_id: str) -> VectorStore:
+    """
+    load_vector_store through the in-memory LRU, so follow-up
+    questions on the same invoice skip reopening the store.
+    """
+    return store_cache.get(invoice_id, load_vector_store)
@@ -0,0 +1,134 @@
+"""
+Bursts of identical chat questions, with and without single-flight
+coalescing (CHAT_COALESCE_ENABLED).
+
+An automated audit asks --questions distinct questions, each sent
+--copies times at once (spelled with varying case and trailing
+punctuation, as different callers would). Answer cache off, so
+every uncoalesced request pays retrieval and an LLM call. Setup
+and fake providers as in benchmarks.chat_load.
+
+Reports LLM calls, wall time, latency and the QueryLog rows
+written (one per request either way).
+
+Run from backend/:
+
+    python -m benchmarks.chat_coalescing
+"""
+
+import argparse
+import asyncio
+import random
+import shutil
+import tempfile
+import time
+from typing import List
+
+import httpx
+from sqlalchemy import func, select
+
+import app.llm_fallback as llm_fallback
+from app.api.chat import router as chat_router
+from app.config import settings
+from app.database import QueryLog, SessionLocal
+from app.rag.single_flight import chat_flights
+from benchmarks.chat_load import make_app, percentile, prepare
+
+
+def spellings(question: str, copies: int, rng: random.Random) -> List[str]:
+    variants = [question, question.lower(), question.upper(), question + "?", f"  {question} "]
+    return [rng.choice(variants) for _ in range(copies)]
+
+
+def llm_calls() -> int:
+    return sum(p["calls"] for p in llm_fallback._pool.stats()["providers"].values())
+
+
+def logged() -> int:
+    db = SessionLocal()
+    try:
+        return db.execute(select(func.count()).select_from(QueryLog)).scalar_one()
+    finally:
+        db.close()
+
+
+async def run(label: str, coalesce: bool, burst) -> None:
+    settings.CHAT_COALESCE_ENABLED = coalesce
+    app = make_app(chat_router)
+    latencies: List[float] = []
+    errors = 0
+
+    calls_before, logged_before = llm_calls(), logged()
+    coalesced_before = chat_flights.coalesced
+
+    async with httpx.AsyncClient(
+        transport=httpx.ASGITransport(app=app), base_url="http://bench", timeout=None
+    ) as client:
+
+        async def ask(invoice_id: str, question: str) -> None:
+            nonlocal errors
+            start = time.perf_counter()
+            response = await client.post(
+                "/chat/", json={"invoice_id": invoice_id, "question": question}
+            )
+            if response.status_code != 200:
+                errors += 1
+                return
+            latencies.append(time.perf_counter() - start)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(ask(invoice_id, question) for invoice_id, question in burst))
+        elapsed = time.perf_counter() - started
+
+    print(
+        f"{label:<12} {len(burst):>8} {llm_calls() - calls_before:>9} "
+        f"{chat_flights.coalesced - coalesced_before:>9} {elapsed * 1000:>8.0f} "
+        f"{percentile(latencies, 0.5) * 1000:>8.0f} {percentile(latencies, 0.99) * 1000:>8.0f} "
+        f"{errors:>7} {logged() - logged_before:>7}"
+    )
+
+
+async def run_all(burst) -> None:
+    await run("off", False, burst)
+    await run("coalesced", True, burst)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--questions", type=int, default=10)
+    parser.add_argument("--copies", type=int, default=20)
+    parser.add_argument("--invoices", type=int, default=5)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--embed-latency-ms", type=float, default=150)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chat-coalescing-")
+
+    try:
+        questions = prepare(workdir, args)
+        rng = random.Random(args.seed)
+
+        burst = [
+            (invoice_id, spelling)
+            for invoice_id, question in rng.sample(questions, args.questions)
+            for spelling in spellings(question, args.copies, rng)
+        ]
+        rng.shuffle(burst)
+
+        print(
+            f"{args.questions} questions x {args.copies} copies at once, simulated "
+            f"embedding {args.embed_latency_ms:g} ms and LLM {args.llm_latency_ms:g} ms"
+        )
+        print(
+            f"{'coalescing':<12} {'requests':>8} {'LLM calls':>9} {'coalesced':>9} "
+            f"{'wall ms':>8} {'p50 ms':>8} {'p99 ms':>8} {'errors':>7} {'logged':>7}"
+        )
+
+        asyncio.run(run_all(burst))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,288 @@
+"""
+Load test of POST /chat/: the async chat path vs the previous
+synchronous one, at 50-200 concurrent chat sessions.
+
+Both run in-process behind httpx's ASGI transport. The sync
+baseline is the pre-async handler rebuilt from the sync library
+calls: it runs on FastAPI's threadpool with a blocking session,
+blocking embedding call and blocking LLM call. The async handler
+is app.api.chat.
+
+Invoices are synthetic (benchmarks.hybrid_retrieval) and ingested
+into a temporary directory and database. Every question goes
+through vector retrieval (FULL_CONTEXT_MAX_CHARS=0,
+RETRIEVAL_MODE=vector) and the LLM (answer cache off). Providers
+are local fakes with simulated latency: --embed-latency-ms per
+query embedding, --llm-latency-ms per answer. Each session asks
+questions back to back for --duration seconds. Meanwhile a probe
+polls GET /invoice/list, to show whether slow chats stall
+unrelated endpoints.
+
+Run from backend/:
+
+    python -m benchmarks.chat_load --sessions 50,100,200
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import shutil
+import tempfile
+import time
+from typing import List, Tuple
+
+import httpx
+from fastapi import APIRouter, Depends, FastAPI
+from langchain_core.embeddings import Embeddings
+from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine
+from sqlalchemy.orm import Session
+
+import app.llm_fallback as llm_fallback
+import app.rag.vector_store as vector_store
+from app.api.chat import ChatRequest
+from app.api.chat import router as chat_router
+from app.api.invoice import router as invoice_router
+from app.config import settings
+from app.database import (
+    AsyncSessionLocal,
+    Base,
+    Invoice,
+    QueryLog,
+    SessionLocal,
+    get_db
+)
+from app.rag.hybrid_retriever import retrieve
+from app.rag.local_embeddings import HashingEmbeddings
+from app.rag.qa_chain import cached_answer_question
+from app.rag.retriever import chunk_and_store_stream
+from benchmarks.hybrid_retrieval import make_invoice
+
+
+class Reply:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class FakeLLM:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    def invoke(self, prompt: str) -> Reply:
+        time.sleep(self.latency * random.uniform(0.8, 1.2))
+        return Reply("The answer.")
+
+    async def ainvoke(self, prompt: str) -> Reply:
+        await asyncio.sleep(self.latency * random.uniform(0.8, 1.2))
+        return Reply("The answer.")
+
+
+class FakeProviderEmbeddings(Embeddings):
+    """
+    Local vectors behind a simulated provider round trip on queries.
+    """
+
+    def __init__(self, latency: float):
+        self.embeddings = HashingEmbeddings()
+        self.model = self.embeddings.model
+        self.latency = latency
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        time.sleep(self.latency)
+        return self.embeddings.embed_query(text)
+
+    async def aembed_query(self, text):
+        await asyncio.sleep(self.latency)
+        return self.embeddings.embed_query(text)
+
+
+def sync_chat_router() -> APIRouter:
+    """
+    POST /chat/ as it was before the async path (RAG branch).
+    """
+
+    router = APIRouter()
+
+    @router.post("/")
+    def chat_with_invoice(payload: ChatRequest, db: Session = Depends(get_db)):
+        deadline = time.monotonic() + settings.LLM_DEADLINE_SECONDS
+
+        invoice = db.get(Invoice, payload.invoice_id)
+        if not invoice:
+            return {"answer": "Invoice not found", "source": "error"}
+
+        retrieval = retrieve(invoice.id, payload.question, k=4)
+        answer = cached_answer_question(
+            invoice.id, retrieval.documents, payload.question, deadline
+        )
+
+        db.add(QueryLog(invoice_id=invoice.id, question=payload.question, answer=answer))
+        db.commit()
+
+        return {"answer": answer, "source": "rag"}
+
+    return router
+
+
+def make_app(chat: APIRouter) -> FastAPI:
+    app = FastAPI()
+    app.include_router(invoice_router, prefix="/invoice")
+    app.include_router(chat, prefix="/chat")
+    return app
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return float("nan")
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+
+async def run(label: str, app: FastAPI, sessions: int, questions, duration: float) -> None:
+    transport = httpx.ASGITransport(app=app)
+    latencies: List[float] = []
+    probe_latencies: List[float] = []
+    errors = 0
+
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        end = time.perf_counter() + duration
+
+        async def session(seed: int) -> None:
+            nonlocal errors
+            rng = random.Random(seed)
+            while time.perf_counter() < end:
+                invoice_id, question = rng.choice(questions)
+                start = time.perf_counter()
+                response = await client.post(
+                    "/chat/", json={"invoice_id": invoice_id, "question": question}
+                )
+                if response.status_code != 200:
+                    errors += 1
+                    continue
+                latencies.append(time.perf_counter() - start)
+
+        async def probe() -> None:
+            while time.perf_counter() < end:
+                start = time.perf_counter()
+                await client.get("/invoice/list")
+                probe_latencies.append(time.perf_counter() - start)
+                await asyncio.sleep(0.1)
+
+        started = time.perf_counter()
+        await asyncio.gather(probe(), *(session(n) for n in range(sessions)))
+        elapsed = time.perf_counter() - started
+
+    print(
+        f"{label:<8} {sessions:>8} {len(latencies) / elapsed:>8.1f} "
+        f"{percentile(latencies, 0.5) * 1000:>8.0f} {percentile(latencies, 0.99) * 1000:>8.0f} "
+        f"{errors:>7} {percentile(probe_latencies, 0.99) * 1000:>12.0f}"
+    )
+
+
+def prepare(workdir: str, args) -> List[Tuple[str, str]]:
+    """
+    Scratch database and stores under `workdir`, fake providers,
+    `args.invoices` synthetic invoices ingested.
+    Returns their (invoice_id, question) pairs.
+    """
+
+    # Both session factories onto a scratch database
+    database = os.path.join(workdir, "invoice_auditor.db")
+    engine = create_engine(f"sqlite:///{database}", connect_args={"check_same_thread": False})
+    SessionLocal.configure(bind=engine)
+    AsyncSessionLocal.configure(bind=create_async_engine(f"sqlite+aiosqlite:///{database}"))
+
+    settings.VECTOR_STORE_BACKEND = "native"
+    settings.VECTOR_DB_PATH = f"{workdir}/vector_db"
+    settings.LEXICAL_INDEX_PATH = f"{workdir}/lexical_index"
+    settings.EMBED_CACHE_ENABLED = False
+    settings.ANSWER_CACHE_ENABLED = False
+    settings.FULL_CONTEXT_MAX_CHARS = 0
+    settings.RETRIEVAL_MODE = "vector"
+
+    provider = FakeProviderEmbeddings(args.embed_latency_ms / 1000)
+    vector_store.get_embedding_model = lambda: provider
+
+    llm_fallback._pool = llm_fallback.ProviderPool(
+        [
+            llm_fallback.Provider(
+                "fake",
+                lambda: FakeLLM(args.llm_latency_ms / 1000),
+                llm_fallback.CircuitBreaker(3, 30)
+            )
+        ],
+        hedge_after_seconds=0,
+        deadline_seconds=settings.LLM_DEADLINE_SECONDS,
+        max_in_flight=settings.LLM_MAX_IN_FLIGHT
+    )
+
+    Base.metadata.create_all(bind=engine)
+    rng = random.Random(args.seed)
+    questions = []
+
+    db = SessionLocal()
+    try:
+        for n in range(args.invoices):
+            invoice_id = f"load-{n}"
+            pages, invoice_questions = make_invoice(rng, n)
+            chunk_and_store_stream(pages, invoice_id, skip_small=False)
+            db.add(Invoice(
+                id=invoice_id,
+                filename=f"{invoice_id}.pdf",
+                raw_text="\n\n".join(pages),
+                status="PROCESSED"
+            ))
+            questions.extend((invoice_id, q) for q, _ in invoice_questions)
+        db.commit()
+    finally:
+        db.close()
+
+    return questions
+
+
+async def run_all(args, questions) -> None:
+    # One event loop throughout: the async engine's pool is bound to it
+    apps = [("sync", make_app(sync_chat_router())), ("async", make_app(chat_router))]
+
+    for sessions in (int(s) for s in args.sessions.split(",")):
+        for label, app in apps:
+            await run(label, app, sessions, questions, args.duration)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sessions", default="50,100,200")
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--invoices", type=int, default=20)
+    parser.add_argument("--llm-latency-ms", type=float, default=800)
+    parser.add_argument("--embed-latency-ms", type=float, default=150)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="chat-load-")
+
+    try:
+        questions = prepare(workdir, args)
+        # Measure the async path itself, not duplicate merging
+        settings.CHAT_COALESCE_ENABLED = False
+
+        print(
+            f"{args.invoices} invoices, {args.duration:g} s per run, simulated "
+            f"embedding {args.embed_latency_ms:g} ms and LLM {args.llm_latency_ms:g} ms"
+        )
+        print(
+            f"{'path':<8} {'sessions':>8} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} "
+            f"{'errors':>7} {'list p99 ms':>12}"
+        )
+
+        asyncio.run(run_all(args, questions))
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,219 @@
+"""
+Embedding throughput under a provider rate limit, against a local
+fake embedding server.
+
+The server sleeps per request (base latency + per-text cost) and
+answers 429 with Retry-After once a client exceeds its requests/second
+or concurrency limits, like hosted embedding APIs do. Several uploads
+embed at once, either calling the provider directly (one request per
+chunk batch, no retry) or through the shared EmbeddingExecutor.
+
+Run from backend/:
+
+    python -m benchmarks.embedding_client --uploads 8 --chunks 300
+"""
+
+import argparse
+import json
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from app.rag.embedding_client import EmbeddingExecutor, ThrottledEmbeddings
+
+
+DIM = 64
+
+
+class FakeProvider(ThreadingHTTPServer):
+    daemon_threads = True
+
+    def __init__(self, rps: float, max_concurrent: int, latency: float, per_text: float):
+        super().__init__(("127.0.0.1", 0), FakeProviderHandler)
+        self.rps = rps
+        self.burst = max(1.0, rps / 4)
+        self.tokens = self.burst
+        self.updated = time.monotonic()
+        self.max_concurrent = max_concurrent
+        self.latency = latency
+        self.per_text = per_text
+
+        self.lock = threading.Lock()
+        self.active = 0
+        self.served = 0
+        self.throttled = 0
+
+    def try_admit(self) -> bool:
+        with self.lock:
+            if self.active >= self.max_concurrent or not self._take_token():
+                self.throttled += 1
+                return False
+            self.active += 1
+            return True
+
+    def _take_token(self) -> bool:
+        now = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rps)
+        self.updated = now
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+
+    def release(self) -> None:
+        with self.lock:
+            self.active -= 1
+            self.served += 1
+
+
+class FakeProviderHandler(BaseHTTPRequestHandler):
+    server: FakeProvider
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+
+        if not self.server.try_admit():
+            self.send_response(429)
+            self.send_header("Retry-After", "0.1")
+            self.end_headers()
+            return
+
+        try:
+            texts = body["texts"]
+            time.sleep(self.server.latency + self.server.per_text * len(texts))
+            payload = json.dumps(
+                {"embeddings": [[float(len(t) % 7)] * DIM for t in texts]}
+            ).encode()
+        finally:
+            self.server.release()
+
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+
+class ProviderError(Exception):
+    """
+    Shaped like SDK errors: status_code plus the raw response.
+    """
+
+    def __init__(self, error: urllib.error.HTTPError):
+        super().__init__(f"HTTP {error.code}")
+        self.status_code = error.code
+        self.response = error
+
+
+class HTTPEmbeddings(Embeddings):
+    def __init__(self, url: str):
+        self.url = url
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        request = urllib.request.Request(
+            self.url,
+            data=json.dumps({"texts": texts}).encode(),
+            headers={"Content-Type": "application/json"}
+        )
+        try:
+            with urllib.request.urlopen(request) as response:
+                return json.loads(response.read())["embeddings"]
+        except urllib.error.HTTPError as e:
+            raise ProviderError(e)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+
+def run(label: str, embeddings, args, executor: EmbeddingExecutor = None) -> None:
+    server = FakeProvider(args.server_rps, args.server_concurrency, args.latency, args.per_text)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    embeddings = embeddings(f"http://127.0.0.1:{server.server_port}/embed")
+
+    def upload(n: int) -> int:
+        texts = [f"upload {n} chunk {i} " * 20 for i in range(args.chunks)]
+        done = 0
+        for start in range(0, len(texts), args.batch_size):
+            done += len(embeddings.embed_documents(texts[start:start + args.batch_size]))
+        return done
+
+    start = time.perf_counter()
+    embedded = failed = 0
+    with ThreadPoolExecutor(args.uploads) as pool:
+        for future in [pool.submit(upload, n) for n in range(args.uploads)]:
+            try:
+                embedded += future.result()
+            except Exception:
+                failed += 1
+    elapsed = time.perf_counter() - start
+
+    server.shutdown()
+    server.server_close()
+
+    retries = executor.stats()["retries"] if executor else 0
+    print(
+        f"{label:<38} {elapsed:>7.2f} {embedded / elapsed:>9.0f} "
+        f"{failed:>4}/{args.uploads:<3} {server.served:>7} {server.throttled:>6} {retries:>8}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=8, help="concurrent uploads")
+    parser.add_argument("--chunks", type=int, default=300, help="chunks per upload")
+    parser.add_argument("--batch-size", type=int, default=64, help="EMBED_BATCH_SIZE")
+    parser.add_argument("--server-rps", type=float, default=20)
+    parser.add_argument("--server-concurrency", type=int, default=4)
+    parser.add_argument("--latency", type=float, default=0.04)
+    parser.add_argument("--per-text", type=float, default=0.001)
+    args = parser.parse_args()
+
+    print(
+        f"fake provider: {args.server_rps:g} req/s, {args.server_concurrency} concurrent, "
+        f"{args.latency * 1000:g} ms + {args.per_text * 1000:g} ms/text"
+    )
+    print(
+        f"{'client':<38} {'wall s':>7} {'chunks/s':>9} {'failed':>8} "
+        f"{'served':>7} {'429s':>6} {'retries':>8}"
+    )
+
+    run("direct (no limit, no retry)", HTTPEmbeddings, args)
+
+    # (label, in flight, requests/second, texts per request)
+    configs = [
+        ("retry only, no shared limits", args.uploads, 0, 96),
+        ("shared: 1 in flight, rate-limited", 1, args.server_rps, 96),
+        ("shared: 4 in flight, rate-limited", 4, args.server_rps, 96),
+        ("shared: 4 in flight, 32 texts/req", 4, args.server_rps, 32),
+    ]
+
+    for label, in_flight, rps, max_texts in configs:
+        executor = EmbeddingExecutor(
+            max_in_flight=in_flight,
+            requests_per_second=rps,
+            burst=args.server_concurrency,
+            max_retries=8,
+            retry_base_seconds=0.05,
+            retry_max_seconds=2.0,
+            request_max_texts=max_texts,
+            request_max_chars=10 ** 6
+        )
+
+        def client(url, executor=executor):
+            return ThrottledEmbeddings(HTTPEmbeddings(url), executor)
+
+        run(label, client, args, executor)
+        executor.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+"""
+Structured-field extraction throughput over a synthetic invoice corpus.
+
+Compares the previous approach (uncompiled re.search per pattern, one
+full-text scan each) with the keyword-anchored registry engine, and
+shows how both scale as extra field rules are registered.
+
+Run from backend/:
+
+    python -m benchmarks.extraction_throughput --docs 2000
+"""
+
+import argparse
+import random
+import re
+import time
+
+from app.ingestion import structured_extractor as extractor
+
+
+VENDORS = ["Acme Corporation", "Globex Ltd", "Initech Pvt Ltd", "Umbrella GmbH"]
+FILLER = (
+    "Description Quantity Unit Price Amount Consulting services rendered "
+    "as per agreement, delivery to site, support and maintenance. "
+)
+
+
+def make_invoice(rng: random.Random) -> str:
+    lines = [FILLER * rng.randint(2, 20) for _ in range(rng.randint(5, 30))]
+    body = " ".join(lines)
+
+    return (
+        f"{rng.choice(VENDORS)} INVOICE Invoice No: INV-{rng.randint(1000, 9999)} "
+        f"Date: {rng.randint(10, 28)}/0{rng.randint(1, 9)}/2024 "
+        f"PO Number: 4500{rng.randint(100, 999)} GSTIN: 27ABCDE1234F1Z5 "
+        f"{body} Subtotal: $1,{rng.randint(100, 999)}.00 "
+        f"Tax (18%): $2{rng.randint(10, 99)}.00 "
+        f"Total Amount: $1,{rng.randint(100, 999)}.50 Currency: USD"
+    )
+
+
+def legacy_extract(text: str) -> dict:
+    """
+    The original extractor: every pattern is a separate full-text search.
+    """
+
+    fields = {}
+    groups = {
+        "invoice_number": [
+            r"invoice\s*no[:\s]*([A-Z0-9\-\/]+)",
+            r"invoice\s*number[:\s]*([A-Z0-9\-\/]+)",
+        ],
+        "invoice_date": [
+            r"date[:\s]*([0-9]{2}[\/\-][0-9]{2}[\/\-][0-9]{4})",
+            r"date[:\s]*([0-9]{4}[\/\-][0-9]{2}[\/\-][0-9]{2})",
+        ],
+        "total_amount": [
+            r"total\s*amount[:\s₹$]*([0-9,]+\.\d{2})",
+            r"grand\s*total[:\s₹$]*([0-9,]+\.\d{2})",
+            r"total[:\s₹$]*([0-9,]+\.\d{2})",
+        ],
+    }
+
+    for field, patterns in groups.items():
+        for pattern in patterns:
+            match = re.search(pattern, text, re.IGNORECASE)
+            if match:
+                fields[field] = match.group(1)
+                break
+
+    return fields
+
+
+def per_rule_search(text: str) -> dict:
+    """
+    The registry's own rules, run the old way: one search per rule.
+    """
+
+    fields = {}
+    for rule in extractor.FIELD_RULES:
+        if rule.field not in fields:
+            match = rule.pattern.search(text)
+            if match:
+                fields[rule.field] = match.group(1)
+
+    return fields
+
+
+def bench(fn, corpus) -> float:
+    start = time.perf_counter()
+    for text in corpus:
+        fn(text)
+    return len(corpus) / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--docs", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    corpus = [make_invoice(rng) for _ in range(args.docs)]
+    avg_kb = sum(map(len, corpus)) / len(corpus) / 1024
+
+    print(f"{args.docs} docs, {avg_kb:.1f} KiB avg")
+    print(f"{'extractor':<28} {'rules':>6} {'fields':>7} {'docs/sec':>10}")
+
+    fields = len(legacy_extract(corpus[0]))
+    print(f"{'legacy re.search':<28} {7:>6} {fields:>7} {bench(legacy_extract, corpus):>10.0f}")
+
+    for extra in (0, 20, 80):
+        # Extra rules keyed on keywords that do occur in the text
+        for i in range(extra - sum(r.field.startswith("bench_") for r in extractor.FIELD_RULES)):
+            extractor.register_field(
+                f"bench_{i}",
+                [("amount", rf"amount\s*ref{i}[:\s]*([0-9]+)")]
+            )
+
+        rules = len(extractor.FIELD_RULES)
+
+        fields = len(per_rule_search(corpus[0]))
+        rate = bench(per_rule_search, corpus)
+        print(f"{'registry, search per rule':<28} {rules:>6} {fields:>7} {rate:>10.0f}")
+
+        fields = len(extractor.extract_structured_fields(corpus[0]))
+        rate = bench(extractor.extract_structured_fields, corpus)
+        print(f"{'registry, keyword-anchored':<28} {rules:>6} {fields:>7} {rate:>10.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,215 @@
+"""
+Recall and latency of vector, BM25 and hybrid retrieval on a
+synthetic invoice set.
+
+Each invoice is generated from a template: a header with IDs (PO,
+GSTIN, PAN), line items with HSN codes, bank details (IFSC, account
+number), totals and pages of terms boilerplate. Each invoice is
+ingested through the normal chunk_and_store_stream path (native store
+plus lexical index). Questions then mix exact lookups ("HSN code 8471",
+"IFSC") with wording-based ones ("late payment fee").
+
+A question is recalled if any of the top-k chunks contains the
+answer string.
+
+Vectors come from the local hashing model, with a simulated provider
+round trip (--embed-latency-ms) on each question embedding, so the
+latency column shows what skipping that call saves. A semantic
+provider model would rank differently. The lexical/hybrid gap on
+exact-ID questions is what this measures.
+
+Run from backend/:
+
+    python -m benchmarks.hybrid_retrieval --invoices 100
+"""
+
+import argparse
+import random
+import shutil
+import statistics
+import string
+import tempfile
+import time
+from typing import List, Tuple
+
+from langchain_core.embeddings import Embeddings
+
+import app.rag.vector_store as vector_store
+from app.config import settings
+from app.rag.hybrid_retriever import retrieve
+from app.rag.lexical_index import lexical_cache
+from app.rag.local_embeddings import HashingEmbeddings
+from app.rag.retriever import chunk_and_store_stream
+from app.rag.store_cache import store_cache
+
+
+VENDORS = ["Acme Corporation", "Globex Supplies", "Initech Systems", "Umbrella Traders", "Stark Components"]
+BANKS = ["State Bank of India", "HDFC Bank", "ICICI Bank", "Axis Bank"]
+CITIES = ["Mumbai", "Bengaluru", "Chennai", "Pune", "Delhi", "Hyderabad"]
+ITEMS = ["Laptop", "Monitor", "Keyboard", "Router", "Server rack", "UPS battery", "Cable set", "Printer"]
+
+BOILERPLATE = [
+    "The supplier warrants that all goods delivered under this invoice are free from defects in "
+    "material and workmanship for a period of twelve months from the date of delivery.",
+    "Goods once sold will not be taken back or exchanged except as provided in the warranty "
+    "clause. Claims for shortage or damage must be notified in writing within seven days.",
+    "All prices are inclusive of packing and forwarding charges unless otherwise stated. Freight "
+    "and insurance are payable by the buyer where the delivery terms so specify.",
+    "The buyer shall deduct tax at source where applicable and furnish the certificate within the "
+    "statutory period. Input credit is subject to the supplier filing returns on time.",
+    "This invoice is computer generated and does not require a physical signature. Errors and "
+    "omissions excepted. Please quote the invoice number in all correspondence.",
+]
+
+
+def code(rng: random.Random, letters: int, digits: int) -> str:
+    return (
+        "".join(rng.choices(string.ascii_uppercase, k=letters))
+        + "".join(rng.choices(string.digits, k=digits))
+    )
+
+
+def make_invoice(rng: random.Random, n: int) -> Tuple[List[str], List[Tuple[str, str]]]:
+    """
+    (pages, [(question, answer substring)])
+    """
+
+    po = str(rng.randint(4500000, 4599999))
+    gstin = f"{rng.randint(10, 36)}{code(rng, 5, 4)}{rng.choice(string.ascii_uppercase)}1Z{rng.randint(1, 9)}"
+    pan = code(rng, 5, 4) + rng.choice(string.ascii_uppercase)
+    ifsc = code(rng, 4, 0) + "0" + "".join(rng.choices(string.digits, k=6))
+    account = "".join(rng.choices(string.digits, k=14))
+    days = rng.choice([15, 30, 45, 60])
+    late_fee = rng.choice(["1.5", "2", "2.5"])
+    city = rng.choice(CITIES)
+
+    items = []
+    for i in range(rng.randint(8, 14)):
+        hsn = str(rng.randint(8400, 8599))
+        quantity, rate = rng.randint(1, 20), rng.randint(500, 90000)
+        items.append((hsn, f"{i + 1}. {rng.choice(ITEMS)} HSN {hsn} Qty {quantity} Rate {rate:,} Amount {quantity * rate:,}"))
+
+    total = f"{rng.randint(100000, 9999999):,}.00"
+
+    header = (
+        f"TAX INVOICE\nInvoice Number: INV-2024-{n:05d}\nInvoice Date: {rng.randint(1, 28)}/0{rng.randint(1, 9)}/2024\n"
+        f"PO Number: PO {po}\nVendor: {rng.choice(VENDORS)}, {city}\nGSTIN: {gstin}\nPAN: {pan}\n"
+        "Bill To: Example Buyer Pvt Ltd, Plot 12, Industrial Area\n\nLine items:\n"
+        + "\n".join(line for _, line in items)
+    )
+    terms = "\n\n".join(rng.sample(BOILERPLATE, len(BOILERPLATE)))
+    payment = (
+        f"Payment terms: payment is due within {days} days of the invoice date. "
+        f"A late payment fee of {late_fee}% per month applies to overdue amounts. "
+        f"Any dispute is subject to the exclusive jurisdiction of the courts at {city}.\n\n"
+        + "\n\n".join(rng.sample(BOILERPLATE, 3))
+    )
+    bank = (
+        f"Bank details\nBank: {rng.choice(BANKS)}\nAccount No: {account}\nIFSC: {ifsc}\n\n"
+        f"Subtotal and taxes as per line items. CGST 9% SGST 9%.\nGrand Total: INR {total}"
+    )
+
+    hsn, _ = rng.choice(items)
+    questions = [
+        (f"HSN code {hsn}", f"HSN {hsn}"),
+        (f"PO {po}", po),
+        ("IFSC", ifsc),
+        ("What is the bank account number?", account),
+        ("GSTIN of the vendor", gstin),
+        ("What is the PAN?", pan),
+        ("What is the late payment fee?", f"{late_fee}% per month"),
+        ("When is payment due?", f"within {days} days"),
+        ("Which courts have jurisdiction over disputes?", f"courts at {city}"),
+        ("What is the grand total?", total),
+    ]
+
+    return [header, terms, payment, bank], questions
+
+
+class ProviderEmbeddings(Embeddings):
+    """
+    Local vectors behind a simulated provider round trip on queries.
+    """
+
+    def __init__(self, latency: float):
+        self.embeddings = HashingEmbeddings()
+        self.model = self.embeddings.model
+        self.latency = latency
+        self.query_calls = 0
+
+    def embed_documents(self, texts):
+        return self.embeddings.embed_documents(texts)
+
+    def embed_query(self, text):
+        self.query_calls += 1
+        time.sleep(self.latency)
+        return self.embeddings.embed_query(text)
+
+
+def run(label: str, mode: str, shortcut: bool, questions, provider: ProviderEmbeddings, k: int) -> None:
+    settings.RETRIEVAL_MODE = mode
+    settings.LEXICAL_SHORTCUT = shortcut
+    store_cache.clear()
+    lexical_cache.clear()
+    provider.query_calls = 0
+
+    recalled = 0
+    latencies = []
+
+    for invoice_id, question, answer in questions:
+        start = time.perf_counter()
+        documents = retrieve(invoice_id, question, k=k).documents
+        latencies.append((time.perf_counter() - start) * 1000)
+        recalled += any(answer in doc.page_content for doc in documents)
+
+    latencies.sort()
+    print(
+        f"{label:<26} {recalled / len(questions):>9.3f} {statistics.mean(latencies):>9.2f} "
+        f"{latencies[int(len(latencies) * 0.95)]:>9.2f} {provider.query_calls / len(questions):>12.0%}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", type=int, default=100)
+    parser.add_argument("--k", type=int, default=4)
+    parser.add_argument("--embed-latency-ms", type=float, default=150)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="hybrid-bench-")
+    settings.VECTOR_STORE_BACKEND = "native"
+    settings.VECTOR_DB_PATH = f"{workdir}/vector_db"
+    settings.LEXICAL_INDEX_PATH = f"{workdir}/lexical_index"
+    settings.EMBED_CACHE_ENABLED = False
+
+    provider = ProviderEmbeddings(args.embed_latency_ms / 1000)
+    vector_store.get_embedding_model = lambda: provider
+
+    rng = random.Random(args.seed)
+    questions = []
+    chunks = 0
+
+    try:
+        for n in range(args.invoices):
+            invoice_id = f"bench-{n}"
+            pages, invoice_questions = make_invoice(rng, n)
+            chunks += chunk_and_store_stream(pages, invoice_id)
+            questions.extend((invoice_id, q, a) for q, a in invoice_questions)
+
+        print(
+            f"{args.invoices} invoices, {chunks} chunks, {len(questions)} questions, "
+            f"k={args.k}, simulated query embedding {args.embed_latency_ms:g} ms"
+        )
+        print(f"{'retrieval':<26} {'recall@k':>9} {'mean ms':>9} {'p95 ms':>9} {'embed calls':>12}")
+
+        run("vector", "vector", False, questions, provider, args.k)
+        run("lexical (BM25)", "lexical", False, questions, provider, args.k)
+        run("hybrid (RRF)", "hybrid", False, questions, provider, args.k)
+        run("hybrid + lexical shortcut", "hybrid", True, questions, provider, args.k)
+    finally:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,91 @@
+"""
+OCR latency and peak RSS with the image pre-processing stage on and off.
+
+Each mode runs in a fresh process so peak RSS isn't shared. Reports the
+Python worker's peak and the tesseract child's peak separately.
+
+Run from backend/ (needs the tesseract binary on PATH):
+
+    python -m benchmarks.ocr_preprocess --width 4000 --height 3000
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image, ImageDraw
+
+
+def make_photo(path: str, width: int, height: int) -> None:
+    """
+    Phone-photo sized JPEG of an invoice-like page.
+    """
+
+    image = Image.new("RGB", (width, height), color=(245, 242, 235))
+    draw = ImageDraw.Draw(image)
+
+    for line in range(40):
+        draw.text(
+            (width // 10, height // 12 + line * (height // 50)),
+            f"Item {line:02d}  Widget SKU-{line:04d}  Qty 3  Amount 1{line:02d}.00",
+            fill=(20, 20, 20)
+        )
+
+    image.save(path, "JPEG", quality=90, dpi=(72, 72))
+
+
+def run(path: str, preprocess: bool, repeat: int, queue) -> None:
+    os.environ["OCR_PREPROCESS"] = "true" if preprocess else "false"
+    os.environ["OCR_CACHE_ENABLED"] = "false"
+
+    from app.ingestion.ocr import run_ocr_on_image
+    from app.ingestion.preprocess import open_image_for_ocr
+
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        run_ocr_on_image(open_image_for_ocr(path))
+        timings.append(time.perf_counter() - start)
+
+    # ru_maxrss is in KiB on Linux
+    queue.put((
+        min(timings),
+        resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / 1024
+    ))
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--width", type=int, default=4000)
+    parser.add_argument("--height", type=int, default=3000)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    ctx = multiprocessing.get_context("spawn")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "photo.jpg")
+        make_photo(path, args.width, args.height)
+
+        print(f"{'preprocess':>10} {'latency s':>10} {'py MiB':>8} {'tess MiB':>9}")
+        for preprocess in (False, True):
+            queue = ctx.Queue()
+            proc = ctx.Process(
+                target=run, args=(path, preprocess, args.repeat, queue)
+            )
+            proc.start()
+            latency, py_rss, tess_rss = queue.get()
+            proc.join()
+
+            print(
+                f"{'on' if preprocess else 'off':>10} {latency:>10.2f} "
+                f"{py_rss:>8.1f} {tess_rss:>9.1f}"
+            )
+
+
+if __name__ == "__main__":
+    main()
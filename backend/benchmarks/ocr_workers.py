@@ -0,0 +1,68 @@
+"""
+OCR throughput (pages/sec) at 1, 2, 4 and N pool workers.
+
+Run from backend/ (needs the tesseract binary on PATH):
+
+    python -m benchmarks.ocr_workers --pages 40
+"""
+
+import argparse
+import os
+import time
+
+from PIL import Image, ImageDraw
+
+from app.config import settings
+from app.ingestion import ocr
+
+
+def make_page(index: int) -> Image.Image:
+    """
+    Synthetic A4 page at 200 DPI with invoice-like text lines.
+    """
+
+    image = Image.new("L", (1654, 2339), color=255)
+    draw = ImageDraw.Draw(image)
+
+    for line in range(45):
+        draw.text(
+            (120, 120 + line * 48),
+            f"Line {line:02d}  Item SKU-{index:03d}{line:02d}  "
+            f"Qty {line % 7 + 1}  Unit 1{line:02d}.50  Amount 9{line:02d}.00",
+            fill=0
+        )
+
+    return image
+
+
+def bench(pages, workers: int) -> float:
+    settings.OCR_WORKERS = workers
+    ocr.shutdown_ocr_pool()
+
+    # Warm the pool so process start-up isn't counted
+    if workers > 1:
+        list(ocr.get_ocr_pool().map(abs, range(workers)))
+
+    start = time.perf_counter()
+    ocr.run_ocr_on_images(pages, max_in_flight=workers)
+    elapsed = time.perf_counter() - start
+
+    ocr.shutdown_ocr_pool()
+    return len(pages) / elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--pages", type=int, default=40)
+    args = parser.parse_args()
+
+    pages = [make_page(i) for i in range(args.pages)]
+    n = os.cpu_count() or 1
+
+    print(f"{'workers':>8} {'pages/sec':>10}")
+    for workers in sorted({1, 2, 4, n}):
+        print(f"{workers:>8} {bench(pages, workers):>10.2f}")
+
+
+if __name__ == "__main__":
+    main()
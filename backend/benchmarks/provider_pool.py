@@ -0,0 +1,155 @@
+"""
+Chat answer latency during provider incidents: the old strictly
+sequential fallback vs the provider pool (circuit breaker, hedging,
+deadline), against local fake providers.
+
+Two providers, "primary" and "secondary", both answering in about
+--latency-ms normally. Scenarios:
+
+- outage: the primary hangs for --timeout-ms, then fails, every time
+- brownout: 10% of primary calls take --timeout-ms (then succeed)
+- total outage: both providers hang, then fail (the deadline's case)
+- healthy: both providers fine
+
+Each configuration answers --requests questions from --concurrency
+threads; each config gets fresh providers and circuits.
+
+Run from backend/:
+
+    python -m benchmarks.provider_pool
+"""
+
+import argparse
+import random
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, NamedTuple
+
+from app.llm_fallback import CircuitBreaker, Provider, ProviderPool
+
+
+class Reply(NamedTuple):
+    content: str
+
+
+class FakeLLM:
+    """
+    Answers after a simulated delay; `slow_rate` of calls take
+    `slow` seconds instead, and fail afterwards if `fail_slow`.
+    """
+
+    def __init__(self, latency: float, slow: float, slow_rate: float, fail_slow: bool, seed: int):
+        self.latency = latency
+        self.slow = slow
+        self.slow_rate = slow_rate
+        self.fail_slow = fail_slow
+        self.rng = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def invoke(self, prompt: str) -> Reply:
+        with self._lock:
+            slow = self.rng.random() < self.slow_rate
+            jitter = self.rng.uniform(0.8, 1.4)
+
+        if slow:
+            time.sleep(self.slow)
+            if self.fail_slow:
+                raise TimeoutError("simulated provider timeout")
+        else:
+            time.sleep(self.latency * jitter)
+
+        return Reply("answer")
+
+
+SCENARIOS = {
+    # (slow_rate, fails when slow) for primary, then secondary
+    "outage": ((1.0, True), (0.0, False)),
+    "brownout": ((0.1, False), (0.0, False)),
+    "total outage": ((1.0, True), (1.0, True)),
+    "healthy": ((0.0, False), (0.0, False)),
+}
+
+
+def make_pool(scenario: str, args, breaker: bool, hedge: float, deadline: float) -> ProviderPool:
+    primary, secondary = SCENARIOS[scenario]
+    latency, timeout = args.latency_ms / 1000, args.timeout_ms / 1000
+
+    def circuit() -> CircuitBreaker:
+        # "Disabled" = never reaches the threshold
+        return CircuitBreaker(3 if breaker else 10 ** 9, reset_seconds=5)
+
+    return ProviderPool(
+        [
+            Provider("primary", lambda: FakeLLM(latency, timeout, *primary, seed=1), circuit()),
+            Provider("secondary", lambda: FakeLLM(latency, timeout, *secondary, seed=2), circuit()),
+        ],
+        hedge_after_seconds=hedge,
+        deadline_seconds=deadline,
+        max_in_flight=args.concurrency * 4
+    )
+
+
+def run(label: str, pool: ProviderPool, args) -> None:
+    latencies: List[float] = []
+    failures = 0
+    lock = threading.Lock()
+
+    def ask(_):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            pool.invoke("question")
+        except Exception:
+            with lock:
+                failures += 1
+        with lock:
+            latencies.append((time.perf_counter() - start) * 1000)
+
+    with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+        list(executor.map(ask, range(args.requests)))
+
+    latencies.sort()
+    stats = pool.stats()["providers"]
+    print(
+        f"  {label:<28} {statistics.median(latencies):>8.0f} "
+        f"{latencies[int(len(latencies) * 0.99) - 1]:>8.0f} {latencies[-1]:>8.0f} "
+        f"{failures / len(latencies):>7.1%} "
+        f"{stats['primary']['calls']:>8} {stats['secondary']['calls']:>10}"
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--latency-ms", type=float, default=50)
+    parser.add_argument("--timeout-ms", type=float, default=1000)
+    parser.add_argument("--hedge-ms", type=float, default=150)
+    parser.add_argument("--deadline-ms", type=float, default=600)
+    args = parser.parse_args()
+
+    hedge, deadline = args.hedge_ms / 1000, args.deadline_ms / 1000
+    no_deadline = 3600.0
+
+    print(
+        f"{args.requests} requests x {args.concurrency} threads, provider latency "
+        f"~{args.latency_ms:g} ms, hang {args.timeout_ms:g} ms, hedge after "
+        f"{args.hedge_ms:g} ms, deadline {args.deadline_ms:g} ms"
+    )
+
+    for scenario in SCENARIOS:
+        print(f"{scenario}")
+        print(
+            f"  {'config':<28} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} "
+            f"{'failed':>7} {'primary':>8} {'secondary':>10}"
+        )
+        run("sequential fallback (old)", make_pool(scenario, args, False, 0, no_deadline), args)
+        run("+ circuit breaker", make_pool(scenario, args, True, 0, no_deadline), args)
+        run("+ breaker, hedging", make_pool(scenario, args, True, hedge, no_deadline), args)
+        run("+ breaker, hedging, deadline", make_pool(scenario, args, True, hedge, deadline), args)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,177 @@
+"""
+Per-invoice FAISS directories vs the shared index.
+
+For each corpus size, builds both layouts from the same random
+vectors, then reports build time, disk footprint, index load time
+and query latency: per-invoice search as /chat does it (for the
+per-invoice layout that includes loading the directory), plus
+cross-invoice search, which only the shared layout can do.
+
+Run from backend/:
+
+    python -m benchmarks.vector_layouts --invoices 10000,100000
+"""
+
+import argparse
+import os
+import random
+import shutil
+import statistics
+import tempfile
+import time
+from typing import Callable, Dict, List, Tuple
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+
+from app.rag.shared_index import SharedIndex
+
+
+def disk_usage(path: str) -> Tuple[int, int, int]:
+    """
+    (bytes, bytes allocated on disk, file count)
+    """
+
+    size = allocated = files = 0
+    for root, _, names in os.walk(path):
+        for name in names:
+            stat = os.stat(os.path.join(root, name))
+            size += stat.st_size
+            allocated += stat.st_blocks * 512
+            files += 1
+    return size, allocated, files
+
+
+def timed(fn: Callable, samples: List) -> float:
+    """
+    Median milliseconds per call.
+    """
+
+    times = []
+    for sample in samples:
+        start = time.perf_counter()
+        fn(sample)
+        times.append((time.perf_counter() - start) * 1000)
+    return statistics.median(times)
+
+
+def make_corpus(invoices: int, chunks: int, dim: int, seed: int):
+    rng = np.random.default_rng(seed)
+
+    for i in range(invoices):
+        invoice_id = f"inv-{i:07d}"
+        documents = [
+            Document(
+                page_content=f"chunk {c} of {invoice_id}",
+                metadata={"invoice_id": invoice_id, "chunk_index": c}
+            )
+            for c in range(chunks)
+        ]
+        yield invoice_id, documents, rng.standard_normal((chunks, dim)).astype("float32")
+
+
+def bench_size(invoices: int, args, workdir: str) -> Dict[str, Dict]:
+    embeddings = DeterministicFakeEmbedding(size=args.dim)
+    per_invoice_root = os.path.join(workdir, "per_invoice")
+    shared_root = os.path.join(workdir, "shared")
+
+    # ---- build ----
+    start = time.perf_counter()
+    for invoice_id, documents, vectors in make_corpus(invoices, args.chunks, args.dim, args.seed):
+        store = FAISS.from_embeddings(
+            [(doc.page_content, vector.tolist()) for doc, vector in zip(documents, vectors)],
+            embeddings,
+            metadatas=[doc.metadata for doc in documents]
+        )
+        store.save_local(os.path.join(per_invoice_root, invoice_id))
+    per_invoice_build = time.perf_counter() - start
+
+    start = time.perf_counter()
+    shared = SharedIndex(shared_root, args.hnsw_m, args.ef_search, flush_every=10 ** 9)
+    for invoice_id, documents, vectors in make_corpus(invoices, args.chunks, args.dim, args.seed):
+        shared.add(invoice_id, documents, vectors)
+    shared.flush()
+    shared_build = time.perf_counter() - start
+
+    # ---- queries ----
+    rng = random.Random(args.seed)
+    sample_ids = [f"inv-{rng.randrange(invoices):07d}" for _ in range(args.queries)]
+    query_vectors = np.random.default_rng(args.seed + 1).standard_normal(
+        (args.queries, args.dim)
+    ).astype("float32")
+    samples = list(zip(sample_ids, query_vectors))
+
+    def load_per_invoice(invoice_id):
+        return FAISS.load_local(
+            os.path.join(per_invoice_root, invoice_id),
+            embeddings,
+            allow_dangerous_deserialization=True
+        )
+
+    def load_shared(_):
+        index = SharedIndex(shared_root, args.hnsw_m, args.ef_search, flush_every=10 ** 9)
+        index.load()
+
+    per_invoice_query = timed(
+        lambda s: load_per_invoice(s[0]).similarity_search_by_vector(s[1].tolist(), k=4),
+        samples
+    )
+
+    reopened = SharedIndex(shared_root, args.hnsw_m, args.ef_search, flush_every=10 ** 9)
+    reopened.load()
+
+    results = {
+        "per-invoice": {
+            "build_s": per_invoice_build,
+            "disk": disk_usage(per_invoice_root),
+            "load_ms": timed(load_per_invoice, sample_ids),
+            "query_ms": per_invoice_query,
+            "cross_ms": None,
+        },
+        "shared": {
+            "build_s": shared_build,
+            "disk": disk_usage(shared_root),
+            "load_ms": timed(load_shared, range(3)),
+            "query_ms": timed(lambda s: reopened.search(s[1], 4, invoice_id=s[0]), samples),
+            "cross_ms": timed(lambda s: reopened.search(s[1], 4), samples),
+        },
+    }
+
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--invoices", default="10000,100000")
+    parser.add_argument("--chunks", type=int, default=4, help="chunks per invoice")
+    parser.add_argument("--dim", type=int, default=128)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--hnsw-m", type=int, default=32)
+    parser.add_argument("--ef-search", type=int, default=64)
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+
+    print(
+        f"{'invoices':>9} {'layout':<12} {'build s':>8} {'data MiB':>9} "
+        f"{'alloc MiB':>10} {'files':>7} {'load ms':>8} {'query ms':>9} {'cross ms':>9}"
+    )
+
+    for invoices in (int(n) for n in args.invoices.split(",")):
+        workdir = tempfile.mkdtemp(prefix="vector_layouts_")
+        try:
+            for layout, r in bench_size(invoices, args, workdir).items():
+                size, allocated, files = r["disk"]
+                cross = f"{r['cross_ms']:>9.2f}" if r["cross_ms"] is not None else f"{'n/a':>9}"
+                print(
+                    f"{invoices:>9} {layout:<12} {r['build_s']:>8.1f} "
+                    f"{size / 2 ** 20:>9.1f} {allocated / 2 ** 20:>10.1f} {files:>7} {r['load_ms']:>8.2f} "
+                    f"{r['query_ms']:>9.2f} {cross}"
+                )
+        finally:
+            shutil.rmtree(workdir)
+
+
+if __name__ == "__main__":
+    main()
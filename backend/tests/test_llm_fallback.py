@@ -0,0 +1,167 @@
+import asyncio
+import time
+
+import pytest
+
+from app.llm_fallback import (
+    CircuitBreaker,
+    LLMDeadlineExceeded,
+    Provider,
+    ProviderPool
+)
+
+
+class Chunk:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class StreamingLLM:
+    """
+    Yields `tokens`, `delay` seconds apart; records whether the
+    stream was closed before it finished.
+    """
+
+    def __init__(self, tokens, delay: float = 0):
+        self.tokens = tokens
+        self.delay = delay
+        self.closed_early = False
+
+    async def astream(self, prompt):
+        finished = False
+        try:
+            for token in self.tokens:
+                await asyncio.sleep(self.delay)
+                yield Chunk(token)
+            finished = True
+        finally:
+            self.closed_early = not finished
+
+
+class SlowLLM:
+    def __init__(self, delay: float):
+        self.delay = delay
+
+    async def ainvoke(self, prompt):
+        await asyncio.sleep(self.delay)
+        return Chunk("answer")
+
+
+def half_open_pool(llm: StreamingLLM, deadline_seconds: float = 5):
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    breaker.record_failure()
+    assert breaker.state == "half_open"
+
+    provider = Provider("fake", lambda: llm, breaker)
+    pool = ProviderPool(
+        [provider],
+        hedge_after_seconds=0,
+        deadline_seconds=deadline_seconds,
+        max_in_flight=1
+    )
+    return pool, breaker
+
+
+def test_stream_closed_by_consumer_releases_trial():
+    llm = StreamingLLM(["a", "b", "c", "d"])
+    pool, breaker = half_open_pool(llm)
+
+    async def consume():
+        stream = pool.astream("prompt")
+        tokens = [await anext(stream), await anext(stream)]
+        assert breaker.trial_in_flight
+        # What the server does once the SSE client disconnects
+        await stream.aclose()
+
+        # Checked while the loop still runs: at shutdown asyncio would
+        # close the provider's stream on its own
+        assert tokens == ["a", "b"]
+        assert llm.closed_early
+        assert not breaker.trial_in_flight
+        assert breaker.allow() == (True, True)
+
+    asyncio.run(consume())
+
+
+def test_cancelled_consumer_releases_trial():
+    llm = StreamingLLM(["a", "b", "c"], delay=0.05)
+    pool, breaker = half_open_pool(llm)
+
+    async def consume():
+        received = []
+
+        async def read():
+            async for token in pool.astream("prompt"):
+                received.append(token)
+
+        task = asyncio.ensure_future(read())
+        while not received:
+            await asyncio.sleep(0.01)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        assert received == ["a"]
+        assert llm.closed_early
+        assert not breaker.trial_in_flight
+        assert breaker.allow() == (True, True)
+
+    asyncio.run(consume())
+
+
+def test_deadline_records_failure_and_closes_stream():
+    llm = StreamingLLM(["a", "b"], delay=1)
+    pool, breaker = half_open_pool(llm, deadline_seconds=0.05)
+
+    async def consume():
+        start = time.monotonic()
+        with pytest.raises(LLMDeadlineExceeded):
+            async for _ in pool.astream("prompt"):
+                pass
+
+        assert time.monotonic() - start < 1
+        assert llm.closed_early
+        assert not breaker.trial_in_flight
+        assert breaker.consecutive_failures == 2
+
+    asyncio.run(consume())
+
+
+def test_completed_stream_closes_breaker():
+    llm = StreamingLLM(["a", "b"])
+    pool, breaker = half_open_pool(llm)
+
+    async def consume():
+        return [token async for token in pool.astream("prompt")]
+
+    assert asyncio.run(consume()) == ["a", "b"]
+    assert not llm.closed_early
+    assert breaker.state == "closed"
+
+
+def test_cancelled_call_keeps_another_requests_trial():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0)
+    provider = Provider("fake", lambda: SlowLLM(delay=1), breaker)
+    pool = ProviderPool(
+        [provider],
+        hedge_after_seconds=0,
+        deadline_seconds=5,
+        max_in_flight=1
+    )
+
+    async def run():
+        # Let through while closed, then the circuit opens under it
+        task = asyncio.ensure_future(pool.ainvoke("prompt"))
+        await asyncio.sleep(0.01)
+        breaker.record_failure()
+        assert breaker.allow() == (True, True)
+
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+
+        # The other request's trial is still the only one in flight
+        assert breaker.trial_in_flight
+        assert breaker.allow() == (False, False)
+
+    asyncio.run(run())
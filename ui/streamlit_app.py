@@ -1,3 +1,5 @@
+from json import loads
+
 import requests
 import streamlit as st
 
@@ -114,6 +116,26 @@ def api_get(path):
 def api_post(path, json=None, files=None):
     return requests.post(f"{BACKEND_URL}{path}", json=json, files=files)
 
+def api_stream(path, json=None):
+    """
+    POST, then yield (event, data) for each server-sent event.
+    """
+    with requests.post(f"{BACKEND_URL}{path}", json=json, stream=True) as res:
+        if res.status_code != 200:
+            return
+
+        res.encoding = "utf-8"
+        event, data = "message", []
+
+        for line in res.iter_lines(decode_unicode=True):
+            if line.startswith("event:"):
+                event = line[len("event:"):].strip()
+            elif line.startswith("data:"):
+                data.append(line[len("data:"):].strip())
+            elif not line and data:
+                yield event, loads("\n".join(data))
+                event, data = "message", []
+
 # ======================================================
 # Sidebar — Upload, Select, History
 # ======================================================
@@ -132,9 +154,21 @@ with st.sidebar:
     )
 
     if uploaded_files and st.button("Process Files", use_container_width=True):
-        for f in uploaded_files:
-            api_post("/upload/", files={"file": f})
-        st.success("Invoices processed")
+        res = api_post(
+            "/upload/batch",
+            files=[("files", (f.name, f.getvalue(), f.type)) for f in uploaded_files]
+        )
+        if res.status_code == 200:
+            summary = res.json()
+            st.success(
+                f"Invoices processed: {summary['processed']} new, "
+                f"{summary['duplicates']} already uploaded"
+            )
+            for r in summary["results"]:
+                if r["status"] == "failed":
+                    st.error(f"{r['filename']}: {r.get('error')}")
+        else:
+            st.error("Upload failed")
 
     st.divider()
     st.markdown("### Select Invoice")
@@ -250,16 +284,32 @@ if st.session_state.invoice_id:
     )
 
     if st.button("Submit Question") and question:
-        res = api_post(
-            "/chat/",
-            json={"invoice_id": st.session_state.invoice_id, "question": question}
+        result = {}
+
+        def answer_tokens():
+            # Tokens render as they arrive; the final event has the source
+            for event, data in api_stream(
+                "/chat/stream",
+                json={"invoice_id": st.session_state.invoice_id, "question": question}
+            ):
+                if event == "token":
+                    yield data["text"]
+                elif event == "done":
+                    result.update(data)
+                elif event == "error":
+                    result.update(answer=f"⚠️ {data['detail']}", source="error")
+
+        st.markdown(
+            f"<div class='chat-user'><b>You</b><br>{question}</div>",
+            unsafe_allow_html=True
         )
-        if res.status_code == 200:
-            data = res.json()
+        st.write_stream(answer_tokens())
+
+        if result:
             st.session_state.chat_log.append({
                 "q": question,
-                "a": data["answer"],
-                "source": data["source"]
+                "a": result["answer"],
+                "source": result["source"]
             })
             st.rerun()
 